@@ -0,0 +1,80 @@
+import hashlib
+from typing import Any, Optional
+import orjson
+from fastapi import Request
+from fastapi.responses import Response
+
+# Keys whose nested lists of review texts are paginated by sample_offset/sample_limit
+SAMPLE_KEYS = ("sample_reviews", "keyword_matched_samples")
+
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+class FastJSONResponse(Response):
+    """orjson-rendered JSON. numpy scalars/arrays and non-string keys are handled natively."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=_ORJSON_OPTIONS, default=str)
+
+
+def select_fields(payload: dict, fields: Optional[str]) -> dict:
+    """
+    Keep only the comma-separated `fields` of a payload. Dotted paths select nested keys,
+    e.g. fields=stats.sentiment_percentages,aspect_summary.
+    """
+    if not fields:
+        return payload
+    selected = {}
+    for path in (f.strip() for f in fields.split(",")):
+        if not path:
+            continue
+        source, target = payload, selected
+        parts = path.split(".")
+        for i, part in enumerate(parts):
+            if not isinstance(source, dict) or part not in source:
+                break
+            if i == len(parts) - 1:
+                target[part] = source[part]
+            else:
+                source = source[part]
+                target = target.setdefault(part, {})
+    return selected
+
+
+def _slice_samples(value, offset: int, limit: Optional[int]):
+    if isinstance(value, list) and all(isinstance(v, str) for v in value):
+        return value[offset:offset + limit if limit is not None else None]
+    if isinstance(value, dict):
+        return {k: _slice_samples(v, offset, limit) for k, v in value.items()}
+    return value
+
+
+def paginate_samples(payload, offset: int = 0, limit: Optional[int] = None):
+    """Slice every sample-review list under SAMPLE_KEYS to [offset:offset+limit] without touching the rest."""
+    if not offset and limit is None:
+        return payload
+    if isinstance(payload, dict):
+        return {k: _slice_samples(v, offset, limit) if k in SAMPLE_KEYS else paginate_samples(v, offset, limit)
+                for k, v in payload.items()}
+    if isinstance(payload, list):
+        return [paginate_samples(v, offset, limit) for v in payload]
+    return payload
+
+
+def job_etag(job_id: str, job: dict, request: Request) -> str:
+    """Weak ETag derived from the job's state and the query string (fields/pagination change the body)."""
+    key = f"{job_id}|{job.get('status')}|{job.get('updated_at')}|{job.get('gpt_summary') is not None}|{request.url.query}"
+    return f'W/"{hashlib.sha1(key.encode("utf-8")).hexdigest()}"'
+
+
+def cached_json_response(request: Request, etag: str, build_payload) -> Response:
+    """
+    304 when the client's If-None-Match already matches `etag`; otherwise call
+    `build_payload()` and return it as orjson with the ETag attached.
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(build_payload(), headers=headers)
@@ -1,308 +1,359 @@
 from fastapi import APIRouter, BackgroundTasks, HTTPException, Request, Body
-from fastapi.responses import JSONResponse
-from typing import Dict
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from typing import Dict, Optional
 import uuid
-from core.fetch_reviews import fetch_reviews
-from core.clean_text import CleanTextPipeline
-import pandas as pd
 import os
-from core.clean_text_graph import clean_reviews_langgraph
 from dotenv import load_dotenv
 import asyncio
 import json
-from core.openai_client import embed_texts, classify_embeddings, batch_llm_extract_aspects
-from core.keyword_extract import extract_top_keywords_by_sentiment
-from core.stats_build import build_stats_summary, aggregate_aspect_sentiment
-import re
-import string
-import numpy as np
 from core.gpt_summary import generate_gpt_summary
-from datetime import datetime
+from core.metrics import time_stage, render_metrics, JOBS, JOB_QUEUE, LOOP_WATCHDOG
+from core.sampling import SAMPLING_MODE
+from core.langgraph_pipeline import analysis_params
+from core.warmup import warm_state, is_ready
+from core.job_store import save_job, load_job, enqueue_job, is_queued, count_jobs_by_status, count_queue
+from core.job_worker import store_summary
+from core.result_store import load_result
+from core.checkpoints import StageCheckpoints
+from core.vector_index import SearchIndexCache, search_index_path
+from core.profiler import load_profile, profile_path, to_collapsed, to_speedscope
+from core.cube import load_cube
+from core.batch_llm import LLM_MODES
+from core.review_export import export_path, export_columns, iter_ndjson, iter_parquet, read_export_rows
+from api.responses import FastJSONResponse, cached_json_response, job_etag, select_fields, paginate_samples
+from core.openai_client import embed_texts
+from core.embedding_providers import EMBEDDING_PROVIDER, EMBEDDING_PROVIDERS, get_embedding_provider
+import time
+import numpy as np
+from datetime import datetime, date, timedelta
 
 load_dotenv()
 
 router = APIRouter()
 
-# In-memory job store for demo (replace with Redis/DB in prod)
+# Per-process cache of job records from the shared store (core.job_store), plus things only
+# this process holds: the summary lock and the loaded cube
 jobs: Dict[str, dict] = {}
+# /similar indexes, by job artifact; bounded so searched jobs do not pile up in memory
+search_indexes = SearchIndexCache()
+# Jobs run in this API process when RUN_JOBS_IN_API is on (see main.py); otherwise `python worker.py` runs them
+job_queue_wake = asyncio.Event()
 
-# Flag to toggle between LLM+LangGraph and classic CleanTextPipeline
-USE_LLM_CLEAN = os.getenv("USE_LLM_CLEAN", "false").lower() == "true"
-import logging
-logging.info(f"USE_LLM_CLEAN (from env): {USE_LLM_CLEAN}")
+async def get_job(job_id: str) -> Optional[dict]:
+    """The job's current record (whichever process is running it), merged into this process's cache."""
+    # SQLite calls run in a thread so a slow or locked database never stalls the event loop
+    record = await asyncio.to_thread(load_job, job_id)
+    if record is None:
+        return jobs.get(job_id)
+    job = jobs.setdefault(job_id, {"result": None, "reviews": None})
+    job.update(record)
+    if job["status"] == "complete" and job.get("result") and "stats_summary" not in job:
+        job["stats_summary"] = job["result"].get("stats")
+    return job
 
-def save_step_output(step_num, data):
-    with open(f"step_{step_num}.json", "w") as f:
-        json.dump(data, f, indent=2, default=str)
+async def start_job(job_id: str):
+    """Queue a saved job for the next free worker."""
+    await asyncio.to_thread(enqueue_job, job_id)
+    job_queue_wake.set()
 
 @router.post("/analyze/{sku}")
-async def analyze_sku(sku: str):
+async def analyze_sku(sku: str, sampling: Optional[str] = None, sample_size: Optional[int] = None,
+                      start_date: Optional[date] = None, end_date: Optional[date] = None,
+                      min_rating: Optional[int] = None, max_rating: Optional[int] = None, limit: Optional[int] = None,
+                      embedding_provider: Optional[str] = None, refresh: bool = False, profile: bool = False,
+                      llm_mode: Optional[str] = None):
+    """
+    Start an analysis job. start_date/end_date/min_rating/max_rating/limit are pushed down
+    into the Snowflake query so only matching reviews are transferred. embedding_provider
+    ("openai" or "local") picks the embedding backend and its matching sentiment classifier.
+    A fresh stored result for the same SKU and parameters (e.g. from the nightly batch_runner)
+    is returned as an already complete job; refresh=true recomputes regardless.
+    profile=true (implies refresh) records a sampling profile with per-stage wall/CPU time and
+    allocation peaks, downloadable from /jobs/{job_id}/profile once the job ends.
+    llm_mode=bulk sends aspect extraction and LLM cleaning through the offline Batch API:
+    cheaper and off the live rate limits, but the job may take hours (up to the batch window).
+    """
     print(f"analyze_sku called for SKU: {sku}")
+    sampling = (sampling or SAMPLING_MODE).lower()
+    if sampling not in ("head", "stratified"):
+        raise HTTPException(status_code=400, detail="sampling must be 'head' or 'stratified'")
+    embedding_provider = (embedding_provider or EMBEDDING_PROVIDER).lower()
+    if embedding_provider not in EMBEDDING_PROVIDERS:
+        raise HTTPException(status_code=400, detail=f"embedding_provider must be one of {sorted(EMBEDDING_PROVIDERS)}")
+    if llm_mode is not None and llm_mode.lower() not in LLM_MODES:
+        raise HTTPException(status_code=400, detail=f"llm_mode must be one of {list(LLM_MODES)}")
+    filters = {"start_date": start_date, "end_date": end_date, "min_rating": min_rating, "max_rating": max_rating, "limit": limit}
+    filters = {k: (v.isoformat() if isinstance(v, date) else v) for k, v in filters.items() if v is not None}
+    params = analysis_params(sampling, sample_size, filters, embedding_provider)
     job_id = str(uuid.uuid4())
-    jobs[job_id] = {"status": "pending", "result": None, "reviews": None, "step": 0}
-    asyncio.create_task(run_analysis_async(sku, job_id))
+    stored = None if refresh or profile else await asyncio.to_thread(load_result, sku, params)
+    if stored:
+        jobs[job_id] = {"status": "complete", "result": stored["result"], "reviews": None, "step": 6, "sku": sku,
+                        "attempts": 0, "created_at": datetime.utcnow().isoformat(), "updated_at": datetime.utcnow().isoformat(),
+                        "params": params, "aspect_summary": stored["aspect_summary"], "gpt_summary": stored["gpt_summary"],
+                        "stats_summary": stored["result"].get("stats"), "precomputed_at": stored["computed_at"]}
+        await asyncio.to_thread(save_job, job_id, jobs[job_id])
+        return {"job_id": job_id, "precomputed": True, "computed_at": stored["computed_at"]}
+    jobs[job_id] = {"status": "pending", "result": None, "reviews": None, "step": 0, "sku": sku, "attempts": 0,
+                    "created_at": datetime.utcnow().isoformat(), "params": params}
+    if profile:
+        jobs[job_id]["profile"] = True
+    if llm_mode:
+        # Not part of params: results are the same either way, so stored results are shared
+        jobs[job_id]["llm_mode"] = llm_mode.lower()
+    await asyncio.to_thread(save_job, job_id, jobs[job_id])
+    await start_job(job_id)
     return {"job_id": job_id}
 
-async def run_analysis_async(sku: str, job_id: str):
-    print(f"run_analysis_async called for SKU: {sku}, job_id: {job_id}")
-    logging.info(f"run_analysis_async called for SKU: {sku}, job_id: {job_id}")
-    jobs[job_id]["status"] = "processing"
-    jobs[job_id]["step"] = 0  # FetchReviews
-    jobs[job_id]["cleantext_substeps"] = {
-        "html": "pending",
-        "encoding": "pending",
-        "emoji": "pending",
-        "control": "pending",
-        "whitespace": "pending"
-    }
-    reviews = []
-    for review in fetch_reviews(sku):
-        reviews.append(review)
-        if len(reviews) >= 15000:
-            break
-    if len(reviews) == 0:
-        jobs[job_id]["status"] = "no_data"
-        jobs[job_id]["step"] = 0
-        jobs[job_id]["result"] = {"error": f"No data fetched for SKU {sku}", "sku": sku}
-        save_step_output(1, reviews)
-        return
-    jobs[job_id]["reviews"] = reviews
-    save_step_output(1, reviews)
-    logging.info(f"Fetched {len(reviews)} reviews. Starting null/dup filter.")
-    # --- Null, blank, and duplicate filter ---
-    df = pd.DataFrame(reviews)
-    before = len(df)
-    # Split into text reviews and rating-only reviews
-    text_df = df.dropna(subset=["customer_review"])
-    text_df = text_df[text_df["customer_review"].str.strip() != ""]
-    text_df = text_df.drop_duplicates(subset=["customer_review"])
-    text_reviews = text_df.to_dict(orient="records")
-    # Rating-only: no review text, but has a product_rating
-    rating_only_df = df[(df["customer_review"].isnull() | (df["customer_review"].str.strip() == "")) & df["product_rating"].notnull()]
-    rating_only_reviews = rating_only_df.to_dict(orient="records")
-    after = len(text_reviews)
-    save_step_output(2, text_reviews)
-    logging.info(f"Filtered reviews: {before} -> {after} after null/blank/dup filter.")
-    logging.info(f"Starting CleanText step.")
-    jobs[job_id]["step"] = 1  # CleanText
-    # Set all sub-steps to in_progress at start of CleanText
-    for sub in ["html", "encoding", "emoji", "control", "whitespace"]:
-        jobs[job_id]["cleantext_substeps"][sub] = "in_progress"
-    cleaned_reviews = []
-    if USE_LLM_CLEAN:
-        logging.info("Using LLM+LangGraph cleaning pipeline.")
-        texts = [r.get("customer_review") or "" for r in text_reviews]
-        cleaned_batch = await clean_reviews_langgraph(texts)
-        for review, cleaned in zip(text_reviews, cleaned_batch):
-            cleaned_reviews.append({**review, **cleaned, "sentiment_source": "text"})
-    else:
-        logging.info("Using classic CleanTextPipeline.")
-        clean_pipeline = CleanTextPipeline()
-        for idx, review in enumerate(text_reviews):
-            raw_text = review.get("customer_review") or ""
-            cleaned = clean_pipeline.clean(raw_text)
-            cleaned_reviews.append({**review, **cleaned, "sentiment_source": "text"})
-            if idx < 3:
-                logging.info(f"Cleaned review {idx+1}: {cleaned}")
-    # Set all sub-steps to done when CleanText completes
-    for sub in ["html", "encoding", "emoji", "control", "whitespace"]:
-        jobs[job_id]["cleantext_substeps"][sub] = "done"
-    await asyncio.sleep(2)  # Delay to allow frontend to show 'done' state
-    jobs[job_id]["cleaned_reviews"] = cleaned_reviews
-    save_step_output(3, cleaned_reviews)
-    logging.info(f"Completed CleanText step. {len(cleaned_reviews)} reviews cleaned.")
-
-    # --- EmbedBatch & ClassifyBatch ---
-    jobs[job_id]["step"] = 2  # EmbedBatch
-    texts_to_embed = [r.get("clean") or "" for r in cleaned_reviews]
-    # Only embed non-empty cleaned reviews
-    valid_indices = [i for i, t in enumerate(texts_to_embed) if t.strip()]
-    valid_texts = [texts_to_embed[i] for i in valid_indices]
-    embeddings = []
-    if valid_texts:
-        embeddings = await embed_texts(valid_texts)
-    else:
-        logging.warning("No valid cleaned reviews to embed.")
-    # Map embeddings back to original indices
-    full_embeddings = [None] * len(texts_to_embed)
-    for idx, emb in zip(valid_indices, embeddings):
-        full_embeddings[idx] = emb
-    save_step_output(4, full_embeddings)
-    logging.info(f"Completed embedding for {len(valid_texts)} reviews.")
-
-    jobs[job_id]["step"] = 3  # ClassifyBatch
-    classification_results = []
-    if embeddings:
-        classification_results = classify_embeddings(embeddings)
-    else:
-        logging.warning("No embeddings to classify.")
-    # Map classification results back to original indices
-    full_classification = [None] * len(texts_to_embed)
-    for idx, res in zip(valid_indices, classification_results):
-        full_classification[idx] = res
-    save_step_output(5, full_classification)
-    logging.info(f"Completed classification for {len(classification_results)} reviews.")
-
-    # Optionally, merge classification results into cleaned_reviews for downstream steps
-    for i, review in enumerate(cleaned_reviews):
-        review["embedding"] = full_embeddings[i]
-        review["sentiment"] = full_classification[i]["label"] if full_classification[i] else None
-        review["sentiment_probabilities"] = full_classification[i]["probabilities"] if full_classification[i] else None
-
-    # --- Debug: Check for None in cleaned_reviews ---
-    for idx, r in enumerate(cleaned_reviews):
-        if r is None:
-            print(f"[DEBUG] None found in cleaned_reviews at index {idx}")
-
-    # --- Rating-only sentiment assignment ---
-    rating_sentiment_map = {1: "negative", 2: "negative", 3: "neutral", 4: "positive", 5: "positive"}
-    rating_only_scored = []
-    for r in rating_only_reviews:
-        rating = r.get("product_rating")
-        try:
-            rating_int = int(rating)
-            sentiment = rating_sentiment_map.get(rating_int)
-        except Exception:
-            sentiment = None
-        rating_only_scored.append({**r, "sentiment": sentiment, "sentiment_source": "rating_only", "sentiment_probabilities": None, "embedding": None, "clean": None})
-
-    # --- Debug: Check for None in rating_only_scored ---
-    for idx, r in enumerate(rating_only_scored):
-        if r is None:
-            print(f"[DEBUG] None found in rating_only_scored at index {idx}")
-
-    # --- Merge text and rating-only for stats/summary ---
-    all_reviews_for_stats = cleaned_reviews + rating_only_scored
-    # Debug: Check for None in all_reviews_for_stats
-    for idx, r in enumerate(all_reviews_for_stats):
-        if r is None:
-            print(f"[DEBUG] None found in all_reviews_for_stats at index {idx}")
-    jobs[job_id]["classified_reviews"] = all_reviews_for_stats
-
-    jobs[job_id]["step"] = 3.5  # AspectExtract
-    # --- Aspect Extraction (LLM) ---
-    aspect_results = await batch_llm_extract_aspects([r.get('clean', '') for r in cleaned_reviews])
-    jobs[job_id]["aspect_results"] = aspect_results
-    aspect_summary = aggregate_aspect_sentiment(aspect_results, cleaned_reviews, top_n=10, samples_per_aspect=3)
-    jobs[job_id]["aspect_summary"] = aspect_summary
-    save_step_output("aspect", aspect_summary)
-
-    # --- KeywordExtract ---
-    jobs[job_id]["step"] = 4  # KeywordExtract
-    top_keywords = extract_top_keywords_by_sentiment(cleaned_reviews, top_n=25)
-    save_step_output(6, top_keywords)
-    jobs[job_id]["top_keywords"] = top_keywords
-    logging.info(f"Extracted top keywords for each sentiment.")
-
-    # --- Keyword-Matched Sample Reviews (Flexible Matching) ---
-    # Map integer sentiment labels (including NumPy types) to string labels for matching
-    sentiment_map = {0: 'negative', 1: 'neutral', 2: 'positive'}
-    for review in cleaned_reviews:
-        val = review.get('sentiment')
-        if isinstance(val, (int, float)) or (hasattr(val, 'item') and callable(val.item)):
-            try:
-                int_val = int(val)
-                review['sentiment'] = sentiment_map.get(int_val, str(int_val))
-            except Exception:
-                review['sentiment'] = str(val)
-    unique_sentiments = set(r.get("sentiment") for r in cleaned_reviews)
-    logging.info(f"Unique sentiment labels in cleaned_reviews: {unique_sentiments}")
-    def normalize(text):
-        return re.sub(rf'[{re.escape(string.punctuation)}]', '', text.lower())
-
-    keyword_matched_samples = {sentiment: {} for sentiment in top_keywords}
-    SAMPLES_PER_KEYWORD = 20
-    for sentiment, keywords in top_keywords.items():
-        sentiment_reviews = [r.get("clean") for r in cleaned_reviews if r.get("sentiment") == sentiment and r.get("clean")]
-        norm_reviews = [normalize(r) for r in sentiment_reviews]
-        logging.info(f"Sentiment '{sentiment}': {len(sentiment_reviews)} reviews to check.")
-        for kw in keywords:
-            kw_words = normalize(kw).split()
-            # logging.info(f"Checking keyword '{kw}' (words: {kw_words}) for sentiment '{sentiment}'...")
-            # Find up to N reviews containing all words in the keyword
-            matches = []
-            for review, norm_review in zip(sentiment_reviews, norm_reviews):
-                if all(word in norm_review for word in kw_words):
-                    matches.append(review)
-                    if len(matches) >= SAMPLES_PER_KEYWORD:
-                        break
-            # Fallback: find reviews containing any word in the keyword
-            if len(matches) < SAMPLES_PER_KEYWORD:
-                for review, norm_review in zip(sentiment_reviews, norm_reviews):
-                    if any(word in norm_review for word in kw_words) and review not in matches:
-                        matches.append(review)
-                        if len(matches) >= SAMPLES_PER_KEYWORD:
-                            break
-            if matches:
-                keyword_matched_samples[sentiment][kw] = matches
-                # logging.info(f"  Found {len(matches)} match(es) for '{kw}': {matches}")
-            else:
-                logging.info(f"  No match found for '{kw}' in sentiment '{sentiment}'.")
-    save_step_output(6.1, keyword_matched_samples)
-    jobs[job_id]["keyword_matched_samples"] = keyword_matched_samples
-    logging.info(f"Saved keyword-matched sample reviews for each sentiment (flexible matching).")
-
-    # --- StatsBuild ---
-    jobs[job_id]["step"] = 5  # StatsBuild
-    stats_summary = build_stats_summary(all_reviews_for_stats, top_keywords, keyword_matched_samples, n_samples=20)
-    save_step_output(7, stats_summary)
-    jobs[job_id]["stats_summary"] = stats_summary
-    logging.info(f"Built stats summary for dashboard and summary step.")
-
-    await asyncio.sleep(4)
-    jobs[job_id]["step"] = 6  # GptSummary
-    await asyncio.sleep(4)
-    jobs[job_id]["status"] = "complete"
-    # After fetching reviews, extract product info from the first review (if available)
-    product_info_fields = ["mc1", "mc2", "mc3", "product_name", "product_link"]
-    product_info = {k: reviews[0].get(k) if reviews else None for k in product_info_fields}
-    jobs[job_id]["product_info"] = product_info
-
-    # When saving step outputs and passing reviews, ensure these fields are included
-    # (The reviews already have these fields from fetch_reviews)
-    # When building the final API output, include product_info
-    jobs[job_id]["result"] = {
-        "summary": f"Fetched {len(reviews)} reviews for SKU {sku}",
-        "sku": sku,
-        "product_info": product_info,
-        "stats": jobs[job_id].get("stats_summary"),
-    }
+@router.post("/jobs/{job_id}/resume")
+async def resume_job(job_id: str):
+    """
+    Restart a failed job. Stages checkpointed before the failure are restored, so only the
+    failed stage and the ones after it run (and are paid for) again.
+    """
+    job = await get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if await asyncio.to_thread(is_queued, job_id):
+        raise HTTPException(status_code=409, detail="Job is already queued or running")
+    if job["status"] in ("complete", "no_data"):
+        raise HTTPException(status_code=409, detail=f"Job already finished with status {job['status']}")
+    await start_job(job_id)
+    return {"job_id": job_id, "status": "queued"}
 
 @router.get("/status/{job_id}")
 async def get_status(job_id: str):
-    job = jobs.get(job_id)
+    job = await get_job(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     resp = {"status": job["status"], "step": job.get("step", 0)}
+    resp["stage_timings"] = job.get("stage_timings", [])
+    if "peak_rss_bytes" in job:
+        resp["peak_rss_bytes"] = job["peak_rss_bytes"]
     if job.get("step", 0) == 1 and "cleantext_substeps" in job:
         resp["cleantext_substeps"] = job["cleantext_substeps"]
     if job["status"] == "no_data" and "result" in job:
         resp["result"] = job["result"]
+    if job["status"] == "failed":
+        resp["error"] = job.get("error")
+        resp["failed_stage"] = job.get("failed_stage")
+    if job.get("resumed_stages"):
+        resp["resumed_stages"] = job["resumed_stages"]
+    if job.get("precomputed_at"):
+        resp["precomputed_at"] = job["precomputed_at"]
+    if job.get("llm_mode"):
+        resp["llm_mode"] = job["llm_mode"]
+    if job.get("profile"):
+        resp["profile_available"] = os.path.exists(profile_path(job_id))
     return resp
 
+@router.get("/jobs/{job_id}/profile")
+async def get_job_profile(job_id: str, format: str = "speedscope"):
+    """
+    Profile of a job started with profile=true. format=speedscope (open in speedscope.app),
+    collapsed (flamegraph.pl / inferno input) or summary (per-stage wall/CPU time, allocation
+    peaks and top allocation sites, without the stacks).
+    """
+    if format not in ("speedscope", "collapsed", "summary"):
+        raise HTTPException(status_code=400, detail="format must be 'speedscope', 'collapsed' or 'summary'")
+    profile = await asyncio.to_thread(load_profile, job_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No profile for this job (start it with profile=true and wait for it to finish)")
+    if format == "collapsed":
+        return PlainTextResponse(to_collapsed(profile), headers={"Content-Disposition": f'attachment; filename="{job_id}.collapsed.txt"'})
+    if format == "summary":
+        return FastJSONResponse({k: v for k, v in profile.items() if k != "samples"})
+    return FastJSONResponse(to_speedscope(profile), headers={"Content-Disposition": f'attachment; filename="{job_id}.speedscope.json"'})
+
+@router.get("/jobs/{job_id}/cube")
+async def get_job_cube(job_id: str, group_by: Optional[str] = None, measure: Optional[str] = None,
+                       month: Optional[str] = None, rating: Optional[str] = None, sentiment: Optional[str] = None,
+                       aspect: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+                       last_days: Optional[int] = None, top_aspects: Optional[int] = None, dimensions: bool = False):
+    """
+    Slice a finished job's month x rating x sentiment x aspect cube without re-running it.
+    group_by: comma-separated dimensions to keep (others are summed over). month/rating/
+    sentiment/aspect: comma-separated labels to keep. since/until ('YYYY-MM') or last_days
+    restrict months (whole months: last_days=90 keeps the three or four latest calendar months).
+    measure: reviews (default) or mentions (aspect mentions; the default once an aspect is
+    grouped or filtered). top_aspects keeps the most-mentioned aspects. dimensions=true adds the labels.
+    e.g. group_by=sentiment,rating&last_days=90 or group_by=month,aspect&rating=1&top_aspects=5
+    """
+    job = await get_job(job_id)
+    if not job or job["status"] != "complete":
+        raise HTTPException(status_code=404, detail="Results not available")
+    if job.get("cube") is None and job.get("params"):
+        # Loaded once per process and kept with the job, like the vector index
+        cube = await asyncio.to_thread(load_cube, job["sku"], job["params"])
+        if cube is None:
+            cube = ((await asyncio.to_thread(StageCheckpoints(job["sku"], job["params"]).load, "cube")) or {}).get("cube")
+        job["cube"] = cube
+    cube = job.get("cube")
+    if cube is None:
+        raise HTTPException(status_code=404, detail="No cube for this job (it predates cubes; re-run with refresh=true)")
+    if last_days is not None:
+        since = max(since or "", (date.today() - timedelta(days=last_days)).strftime("%Y-%m"))
+    split = lambda value: [v.strip() for v in value.split(",") if v.strip()] if value else None
+    filters = {"month": split(month), "rating": split(rating), "sentiment": split(sentiment), "aspect": split(aspect)}
+    start = time.perf_counter()
+    try:
+        result = cube.slice(split(group_by) or (), measure, filters, since, until, top_aspects)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result["slice_ms"] = round(1000 * (time.perf_counter() - start), 3)
+    if dimensions:
+        result["dimensions"] = cube.labels
+    return FastJSONResponse(result)
+
+@router.get("/jobs/{job_id}/export")
+async def export_job_reviews(job_id: str, format: str = "ndjson", columns: Optional[str] = None,
+                             sentiment: Optional[str] = None, source: Optional[str] = None, aspect: Optional[str] = None,
+                             min_rating: Optional[int] = None, max_rating: Optional[int] = None,
+                             start_date: Optional[date] = None, end_date: Optional[date] = None):
+    """
+    Per-review output of a finished job (text, clean text, sentiment, probabilities, aspects),
+    streamed as NDJSON or parquet a chunk of rows at a time from the job's stored export, so
+    memory does not grow with the job. columns: comma-separated subset. sentiment/source/aspect:
+    comma-separated values to keep (source is text or rating_only; aspect keeps reviews
+    mentioning any of them). min_rating/max_rating and start_date/end_date (created_date,
+    end exclusive) narrow the rows further.
+    """
+    if format not in ("ndjson", "parquet"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'parquet'")
+    job = await get_job(job_id)
+    if not job or job["status"] != "complete":
+        raise HTTPException(status_code=404, detail="Results not available")
+    path = export_path(job["sku"], job.get("params", {}))
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="No review export for this job (it predates exports; re-run with refresh=true)")
+    split = lambda value: [v.strip() for v in value.split(",") if v.strip()] if value else None
+    available = await asyncio.to_thread(export_columns, path)
+    selected = split(columns)
+    unknown = [c for c in selected or [] if c not in available]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown columns {unknown}; available: {', '.join(available)}")
+    filters = {"sentiment": split(sentiment), "source": split(source), "aspect": split(aspect), "min_rating": min_rating,
+               "max_rating": max_rating, "since": datetime.combine(start_date, datetime.min.time()) if start_date else None,
+               "until": datetime.combine(end_date, datetime.min.time()) if end_date else None}
+    # Sync generators are iterated in the threadpool, so reading and encoding stay off the event loop
+    if format == "parquet":
+        return StreamingResponse(iter_parquet(path, selected, filters), media_type="application/vnd.apache.parquet",
+                                 headers={"Content-Disposition": f'attachment; filename="{job["sku"]}_{job_id}.parquet"'})
+    return StreamingResponse(iter_ndjson(path, selected, filters), media_type="application/x-ndjson",
+                             headers={"Content-Disposition": f'attachment; filename="{job["sku"]}_{job_id}.ndjson"'})
+
+@router.get("/ready")
+async def get_ready():
+    """
+    Readiness probe: 200 once the background warm-up has loaded every required component
+    (WARMUP_REQUIRED), 503 until then. Per-component state is listed either way; optional
+    components that failed are retried in the background without affecting readiness.
+    """
+    state = warm_state()
+    return JSONResponse(status_code=200 if is_ready() else 503, content={"ready": is_ready(), "components": state})
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus text exposition of stage timings, API latency/token usage, cache hits,
+    jobs in the store by status, work-queue depth, event-loop lag and process RSS.
+    """
+    JOBS.replace({(status,): count for status, count in (await asyncio.to_thread(count_jobs_by_status)).items()})
+    JOB_QUEUE.replace({(state,): count for state, count in (await asyncio.to_thread(count_queue)).items()})
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@router.get("/loop-stalls")
+async def get_loop_stalls():
+    """Recent event-loop stalls in this process (longer than LOOP_BLOCK_THRESHOLD_MS), with the blocking stack."""
+    return LOOP_WATCHDOG.report()
+
 @router.get("/results/{job_id}")
-async def get_results(job_id: str):
-    job = jobs.get(job_id)
+async def get_results(job_id: str, request: Request, fields: Optional[str] = None,
+                      sample_offset: int = 0, sample_limit: Optional[int] = None):
+    """
+    Final results. `fields` (comma-separated, dotted paths allowed) trims the payload to the
+    sections a view renders; sample_offset/sample_limit page through sample-review lists.
+    Responses carry an ETag, so unchanged results come back as 304.
+    """
+    job = await get_job(job_id)
     if not job or job["status"] != "complete":
         raise HTTPException(status_code=404, detail="Results not available")
-    result = job["result"]
-    # Add aspect summary to the result
-    result["aspect_summary"] = job.get("aspect_summary", [])
-    return result
+    def build_payload():
+        # Add aspect summary to the result
+        result = {**job["result"], "aspect_summary": job.get("aspect_summary", [])}
+        return paginate_samples(select_fields(result, fields), sample_offset, sample_limit)
+    return cached_json_response(request, job_etag(job_id, job, request), build_payload)
+
+@router.get("/jobs/{job_id}/similar")
+async def get_similar_reviews(job_id: str, q: str, k: int = 10, sentiment: Optional[str] = None):
+    """
+    Semantic search over a finished job's reviews: embeds `q` and returns the k most similar
+    reviews (near-duplicates collapsed), optionally restricted to one sentiment.
+    """
+    job = await get_job(job_id)
+    if not job or job["status"] != "complete":
+        raise HTTPException(status_code=404, detail="Results not available")
+    params = job.get("params") or {}
+    # Vectors and review rows are saved with the job's results (search_index and export stages),
+    # so stored and older jobs stay searchable; indexes are cached in a bounded LRU
+    entry = await asyncio.to_thread(search_indexes.get, search_index_path(job["sku"], params)) if params else None
+    path = export_path(job["sku"], params)
+    if entry is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Review embeddings are not available for this job")
+    index, sentiments = entry
+    k = max(1, min(k, 100))
+    # The query must be embedded by the provider that embedded the reviews (jobs predating providers used OpenAI)
+    provider = get_embedding_provider(params.get("embedding_provider", "openai"))
+    if provider.name == "openai":
+        query_vector = (await embed_texts([q], dimensions=index.dim))[0]
+    else:
+        query_vector = (await provider.embed([q]))[0]
+    if len(query_vector) != index.dim:
+        raise HTTPException(status_code=409, detail=f"Query embedding has {len(query_vector)} dimensions, index has {index.dim}")
+    mask = sentiments == sentiment if sentiment else None
+    start = time.perf_counter()
+    hits = index.search(query_vector, k=k, mask=mask)
+    search_ms = round(1000 * (time.perf_counter() - start), 3)
+    rows = await asyncio.to_thread(read_export_rows, path, [idx for idx, _ in hits],
+                                   ["clean", "sentiment", "product_rating", "created_date", "duplicate_count"])
+    results = []
+    for idx, score in hits:
+        review = rows.get(idx, {})
+        results.append({
+            "score": round(score, 4),
+            "review": review.get("clean"),
+            "sentiment": review.get("sentiment"),
+            "product_rating": review.get("product_rating"),
+            "created_date": review.get("created_date"),
+            "duplicate_count": review.get("duplicate_count") or 1,
+        })
+    return FastJSONResponse({"query": q, "index_mode": index.mode, "indexed": len(index), "search_ms": search_ms, "results": results})
 
 @router.get("/summary/{job_id}")
-async def get_summary(job_id: str, request: Request):
-    job = jobs.get(job_id)
+async def get_summary(job_id: str, request: Request, fields: Optional[str] = None,
+                      sample_offset: int = 0, sample_limit: Optional[int] = None):
+    job = await get_job(job_id)
     if not job or "stats_summary" not in job:
         raise HTTPException(status_code=404, detail="Stats summary not available for this job.")
     stats_summary = job["stats_summary"]
-    summary = await generate_gpt_summary(stats_summary)
-    if summary.startswith("[ERROR]"):
-        raise HTTPException(status_code=500, detail=summary)
-    return {
-        "summary": summary,
-        "stats": stats_summary
-    }
+    # The summary only depends on the job's stats, so it is generated once and reused
+    async with job.setdefault("summary_lock", asyncio.Lock()):
+        if job.get("gpt_summary") is None:
+            with time_stage(job, "gpt_summary"):
+                summary = await generate_gpt_summary(stats_summary)
+            if summary.startswith("[ERROR]"):
+                raise HTTPException(status_code=500, detail=summary)
+            job["gpt_summary"] = summary
+            if job["status"] == "complete":
+                await asyncio.to_thread(save_job, job_id, job)
+                await asyncio.to_thread(store_summary, job_id, job)
+    def build_payload():
+        payload = {
+            "summary": job["gpt_summary"],
+            "stats": stats_summary
+        }
+        return paginate_samples(select_fields(payload, fields), sample_offset, sample_limit)
+    return cached_json_response(request, job_etag(job_id, job, request), build_payload)
 
 @router.post("/feedback")
 async def submit_feedback(
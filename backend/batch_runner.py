@@ -0,0 +1,136 @@
+import logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+import os
+import time
+import asyncio
+import argparse
+from collections import Counter
+from dotenv import load_dotenv
+
+from core.langgraph_pipeline import run_pipeline, analysis_params, build_result, NoReviewsFound
+from core.result_store import ResultWriter, save_result, load_result, compact_results
+from core.fetch_reviews import fetch_category_skus
+from core.gpt_summary import generate_gpt_summary
+from core.openai_client import close_openai_client
+from core.rate_governor import current_job_id, current_priority, PRIORITY_BULK
+from core.batch_llm import current_llm_mode, LLM_MODES
+
+load_dotenv()
+
+# SKUs analyzed at once; each runs the full pipeline, so LLM quota is the real limit
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+# SKUs with a stored result younger than this are skipped, so a re-run picks up where a crashed one stopped
+BATCH_SKIP_FRESH_HOURS = float(os.getenv("BATCH_SKIP_FRESH_HOURS", "12"))
+# "bulk" sends the LLM stages of every SKU through the offline Batch API (see core.batch_llm)
+BATCH_LLM_MODE = os.getenv("BATCH_LLM_MODE", "interactive").lower()
+
+
+async def analyze_sku(sku: str, params: dict, with_summary: bool = True, llm_mode: str = None,
+                      writer: ResultWriter = None) -> str:
+    """Run the pipeline (and GPT summary) for one SKU and write it to the result store (through `writer` if given)."""
+    job = {"sku": sku, "status": "processing", "step": 0, "params": params}
+    # Batch calls queue behind interactive jobs when sharing an OpenAI quota
+    current_job_id.set(f"batch:{sku}")
+    current_priority.set(PRIORITY_BULK)
+    current_llm_mode.set(llm_mode)
+    try:
+        state = await run_pipeline(sku, params, job)
+    except NoReviewsFound:
+        return "no_data"
+    job["result"] = build_result(sku, state)
+    job["aspect_summary"] = state["aspect_summary"]
+    if with_summary:
+        summary = await generate_gpt_summary(state["stats_summary"], priority=PRIORITY_BULK)
+        job["gpt_summary"] = None if summary.startswith("[ERROR]") else summary
+    if writer is not None:
+        await asyncio.to_thread(writer.add, sku, params, job, "batch")
+    else:
+        await asyncio.to_thread(save_result, sku, params, job, "batch")
+    return "complete"
+
+
+async def run_batch(skus, params: dict, concurrency: int = BATCH_CONCURRENCY,
+                    skip_fresh_hours: float = BATCH_SKIP_FRESH_HOURS, with_summary: bool = True,
+                    llm_mode: str = BATCH_LLM_MODE) -> Counter:
+    """
+    Analyze `skus` with at most `concurrency` pipelines in flight; returns outcome counts.
+    Results are appended to the store in batches and its part files compacted at the end.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    outcomes = Counter()
+    writer = ResultWriter()
+
+    async def worker(sku):
+        async with semaphore:
+            if skip_fresh_hours and await asyncio.to_thread(load_result, sku, params, skip_fresh_hours):
+                outcome = "fresh"
+            else:
+                start = time.perf_counter()
+                try:
+                    outcome = await analyze_sku(sku, params, with_summary, llm_mode, writer)
+                except Exception:
+                    logging.exception(f"Batch analysis of SKU {sku} failed")
+                    outcome = "failed"
+                logging.info(f"SKU {sku}: {outcome} in {time.perf_counter() - start:.1f}s")
+            outcomes[outcome] += 1
+            print(f"[{sum(outcomes.values())}/{len(skus)}] SKU {sku}: {outcome}")
+
+    try:
+        await asyncio.gather(*(worker(sku) for sku in skus))
+    finally:
+        await asyncio.to_thread(writer.flush)
+    kept = await asyncio.to_thread(compact_results)
+    logging.info(f"Result store compacted: {kept} results")
+    return outcomes
+
+
+def read_skus(args) -> list:
+    skus = []
+    if args.skus:
+        skus += [s.strip() for s in args.skus.split(",") if s.strip()]
+    if args.sku_file:
+        with open(args.sku_file) as f:
+            skus += [line.strip() for line in f if line.strip()]
+    if args.mc1 or args.mc2:
+        skus += fetch_category_skus(args.mc1, args.mc2, min_reviews=args.min_reviews, limit=args.limit)
+    # Keep the first occurrence of each SKU, in order
+    return list(dict.fromkeys(skus))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute analyses for a SKU list or merch category into the result store.")
+    parser.add_argument("--skus", help="comma-separated SKUs")
+    parser.add_argument("--sku-file", help="file with one SKU per line")
+    parser.add_argument("--mc1", help="analyze every SKU in this merch classification 1")
+    parser.add_argument("--mc2", help="analyze every SKU in this merch classification 2")
+    parser.add_argument("--min-reviews", type=int, default=1, help="skip category SKUs with fewer approved reviews")
+    parser.add_argument("--limit", type=int, help="at most this many category SKUs (most-reviewed first)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--skip-fresh-hours", type=float, default=BATCH_SKIP_FRESH_HOURS,
+                        help="skip SKUs with a stored result younger than this (0 recomputes everything)")
+    parser.add_argument("--sampling", help="head or stratified (default SAMPLING_MODE)")
+    parser.add_argument("--sample-size", type=int)
+    parser.add_argument("--embedding-provider", help="openai or local (default EMBEDDING_PROVIDER)")
+    parser.add_argument("--no-summary", action="store_true", help="skip the GPT summary")
+    parser.add_argument("--llm-mode", choices=LLM_MODES, default=BATCH_LLM_MODE,
+                        help="bulk: aspect extraction and LLM cleaning via the offline Batch API (cheaper, slower)")
+    args = parser.parse_args()
+    skus = read_skus(args)
+    if not skus:
+        parser.error("no SKUs given: use --skus, --sku-file, --mc1 or --mc2")
+    # Same defaults as /analyze, so the stored results are found by its lookups
+    params = analysis_params(args.sampling, args.sample_size, None, args.embedding_provider)
+    print(f"Analyzing {len(skus)} SKUs with concurrency {args.concurrency} ({args.llm_mode} LLM calls)")
+
+    async def run():
+        try:
+            return await run_batch(skus, params, args.concurrency, args.skip_fresh_hours, not args.no_summary, args.llm_mode)
+        finally:
+            await close_openai_client()
+    start = time.perf_counter()
+    outcomes = asyncio.run(run())
+    print(f"Done in {time.perf_counter() - start:.0f}s: {dict(outcomes)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,20 @@
 import os
 import json
-import asyncio
+import time
 from typing import List
+from .metrics import record_llm_call
+from .rate_governor import get_governor, estimate_tokens, gather_or_cancel
+from .batch_llm import chat_completion
 
-async def batch_llm_extract_aspects(reviews: List[str], batch_size: int = 25, max_concurrent_batches: int = 15) -> List[dict]:
+async def batch_llm_extract_aspects(reviews: List[str], batch_size: int = 25) -> List[dict]:
     """
     For each review, use LLM to extract all mentioned aspects/themes and the sentiment for each aspect.
     Returns a list of dicts per review: [{aspects: [{aspect, sentiment}, ...]}, ...]
-    Processes batches concurrently up to max_concurrent_batches.
+    All batches are submitted at once; the process-wide chat rate governor decides how many run
+    concurrently and retries rate-limited ones. A batch that still fails raises, so the job
+    fails (and can be resumed) instead of silently recording empty aspects. In bulk LLM mode
+    (core.batch_llm) the batches go out together as one offline Batch API job instead.
     """
-    import openai
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY not set in environment")
-    client = openai.AsyncOpenAI(api_key=api_key)
-
     system_prompt = """You are an expert product sentiment analyst specializing in customer reviews. Your task is to extract ALL product aspects and themes mentioned in reviews and analyze sentiment with high precision and consistency.
 
 IMPORTANT: You must extract ANY and ALL aspects or themes mentioned in the review, even if they are not in the list below. The list is for illustration only. Do not limit yourself to these examples. If you find an aspect or theme not in the list, you must still extract it using a clear, descriptive name.
@@ -81,48 +81,58 @@ QUALITY CHECKS:
 - Don't assume sentiment from irrelevant context
 - Use clear, descriptive aspect names even for unusual or unique features mentioned"""
 
-    semaphore = asyncio.Semaphore(max_concurrent_batches)
+    governor = get_governor("chat")
     all_results = [None] * len(reviews)
 
     async def process_batch(batch_idx, batch, start_idx):
-        async with semaphore:
-            # Create more structured user prompt
-            user_prompt = f"""Analyze the following {len(batch)} product reviews for aspects and sentiment:
-                REVIEWS:
-                """ + "\n".join(f"Review {j+1}: {r}" for j, r in enumerate(batch)) + """
-
-                Extract aspects and sentiment for each review following the guidelines above. Focus on consistency and accuracy."""
-            try:
-                response = await client.chat.completions.create(
-                    model="gpt-4.1-2025-04-14",
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    temperature=0.1,
-                    max_tokens=3000
-                )
-                content = response.choices[0].message.content.strip()
-                # Handle potential wrapper objects
-                if content.startswith('{"reviews":'):
-                    batch_results = json.loads(content)["reviews"]
-                else:
-                    batch_results = json.loads(content)
-                    
-                if isinstance(batch_results, list):
-                    all_results[start_idx:start_idx+len(batch)] = batch_results
-                else:
-                    all_results[start_idx:start_idx+len(batch)] = [{}] * len(batch)
-                    
-            except Exception as e:
-                print(f"Error in aspect extraction batch {batch_idx+1}: {e}")
+        # Create more structured user prompt
+        user_prompt = f"""Analyze the following {len(batch)} product reviews for aspects and sentiment:
+            REVIEWS:
+            """ + "\n".join(f"Review {j+1}: {r}" for j, r in enumerate(batch)) + """
+
+            Extract aspects and sentiment for each review following the guidelines above. Focus on consistency and accuracy."""
+        model = "gpt-4.1-2025-04-14"
+        max_tokens = 3000
+        start = time.perf_counter()
+        try:
+            # Live under the governor, or queued into an offline batch when the job runs in bulk mode
+            response = await chat_completion(
+                governor, estimate_tokens([system_prompt, user_prompt], max_tokens),
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                temperature=0.1,
+                max_tokens=max_tokens)
+        except Exception as e:
+            record_llm_call("aspect_extract", model, time.perf_counter() - start, outcome="error")
+            print(f"Error in aspect extraction batch {batch_idx+1}: {e}")
+            raise
+        record_llm_call("aspect_extract", model, time.perf_counter() - start, response.usage)
+        try:
+            content = response.choices[0].message.content.strip()
+            # Handle potential wrapper objects
+            if content.startswith('{"reviews":'):
+                batch_results = json.loads(content)["reviews"]
+            else:
+                batch_results = json.loads(content)
+
+            if isinstance(batch_results, list):
+                # Pad/trim so a short answer cannot shift later reviews' results
+                all_results[start_idx:start_idx+len(batch)] = (batch_results + [{}] * len(batch))[:len(batch)]
+            else:
                 all_results[start_idx:start_idx+len(batch)] = [{}] * len(batch)
 
+        except Exception as e:
+            print(f"Unparseable aspect extraction output for batch {batch_idx+1}: {e}")
+            all_results[start_idx:start_idx+len(batch)] = [{}] * len(batch)
+
     tasks = []
     for i in range(0, len(reviews), batch_size):
         batch = reviews[i:i+batch_size]
         batch_idx = i // batch_size
         tasks.append(process_batch(batch_idx, batch, i))
     
-    await asyncio.gather(*tasks)
+    await gather_or_cancel(*tasks)
     return all_results
\ No newline at end of file
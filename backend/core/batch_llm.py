@@ -0,0 +1,222 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import contextvars
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from core.rate_governor import current_job_id, total_usage_tokens
+
+# "interactive" sends chat completions right away under the rate governor; "bulk" queues them
+# into OpenAI's asynchronous Batch API (half price, its own quota, results within the
+# completion window). Jobs pick a mode with POST /analyze?llm_mode= or batch_runner --llm-mode.
+LLM_MODE = os.getenv("LLM_MODE", "interactive").lower()
+LLM_MODES = ("interactive", "bulk")
+# Request/result JSONL files of bulk batches, and per job (jobs/{job_id}.json) the batch each of its
+# in-flight requests went into, so a restarted job re-attaches to it
+BATCH_DIR = os.getenv("BATCH_DIR", "llm_batches")
+BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", "30"))
+BATCH_COMPLETION_WINDOW = os.getenv("BATCH_COMPLETION_WINDOW", "24h")
+# Bulk requests made within this many seconds of each other (all batches of a stage, and
+# concurrent jobs in batch_runner) go into one batch file
+BATCH_COLLECT_SECONDS = float(os.getenv("BATCH_COLLECT_SECONDS", "2"))
+BATCH_MAX_REQUESTS = 50000  # Batch API limit per file
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATES = ("completed", "failed", "expired", "cancelled")
+
+# Mode of the work running in the current task (None: LLM_MODE); set per job like current_job_id
+current_llm_mode = contextvars.ContextVar("current_llm_mode", default=None)
+
+
+def llm_mode() -> str:
+    return (current_llm_mode.get() or LLM_MODE).lower()
+
+
+def _namespace(value):
+    """JSON response body -> attribute access, as on the SDK's response objects."""
+    if isinstance(value, dict):
+        return SimpleNamespace(**{k: _namespace(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [_namespace(v) for v in value]
+    return value
+
+
+def _job_record_path(job_id) -> str:
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", str(job_id)) if job_id is not None else "_none"
+    return os.path.join(BATCH_DIR, "jobs", f"{name}.json")
+
+
+def _load_job_record(job_id) -> Dict[str, List[str]]:
+    """Request hash -> [batch id, custom id] of the job's bulk requests that are still in flight."""
+    try:
+        with open(_job_record_path(job_id)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_job_record(job_id, record: Dict[str, List[str]]):
+    path = _job_record_path(job_id)
+    if not record:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(record, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _request_hash(body: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+async def run_chat_batch(bodies: List[Dict[str, Any]], client=None, job_ids: List[Any] = None) -> List[Optional[Any]]:
+    """
+    Submit chat-completion request bodies as one Batch API job, poll until it ends and return
+    the responses in request order (None for requests that failed or did not finish in time).
+    `job_ids` (default: the current job for every request) says which job each request belongs
+    to; a restarted job re-attaches its requests to the batches they were submitted in, however
+    the collector groups them this time.
+    """
+    from core.openai_client import get_openai_client
+    client = client or get_openai_client()
+    job_ids = job_ids or [current_job_id.get()] * len(bodies)
+    hashes = [_request_hash(body) for body in bodies]
+    records = {job: _load_job_record(job) for job in set(job_ids)}
+
+    # Requests already in a live batch from before a restart: wait for that batch
+    attached: Dict[str, Any] = {}
+    located: Dict[int, tuple] = {}
+    for i, (job, h) in enumerate(zip(job_ids, hashes)):
+        saved = records[job].get(h)
+        if not saved:
+            continue
+        batch_id, custom_id = saved
+        if batch_id not in attached:
+            attached[batch_id] = await client.batches.retrieve(batch_id)
+        if attached[batch_id].status not in ("failed", "expired", "cancelled"):
+            located[i] = (batch_id, custom_id)
+    fresh = [i for i in range(len(bodies)) if i not in located]
+    if fresh:
+        lines = [json.dumps({"custom_id": f"request-{k}", "method": "POST", "url": BATCH_ENDPOINT, "body": bodies[i]})
+                 for k, i in enumerate(fresh)]
+        content = ("\n".join(lines) + "\n").encode("utf-8")
+        upload = await client.files.create(file=(f"{hashlib.sha256(content).hexdigest()[:16]}.jsonl", content), purpose="batch")
+        batch = await client.batches.create(input_file_id=upload.id, endpoint=BATCH_ENDPOINT, completion_window=BATCH_COMPLETION_WINDOW,
+                                            metadata={"job_id": ",".join(sorted({str(job_ids[i]) for i in fresh})), "requests": str(len(fresh))})
+        os.makedirs(BATCH_DIR, exist_ok=True)
+        with open(os.path.join(BATCH_DIR, f"{batch.id}.input.jsonl"), "wb") as f:
+            f.write(content)
+        attached[batch.id] = batch
+        for k, i in enumerate(fresh):
+            located[i] = (batch.id, f"request-{k}")
+            records[job_ids[i]][hashes[i]] = [batch.id, f"request-{k}"]
+        for job, record in records.items():
+            _save_job_record(job, record)
+    batch_ids = list(dict.fromkeys(batch_id for batch_id, _ in located.values()))
+    logging.info(f"Bulk LLM batches {', '.join(batch_ids)}: {len(bodies)} requests ({len(bodies) - len(fresh)} re-attached)")
+    start = time.perf_counter()
+
+    responses: Dict[tuple, Any] = {}
+    for batch_id in batch_ids:
+        batch = attached[batch_id]
+        while batch.status not in TERMINAL_STATES:
+            await asyncio.sleep(BATCH_POLL_SECONDS)
+            batch = await client.batches.retrieve(batch_id)
+        for kind, file_id in (("output", batch.output_file_id), ("errors", getattr(batch, "error_file_id", None))):
+            if not file_id:
+                continue
+            text = (await client.files.content(file_id)).text
+            with open(os.path.join(BATCH_DIR, f"{batch_id}.{kind}.jsonl"), "w") as f:
+                f.write(text)
+            for line in text.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                response = record.get("response") or {}
+                if response.get("status_code") == 200:
+                    responses[(batch_id, record["custom_id"])] = _namespace(response["body"])
+
+    results: List[Optional[Any]] = [responses.get(located[i]) for i in range(len(bodies))]
+    # Results are read: these requests no longer need re-attaching
+    records = {job: _load_job_record(job) for job in records}
+    for job, h in zip(job_ids, hashes):
+        records[job].pop(h, None)
+    for job, record in records.items():
+        _save_job_record(job, record)
+    done = sum(r is not None for r in results)
+    logging.info(f"Bulk LLM batches {', '.join(batch_ids)} ended after {time.perf_counter() - start:.0f}s: {done}/{len(bodies)} succeeded")
+    return results
+
+
+class BatchCollector:
+    """Gathers bulk-mode chat requests for BATCH_COLLECT_SECONDS and submits them as one batch."""
+
+    def __init__(self):
+        self.pending = []
+        self._flush_handle = None
+        self._tasks = set()
+
+    async def submit(self, body: Dict[str, Any]):
+        """The response for `body`, or None if the batch did not produce one."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((body, current_job_id.get(), future))
+        if len(self.pending) >= BATCH_MAX_REQUESTS:
+            self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(BATCH_COLLECT_SECONDS, self.flush)
+        return await future
+
+    def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        requests, self.pending = self.pending, []
+        if requests:
+            task = asyncio.get_running_loop().create_task(self._run(requests))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, requests):
+        try:
+            results = await run_chat_batch([body for body, _, _ in requests], job_ids=[job for _, job, _ in requests])
+        except Exception as e:
+            logging.exception(f"Bulk LLM batch of {len(requests)} requests failed: {e}")
+            results = [None] * len(requests)
+        for (_, _, future), result in zip(requests, results):
+            if not future.done():
+                future.set_result(result)
+
+
+_collector = None
+_collector_loop = None
+
+
+def get_batch_collector() -> BatchCollector:
+    """One collector per process (and event loop), shared by every job running in bulk mode."""
+    global _collector, _collector_loop
+    loop = asyncio.get_running_loop()
+    if _collector is None or _collector_loop is not loop:
+        _collector, _collector_loop = BatchCollector(), loop
+    return _collector
+
+
+async def chat_completion(governor, est_tokens: int, **body):
+    """
+    One chat completion in the current job's LLM mode: under the rate governor now, or via the
+    next offline batch in bulk mode. Requests the batch could not answer fall back to a live call.
+    """
+    if llm_mode() == "bulk":
+        response = await get_batch_collector().submit(body)
+        if response is not None:
+            return response
+        logging.warning("Bulk LLM request got no batch result; sending it interactively")
+    from core.openai_client import get_openai_client
+    client = get_openai_client()
+    return await governor.call(lambda: client.chat.completions.create(**body), est_tokens, usage_tokens=total_usage_tokens)
@@ -0,0 +1,59 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+
+# Stage outputs are pickled under CHECKPOINT_DIR/{sku}/{input_hash}/{stage}.pkl
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "checkpoints")
+# Checkpoints older than this are ignored so a fresh /analyze eventually re-fetches new reviews
+CHECKPOINT_TTL_SECONDS = int(os.getenv("CHECKPOINT_TTL_SECONDS", str(24 * 3600)))
+
+
+def input_hash(sku: str, params: Dict[str, Any]) -> str:
+    payload = json.dumps({"sku": sku, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class StageCheckpoints:
+    """
+    Checkpoint store for one pipeline run, keyed by SKU and the hash of its inputs.
+    Writes go to a temp file and are renamed into place, so a crash never leaves a
+    half-written checkpoint behind.
+    """
+
+    def __init__(self, sku: str, params: Dict[str, Any], root: str = None, ttl_seconds: int = None):
+        self.key = f"{sku}/{input_hash(sku, params)}"
+        self.dir = os.path.join(root or CHECKPOINT_DIR, str(sku), input_hash(sku, params))
+        self.ttl_seconds = CHECKPOINT_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+
+    def _path(self, stage: str) -> str:
+        return os.path.join(self.dir, f"{stage}.pkl")
+
+    def load(self, stage: str) -> Optional[Dict[str, Any]]:
+        path = self._path(stage)
+        try:
+            if self.ttl_seconds and time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                return None
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable checkpoint {path}: {e}")
+            return None
+
+    def save(self, stage: str, outputs: Dict[str, Any]):
+        os.makedirs(self.dir, exist_ok=True)
+        path = self._path(stage)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(outputs, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def completed_stages(self):
+        if not os.path.isdir(self.dir):
+            return []
+        return sorted(name[:-4] for name in os.listdir(self.dir) if name.endswith(".pkl"))
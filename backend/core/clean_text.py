@@ -1,30 +1,42 @@
 import regex as re
 import hashlib
-import pandas as pd
-from bs4 import BeautifulSoup
-import ftfy
-import emoji
-import langdetect
-from spellchecker import SpellChecker
-import nltk
+from functools import lru_cache
+from typing import List
+from core.lang_id import detect_languages
 #from nltk.corpus import stopwords  # Remove stopwords usage
-from nltk.stem import WordNetLemmatizer
 
-# Download NLTK data if not already present
-try:
-    nltk.data.find('corpora/wordnet')
-except LookupError:
-    nltk.download('wordnet')
-# Remove stopwords download and usage
+# bs4, ftfy, emoji, pyspellchecker and nltk are imported on first use so that
+# importing the API stays fast; core.warmup preloads them in the background after startup.
+
+@lru_cache(maxsize=None)
+def get_spellchecker(language: str = 'en'):
+    """Process-wide SpellChecker; building its frequency index is the slow part."""
+    from spellchecker import SpellChecker
+    return SpellChecker(language=language)
+
+@lru_cache(maxsize=None)
+def get_lemmatizer():
+    """Process-wide WordNet lemmatizer, downloading wordnet only when it is first needed."""
+    import nltk
+    from nltk.stem import WordNetLemmatizer
+    try:
+        nltk.data.find('corpora/wordnet')
+    except LookupError:
+        nltk.download('wordnet')
+    # Remove stopwords download and usage
+    return WordNetLemmatizer()
 
 class CleanTextPipeline:
     def __init__(self, language='en'):
-        self.spell = SpellChecker(language=language)
+        self.spell = get_spellchecker(language)
         # self.stopwords = set(stopwords.words(language))  # Remove stopwords usage
-        self.lemmatizer = WordNetLemmatizer()
+        self.lemmatizer = get_lemmatizer()
 
-    def clean(self, text: str) -> dict:
-        original = text
+    def normalize(self, text: str) -> str:
+        """Steps 2-5: HTML sanitise, mojibake fix, emoji/control strip, whitespace normalise."""
+        from bs4 import BeautifulSoup
+        import ftfy
+        import emoji
         # 1. Null/blank/dup filter (handled at DataFrame level)
         # 2. HTML sanitise
         text = BeautifulSoup(text, "html.parser").get_text(" ", strip=True)
@@ -35,11 +47,10 @@ class CleanTextPipeline:
         text = re.sub(r"\p{C}+", " ", text)
         # 5. Whitespace normalise
         text = re.sub(r"\s+", " ", text).strip()
-        # 6. Language detection
-        try:
-            lang = langdetect.detect(text)
-        except Exception:
-            lang = 'unknown'
+        return text
+
+    def finish(self, original: str, text: str, lang: str) -> dict:
+        """Steps 7-9 plus spell correction and lemmatization, run only for English text."""
         if lang != 'en':
             return {"clean": None, "lang": lang, "hash": self.hash_text(original)}
         # 7. Length bucketing (handled at pipeline level)
@@ -60,6 +71,18 @@ class CleanTextPipeline:
         text = " ".join(lemmatized)
         return {"clean": text, "lang": lang, "hash": hash_val}
 
+    def clean(self, text: str) -> dict:
+        return self.clean_batch([text])[0]
+
+    def clean_batch(self, texts: List[str]) -> List[dict]:
+        """
+        Normalise every text, identify languages in one batch (6. Language detection), then
+        spell-correct and lemmatize only the English ones; non-English reviews get clean=None.
+        """
+        normalized = [self.normalize(t) for t in texts]
+        langs = detect_languages(normalized)
+        return [self.finish(original, text, lang) for original, text, lang in zip(texts, normalized, langs)]
+
     @staticmethod
     def hash_text(text: str) -> str:
         return hashlib.sha256(text.encode("utf-8")).hexdigest() 
\ No newline at end of file
@@ -1,27 +1,24 @@
 import regex as re
 import hashlib
 from typing import List, Dict
-from bs4 import BeautifulSoup
-import ftfy
-import emoji
-import langdetect
-from spellchecker import SpellChecker
-from nltk.stem import WordNetLemmatizer
 from core.openai_client import get_cleaning_steps_batch
-import langgraph
+from core.clean_text import get_spellchecker, get_lemmatizer
+from core.lang_id import detect_language, detect_languages
+from core.rate_governor import gather_or_cancel
 import logging
-import asyncio
-from asyncio import Semaphore
 
 # Individual cleaning step functions
 
 def html_step(text):
+    from bs4 import BeautifulSoup
     return BeautifulSoup(text, "html.parser").get_text(" ", strip=True)
 
 def encoding_step(text):
+    import ftfy
     return ftfy.fix_text(text)
 
 def emoji_step(text):
+    import emoji
     return emoji.replace_emoji(text, replace="")
 
 def control_step(text):
@@ -31,13 +28,7 @@ def whitespace_step(text):
     return re.sub(r"\s+", " ", text).strip()
 
 def langdetect_step(text):
-    try:
-        print("LANGDETECT INPUT:", text)
-        lang = langdetect.detect(text)
-        print("LANGDETECT OUTPUT:", lang)
-    except Exception:
-        lang = 'unknown'
-    return lang
+    return detect_language(text)
 
 def spell_step(text, spell):
     words = text.split()
@@ -54,43 +45,48 @@ def hash_text(text: str) -> str:
 
 # Main batch cleaning function using LangGraph
 
-async def clean_reviews_langgraph(reviews: List[str], batch_size: int = 100, max_concurrent_batches: int = 15) -> List[Dict]:
+async def clean_reviews_langgraph(reviews: List[str], batch_size: int = 100) -> List[Dict]:
     """
     Clean a batch of reviews using LLM-driven step selection and LangGraph orchestration.
     Splits reviews into batches to avoid context window errors. Returns a list of dicts with cleaned text, lang, and hash.
-    Processes batches concurrently up to max_concurrent_batches.
+    Batches are submitted together; the shared chat rate governor limits how many LLM calls run at once.
     """
-    spell = SpellChecker(language='en')
-    lemmatizer = WordNetLemmatizer()
+    spell = get_spellchecker('en')
+    lemmatizer = get_lemmatizer()
     cleaned = [None] * len(reviews)
-    semaphore = Semaphore(max_concurrent_batches)
+    # Identify languages up front so non-English reviews never reach the LLM, spell correction or embedding
+    langs = detect_languages([whitespace_step(t) for t in reviews])
+    english = []
+    for idx, (text, lang) in enumerate(zip(reviews, langs)):
+        if lang == 'en':
+            english.append(idx)
+        else:
+            cleaned[idx] = {"clean": None, "lang": lang, "hash": hash_text(text)}
+    logging.info(f"Language ID: {len(english)}/{len(reviews)} reviews are English.")
 
     async def process_batch(i):
-        async with semaphore:
-            batch = reviews[i:i+batch_size]
-            step_lists = await get_cleaning_steps_batch(batch)
-            batch_cleaned = []
-            for j, text in enumerate(batch):
-                original = text
-                steps = step_lists[j] if j < len(step_lists) else []
-                lang = 'en'  # Assume all reviews are English
-                for step in steps:
-                    if step == "html":
-                        text = html_step(text)
-                    elif step == "encoding":
-                        text = encoding_step(text)
-                    elif step == "emoji":
-                        text = emoji_step(text)
-                    elif step == "control":
-                        text = control_step(text)
-                    elif step == "whitespace":
-                        text = whitespace_step(text)
-                text = spell_step(text, spell)
-                text = lemmatize_step(text, lemmatizer)
-                batch_cleaned.append({"clean": text, "lang": lang, "hash": hash_text(original)})
-            logging.info(f"Processed batch {(i//batch_size) + 1} ({min(i+batch_size, len(reviews))}/{len(reviews)}) reviews.")
-            cleaned[i:i+batch_size] = batch_cleaned
+        batch_indices = english[i:i+batch_size]
+        batch = [reviews[idx] for idx in batch_indices]
+        step_lists = await get_cleaning_steps_batch(batch)
+        for j, text in enumerate(batch):
+            original = text
+            steps = step_lists[j] if j < len(step_lists) else []
+            for step in steps:
+                if step == "html":
+                    text = html_step(text)
+                elif step == "encoding":
+                    text = encoding_step(text)
+                elif step == "emoji":
+                    text = emoji_step(text)
+                elif step == "control":
+                    text = control_step(text)
+                elif step == "whitespace":
+                    text = whitespace_step(text)
+            text = spell_step(text, spell)
+            text = lemmatize_step(text, lemmatizer)
+            cleaned[batch_indices[j]] = {"clean": text, "lang": "en", "hash": hash_text(original)}
+        logging.info(f"Processed batch {(i//batch_size) + 1} ({min(i+batch_size, len(english))}/{len(english)}) reviews.")
 
-    tasks = [process_batch(i) for i in range(0, len(reviews), batch_size)]
-    await asyncio.gather(*tasks)
+    tasks = [process_batch(i) for i in range(0, len(english), batch_size)]
+    await gather_or_cancel(*tasks)
     return cleaned 
\ No newline at end of file
@@ -0,0 +1,174 @@
+import os
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from core.checkpoints import input_hash
+from core.review_table import SENTIMENTS
+from core.stats_build import review_weight, aspect_result_weight
+
+# Per-job sentiment/aspect cubes, one .npz per SKU and parameter set (like the result store):
+# CUBE_DIR/{sku}/{params_hash}.npz. Written by the pipeline's cube stage, sliced by GET /jobs/{job_id}/cube.
+CUBE_DIR = os.getenv("CUBE_DIR", "cubes")
+
+DIMENSIONS = ("month", "rating", "sentiment", "aspect")
+# Review counts have no aspect axis (a review mentions any number of aspects); mention counts do
+MEASURE_DIMENSIONS = {"reviews": DIMENSIONS[:3], "mentions": DIMENSIONS}
+
+
+def _month(date) -> Optional[str]:
+    """'YYYY-MM' of a datetime or ISO string, None if missing or unparseable (as in the stats summary)."""
+    if not date:
+        return None
+    try:
+        dt = datetime.fromisoformat(date) if isinstance(date, str) else date
+        return dt.strftime('%Y-%m')
+    except Exception:
+        return None
+
+
+def _codes(values: Iterable, labels: List) -> np.ndarray:
+    index = {label: i for i, label in enumerate(labels)}
+    return np.array([index[v] for v in values], dtype=np.int32)
+
+
+class SentimentCube:
+    """
+    Pre-aggregated counts for one job, indexed by dimension codes:
+      reviews[month, rating, sentiment]            weighted reviews by classified (or rating-derived) sentiment
+      mentions[month, rating, sentiment, aspect]   weighted aspect mentions by the sentiment of the mention
+    Labels per dimension are in `labels`; a None month, rating or sentiment collects reviews without one.
+    Counts are float32 sampling-weighted estimates, rounded when sliced (as in the stats summary).
+    """
+
+    def __init__(self, labels: Dict[str, list], reviews: np.ndarray, mentions: np.ndarray):
+        self.labels = labels
+        self.reviews = reviews
+        self.mentions = mentions
+
+    def nbytes(self) -> int:
+        return int(self.reviews.nbytes + self.mentions.nbytes)
+
+    def slice(self, group_by: Sequence[str] = (), measure: str = None, filters: Dict[str, Iterable] = None,
+              since: str = None, until: str = None, top_aspects: int = None) -> Dict[str, Any]:
+        """
+        Sum the cube over every dimension not in `group_by`, after keeping only the labels in
+        `filters` ({dimension: allowed labels}) and the months in [since, until] ('YYYY-MM').
+        `measure` defaults to mentions when an aspect is grouped or filtered, else reviews.
+        top_aspects keeps the aspects with the most mentions in the filtered slice.
+        Rows come back in label order (months ascending, aspects by overall mentions).
+        """
+        filters = {k: v for k, v in (filters or {}).items() if v is not None}
+        uses_aspect = "aspect" in group_by or "aspect" in filters or top_aspects
+        measure = measure or ("mentions" if uses_aspect else "reviews")
+        if measure not in MEASURE_DIMENSIONS:
+            raise ValueError(f"measure must be one of {sorted(MEASURE_DIMENSIONS)}")
+        dims = MEASURE_DIMENSIONS[measure]
+        for dim in list(group_by) + list(filters):
+            if dim not in dims:
+                raise ValueError(f"{dim!r} is not a dimension of {measure} (dimensions: {', '.join(dims)})")
+        if top_aspects and measure != "mentions":
+            raise ValueError("top_aspects needs measure=mentions")
+        counts = self.mentions if measure == "mentions" else self.reviews
+
+        # Boolean mask per axis, then one fancy-indexed sub-cube
+        masks = []
+        for dim in dims:
+            labels = self.labels[dim]
+            mask = np.ones(len(labels), dtype=bool)
+            if dim in filters:
+                allowed = {str(v) for v in filters[dim]}
+                mask &= np.array([str(label) in allowed for label in labels], dtype=bool)
+            if dim == "month" and (since or until):
+                mask &= np.array([label is not None and (not since or label >= since[:7]) and (not until or label <= until[:7])
+                                  for label in labels], dtype=bool)
+            masks.append(mask)
+        sub = counts[np.ix_(*masks)]
+        kept = {dim: [label for label, keep in zip(self.labels[dim], mask) if keep] for dim, mask in zip(dims, masks)}
+        if top_aspects:
+            order = np.argsort(-sub.sum(axis=(0, 1, 2)), kind="stable")[:top_aspects]
+            order.sort()  # back to label order
+            sub = sub[..., order]
+            kept["aspect"] = [kept["aspect"][i] for i in order]
+
+        group_by = [dim for dim in dims if dim in group_by]  # cube axis order
+        grouped = sub.sum(axis=tuple(i for i, dim in enumerate(dims) if dim not in group_by))
+        rows = []
+        if group_by:
+            for cell in zip(*np.nonzero(np.round(grouped))):
+                row = {dim: kept[dim][i] for dim, i in zip(group_by, cell)}
+                row["count"] = int(round(float(grouped[cell])))
+                rows.append(row)
+        return {"measure": measure, "group_by": group_by, "total": int(round(float(sub.sum()))), "rows": rows}
+
+
+def build_cube(classified_reviews, rating_only_scored, aspect_results: List[dict]) -> SentimentCube:
+    """
+    Aggregate a job's text reviews (with their aspect results, same order) and rating-only
+    reviews. Weights are the same as in build_stats_summary and calculate_aspect_trend.
+    """
+    reviews = list(classified_reviews) + list(rating_only_scored)
+    months = [_month(r.get('created_date')) for r in reviews]
+    ratings = [r.get('product_rating') for r in reviews]
+    sentiments = [r.get('sentiment') for r in reviews]
+    weights = np.array([review_weight(r) for r in reviews], dtype=np.float64)
+
+    # Mentions: (review index, aspect, sentiment of the mention, weight)
+    mentions = []
+    for idx, result in enumerate(aspect_results or []):
+        if not isinstance(result, dict):
+            continue
+        weight = weights[idx] * aspect_result_weight(result)
+        for asp in result.get('aspects', []):
+            mentions.append((idx, asp['aspect'].lower(), asp['sentiment'].lower(), weight))
+
+    aspect_totals: Dict[str, float] = {}
+    for _, aspect, _, weight in mentions:
+        aspect_totals[aspect] = aspect_totals.get(aspect, 0.0) + weight
+    extra_sentiments = [s for s in dict.fromkeys(sentiments + [m[2] for m in mentions]) if s is not None and s not in SENTIMENTS]
+    labels = {
+        "month": sorted({m for m in months if m}) + ([None] if None in months else []),
+        "rating": sorted({r for r in ratings if r is not None}) + ([None] if None in ratings else []),
+        "sentiment": list(SENTIMENTS) + extra_sentiments + ([None] if None in sentiments else []),
+        "aspect": sorted(aspect_totals, key=lambda a: (-aspect_totals[a], a)),
+    }
+    month_codes = _codes(months, labels["month"])
+    rating_codes = _codes(ratings, labels["rating"])
+    shape = tuple(len(labels[dim]) for dim in DIMENSIONS)
+
+    review_counts = np.zeros(shape[:3], dtype=np.float64)
+    np.add.at(review_counts, (month_codes, rating_codes, _codes(sentiments, labels["sentiment"])), weights)
+    mention_counts = np.zeros(shape, dtype=np.float64)
+    if mentions:
+        idx = np.array([m[0] for m in mentions])
+        np.add.at(mention_counts, (month_codes[idx], rating_codes[idx], _codes([m[2] for m in mentions], labels["sentiment"]),
+                                   _codes([m[1] for m in mentions], labels["aspect"])), [m[3] for m in mentions])
+    return SentimentCube(labels, review_counts.astype(np.float32), mention_counts.astype(np.float32))
+
+
+def cube_path(sku: str, params: Dict[str, Any], root: str = None) -> str:
+    return os.path.join(root or CUBE_DIR, str(sku), f"{input_hash(sku, params)}.npz")
+
+
+def save_cube(sku: str, params: Dict[str, Any], cube: SentimentCube, root: str = None) -> str:
+    path = cube_path(sku, params, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp.npz"
+    np.savez_compressed(tmp, reviews=cube.reviews, mentions=cube.mentions, labels=np.array(json.dumps(cube.labels)))
+    os.replace(tmp, path)
+    return path
+
+
+def load_cube(sku: str, params: Dict[str, Any], root: str = None) -> Optional[SentimentCube]:
+    path = cube_path(sku, params, root)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            return SentimentCube(json.loads(str(data["labels"])), data["reviews"], data["mentions"])
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable cube {path}: {e}")
+        return None
@@ -0,0 +1,160 @@
+import os
+import time
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import numpy as np
+
+from .metrics import record_llm_call
+from .openai_client import embed_texts, EMBED_MODEL, EMBEDDING_DIMENSIONS, MODELS_DIR
+
+# Default provider for new jobs; a job can pick another with ?embedding_provider=
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai").lower()
+# Local CPU backend: a sentence-embedding model exported to ONNX (model_quantized.onnx is
+# preferred over model.onnx) next to its Hugging Face tokenizer.json
+LOCAL_EMBED_MODEL_DIR = os.getenv("LOCAL_EMBED_MODEL_DIR", os.path.join(MODELS_DIR, "local_embedder"))
+LOCAL_EMBED_BATCH_SIZE = int(os.getenv("LOCAL_EMBED_BATCH_SIZE", "64"))
+LOCAL_EMBED_MAX_TOKENS = int(os.getenv("LOCAL_EMBED_MAX_TOKENS", "256"))
+# Batches run in parallel on this many threads (onnxruntime releases the GIL), one core each
+LOCAL_EMBED_THREADS = int(os.getenv("LOCAL_EMBED_THREADS", str(os.cpu_count() or 4)))
+
+
+class EmbeddingProvider(ABC):
+    """Turns texts into unit-length vectors. `name` tags the classifier and caches trained on them."""
+    name = ""
+    model = ""
+
+    @property
+    @abstractmethod
+    def dimensions(self) -> int:
+        """Length of the vectors `embed` returns."""
+
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """float32 (n, dimensions) matrix, one row per non-empty text (blank texts are skipped)."""
+
+    def artifact_params(self) -> Dict[str, Any]:
+        """What the vectors (and the classifier trained on them) depend on; part of a job's params."""
+        return {"embedding_model": self.model}
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """text-embedding-3-large through the shared, rate-governed OpenAI client."""
+    name = "openai"
+    model = EMBED_MODEL
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self._dimensions = dimensions
+
+    @property
+    def dimensions(self) -> int:
+        return self._dimensions
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        return await embed_texts(texts, dimensions=self._dimensions)
+
+    def artifact_params(self) -> Dict[str, Any]:
+        return {"embedding_model": self.model, "embedding_dimensions": self._dimensions}
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """
+    CPU sentence embeddings from an ONNX model: no network and no per-token cost. Texts are
+    sorted by length so each batch pads little, batches run on a thread pool, and token
+    vectors are mean-pooled and normalized (sentence-transformers convention).
+    """
+    name = "local"
+
+    def __init__(self, model_dir: str = LOCAL_EMBED_MODEL_DIR, batch_size: int = LOCAL_EMBED_BATCH_SIZE,
+                 max_tokens: int = LOCAL_EMBED_MAX_TOKENS, threads: int = LOCAL_EMBED_THREADS):
+        self.model_dir = model_dir
+        self.model = os.path.basename(os.path.normpath(model_dir))
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.threads = max(1, threads)
+        self._session = None
+        self._tokenizer = None
+        self._dimensions = None
+        self._executor = None
+
+    def _load(self):
+        if self._session is not None:
+            return
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise RuntimeError("The local embedding provider needs `onnxruntime` and `tokenizers` installed") from e
+        model_path = next((os.path.join(self.model_dir, f) for f in ("model_quantized.onnx", "model.onnx")
+                           if os.path.exists(os.path.join(self.model_dir, f))), None)
+        if model_path is None:
+            raise RuntimeError(f"No model_quantized.onnx or model.onnx found in {self.model_dir}")
+        tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+        tokenizer.enable_truncation(max_length=self.max_tokens)
+        tokenizer.enable_padding()
+        options = ort.SessionOptions()
+        # Parallelism comes from the thread pool; one intra-op thread per batch avoids oversubscription
+        options.intra_op_num_threads = 1
+        self._session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self._session.get_inputs()}
+        self._tokenizer = tokenizer
+        self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="local-embed")
+        logging.info(f"Loaded local embedding model {model_path} ({self.threads} threads)")
+
+    @property
+    def dimensions(self) -> int:
+        if self._dimensions is None:
+            self._dimensions = len(self._embed_batch(["dimension probe"])[0])
+        return self._dimensions
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        self._load()
+        encodings = self._tokenizer.encode_batch(texts)
+        ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(ids)
+        output = self._session.run(None, feeds)[0]
+        if output.ndim == 3:
+            weights = mask[:, :, None].astype(np.float32)
+            output = (output * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        output = output.astype(np.float32)
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return output / norms
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        input_texts = [t for t in texts if isinstance(t, str) and t.strip()]
+        if not input_texts:
+            raise ValueError("No valid texts to embed: input is empty after filtering.")
+        await asyncio.to_thread(self._load)
+        order = sorted(range(len(input_texts)), key=lambda i: len(input_texts[i]))
+        batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        results = await asyncio.gather(*(loop.run_in_executor(self._executor, self._embed_batch,
+                                                              [input_texts[i] for i in batch]) for batch in batches))
+        record_llm_call("embedding", self.model, time.perf_counter() - start)
+        embeddings = np.empty((len(input_texts), results[0].shape[1]), dtype=np.float32)
+        for batch, vectors in zip(batches, results):
+            embeddings[batch] = vectors
+        logging.info(f"Embedded {len(input_texts)} texts locally in {time.perf_counter() - start:.2f}s")
+        return embeddings
+
+
+EMBEDDING_PROVIDERS = {"openai": OpenAIEmbeddingProvider, "local": LocalEmbeddingProvider}
+_providers: Dict[str, EmbeddingProvider] = {}
+
+
+def get_embedding_provider(name: str = None) -> EmbeddingProvider:
+    """Shared provider instance by name (EMBEDDING_PROVIDER by default); models load once per process."""
+    name = (name or EMBEDDING_PROVIDER).lower()
+    if name not in EMBEDDING_PROVIDERS:
+        raise ValueError(f"Unknown embedding provider {name!r}; expected one of {sorted(EMBEDDING_PROVIDERS)}")
+    if name not in _providers:
+        _providers[name] = EMBEDDING_PROVIDERS[name]()
+    return _providers[name]
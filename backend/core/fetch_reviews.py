@@ -1,44 +1,105 @@
-import snowflake.connector
-from .query_loader import load_query_template
+from .query_loader import build_query, load_query_template
 from .snowflake_client import connect_to_snowflake
 import logging
 
-def fetch_reviews(sku: str, batch_size: int = 15000):
+# Optional pushdown filters accepted by fetch_reviews (see query_templates.yaml)
+REVIEW_FILTERS = ("start_date", "end_date", "min_rating", "max_rating", "limit")
+PRODUCT_INFO_FIELDS = ["mc1", "mc2", "mc3", "product_description_short", "product_name", "product_id", "product_link"]
+
+def fetch_reviews(sku: str, batch_size: int = 15000, conn=None, **filters):
+    """
+    Stream review rows for a SKU. Only per-review columns are selected; product metadata comes
+    from fetch_product_info. `filters` (start_date, end_date, min_rating, max_rating, limit) are
+    pushed down into the query. Pass `conn` to reuse an open connection (it is left open).
+    """
     print(f"fetch_reviews called for SKU: {sku}")
     logging.info(f"fetch_reviews called for SKU: {sku}")
-    query_template = load_query_template("fetch_reviews")
-    query = query_template.format(sku=sku)
-    logging.info(f"Executing Snowflake query: {query}")
-    conn = connect_to_snowflake()
+    unknown = set(filters) - set(REVIEW_FILTERS)
+    if unknown:
+        raise ValueError(f"Unknown review filters: {sorted(unknown)}")
+    query, params = build_query("fetch_reviews", {"sku": sku, **filters})
+    logging.info(f"Executing Snowflake query with params {params}: {query}")
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_to_snowflake()
     cursor = conn.cursor()
-    cursor.execute(query)
     review_count = 0
     first_reviews = []
-    while True:
-        rows = cursor.fetchmany(batch_size)
-        if not rows:
-            break
-        for row in rows:
-            # row: (sku, customer_review, product_rating, created_date, mc1, mc2, mc3, product_description_short, product_name, product_id, product_link)
-            review = {
-                "sku": row[0],
-                "customer_review": row[1],
-                "product_rating": row[2],
-                "created_date": row[3],
-                "mc1": row[4],
-                "mc2": row[5],
-                "mc3": row[6],
-                "product_description_short": row[7],
-                "product_name": row[8],
-                "product_id": row[9],
-                "product_link": row[10]
-            }
-            if review_count < 3:
-                first_reviews.append(review)
-            review_count += 1
-            yield review
-    if first_reviews:
-        logging.info(f"First 3 reviews fetched: {first_reviews}")
-    logging.info(f"Total reviews fetched: {review_count}")
-    cursor.close()
-    conn.close() 
\ No newline at end of file
+    try:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                # row: (sku, customer_review, product_rating, created_date)
+                review = {
+                    "sku": row[0],
+                    "customer_review": row[1],
+                    "product_rating": row[2],
+                    "created_date": row[3],
+                }
+                if review_count < 3:
+                    first_reviews.append(review)
+                review_count += 1
+                yield review
+        if first_reviews:
+            logging.info(f"First 3 reviews fetched: {first_reviews}")
+        logging.info(f"Total reviews fetched: {review_count}")
+    finally:
+        cursor.close()
+        if own_conn:
+            conn.close()
+
+def fetch_review_strata(sku: str, conn=None, **filters) -> list:
+    """
+    (product_rating, created month, review_count) rows for the reviews fetch_reviews would stream
+    with the same filters, counted in Snowflake so stratified sampling knows each stratum's size
+    before the stream starts.
+    """
+    reviews_query, params = build_query("fetch_reviews", {"sku": sku, **filters})
+    query = load_query_template("count_review_strata").format(reviews=reviews_query)
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_to_snowflake()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        if own_conn:
+            conn.close()
+
+def fetch_product_info(sku: str, conn=None) -> dict:
+    """One-row product metadata (merch classes, name, link) for a SKU; fields are None if not found."""
+    query, params = build_query("fetch_product_info", {"sku": sku})
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_to_snowflake()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+        if own_conn:
+            conn.close()
+    return dict(zip(PRODUCT_INFO_FIELDS, row)) if row else {k: None for k in PRODUCT_INFO_FIELDS}
+
+def fetch_category_skus(mc1: str = None, mc2: str = None, min_reviews: int = 1, limit: int = None, conn=None) -> list:
+    """Parent SKUs in an mc1/mc2 merch category with at least `min_reviews` approved reviews, most-reviewed first."""
+    query, params = build_query("list_category_skus", {"mc1": mc1, "mc2": mc2, "min_reviews": min_reviews, "limit": limit})
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_to_snowflake()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        if own_conn:
+            conn.close()
+    logging.info(f"{len(rows)} SKUs found for mc1={mc1} mc2={mc2}")
+    return [row[0] for row in rows]
@@ -1,6 +1,8 @@
 import os
+import time
 from core.openai_client import get_openai_client
-import tiktoken
+from core.metrics import record_llm_call
+from core.rate_governor import get_governor, estimate_tokens, total_usage_tokens, PRIORITY_INTERACTIVE
 
 SYSTEM_PROMPT = """You are an expert Customer Experience (CX) analyst specializing in product review synthesis. Your task is to create a narrative summary that captures what customers are actually saying about the product, organized around key product themes and features.
 
@@ -63,7 +65,7 @@ Include any additional themes or notable patterns that don't fit the main catego
 Remember: Focus on the actual product experience and features customers discuss, not sentiment percentages or technical analysis."""
 
 
-async def generate_gpt_summary(stats_summary: dict) -> str:
+async def generate_gpt_summary(stats_summary: dict, priority: int = PRIORITY_INTERACTIVE) -> str:
     try:
         client = get_openai_client()
         user_prompt = f"""Analyze this comprehensive customer review data and create a product-focused summary. Use ALL available data sources including:
@@ -79,23 +81,22 @@ async def generate_gpt_summary(stats_summary: dict) -> str:
                         {str(stats_summary)}
 
                         Create a narrative summary organized around the key product themes that emerge from the customer data. Let the keywords and reviews guide you to identify the most important themes customers actually discuss (these might include aspects like functionality, durability, weight, sizing, ease of use, design, etc., but focus on what the data reveals)."""
-        encoding = tiktoken.get_encoding("cl100k_base")
-        system_tokens = len(encoding.encode(SYSTEM_PROMPT))
-        user_tokens = len(encoding.encode(user_prompt))
-        print(f"[SUMMARY] System prompt tokens: {system_tokens}")
-        print(f"[SUMMARY] User prompt tokens: {user_tokens}")
-        response = await client.chat.completions.create(
-            model="gpt-4.1-2025-04-14",
-            temperature=0,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt}
-            ]
-        )
+        model = "gpt-4.1-2025-04-14"
+        start = time.perf_counter()
+        # An analyst is usually waiting on this one, so by default it jumps ahead of queued pipeline batches
+        response = await get_governor("chat").call(
+            lambda: client.chat.completions.create(
+                model=model,
+                temperature=0,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": user_prompt}
+                ]
+            ),
+            estimate_tokens([SYSTEM_PROMPT, user_prompt], 4000), priority=priority,
+            usage_tokens=total_usage_tokens)
+        record_llm_call("summary", model, time.perf_counter() - start, response.usage)
         output_text = response.choices[0].message.content
-        output_tokens = len(encoding.encode(output_text))
-        print(f"[SUMMARY] Output tokens: {output_tokens}")
-        print(f"[SUMMARY] Total tokens: {system_tokens + user_tokens + output_tokens}")
         # Save summary to step_8.json for debugging
         if not output_text.startswith("[ERROR]"):
             import json
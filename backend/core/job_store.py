@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+# Job records and the work queue live in one SQLite database (JOB_STORE_DIR/jobs.sqlite3) that
+# every API and worker process on the host shares. A Redis- or Postgres-backed store only has
+# to provide the functions below.
+JOB_STORE_DIR = os.getenv("JOB_STORE_DIR", "job_store")
+JOB_DB_PATH = os.getenv("JOB_DB_PATH")
+
+# Allowed status transitions. processing -> processing covers resuming a job whose worker
+# died (its lease expired); failed -> processing covers POST /jobs/{id}/resume.
+TRANSITIONS = {
+    "pending": {"processing", "failed"},
+    "processing": {"processing", "complete", "failed", "no_data"},
+    "failed": {"processing"},
+    "complete": set(),
+    "no_data": set(),
+}
+IN_FLIGHT = ("pending", "processing")
+
+# Only these job fields are persisted; large intermediate data lives in stage checkpoints
+PERSISTED_FIELDS = ["sku", "status", "step", "params", "created_at", "updated_at", "error",
+                    "failed_stage", "attempts", "stage_timings", "peak_rss_bytes", "result", "aspect_summary", "gpt_summary",
+                    "precomputed_at", "cleantext_substeps", "resumed_stages", "checkpoint_key", "profile", "llm_mode"]
+
+_SCHEMA = """
+create table if not exists jobs (
+    id text primary key,
+    sku text,
+    status text not null,
+    record text not null,
+    created_at text,
+    updated_at text,
+    queued integer not null default 0,
+    lease_owner text,
+    lease_expires real
+);
+create index if not exists jobs_queue on jobs (queued, created_at);
+"""
+
+_local = threading.local()
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def _db_path() -> str:
+    return JOB_DB_PATH or os.path.join(JOB_STORE_DIR, "jobs.sqlite3")
+
+
+def _connect() -> sqlite3.Connection:
+    """One connection per thread and database file; WAL lets readers and one writer overlap across processes."""
+    path = _db_path()
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    if path not in connections:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.execute("pragma journal_mode=wal")
+        conn.execute("pragma synchronous=normal")
+        conn.executescript(_SCHEMA)
+        connections[path] = conn
+        _import_legacy_records(conn)
+    return connections[path]
+
+
+def _import_legacy_records(conn: sqlite3.Connection):
+    # Jobs persisted as JOB_STORE_DIR/{id}.json before the database existed
+    if not os.path.isdir(JOB_STORE_DIR):
+        return
+    for name in os.listdir(JOB_STORE_DIR):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(JOB_STORE_DIR, name)) as f:
+                record = json.load(f)
+            conn.execute("insert or ignore into jobs (id, sku, status, record, created_at, updated_at, queued) values (?, ?, ?, ?, ?, ?, ?)",
+                         (name[:-5], record.get("sku"), record.get("status", "pending"), json.dumps(record, default=str),
+                          record.get("created_at"), record.get("updated_at"), int(record.get("status") in IN_FLIGHT)))
+            os.replace(os.path.join(JOB_STORE_DIR, name), os.path.join(JOB_STORE_DIR, name + ".imported"))
+        except Exception as e:
+            logging.warning(f"Skipping unreadable job record {name}: {e}")
+
+
+def save_job(job_id: str, job: dict):
+    """Upsert the persisted fields of a job. Finished jobs leave the queue."""
+    record = {k: job[k] for k in PERSISTED_FIELDS if k in job}
+    status = job.get("status", "pending")
+    _connect().execute(
+        """insert into jobs (id, sku, status, record, created_at, updated_at) values (?, ?, ?, ?, ?, ?)
+           on conflict(id) do update set sku = excluded.sku, status = excluded.status, record = excluded.record,
+               updated_at = excluded.updated_at,
+               queued = case when excluded.status in ('pending', 'processing') then jobs.queued else 0 end""",
+        (job_id, job.get("sku"), status, json.dumps(record, default=str), job.get("created_at"), job.get("updated_at")))
+
+
+def set_status(job_id: str, job: dict, status: str, **fields):
+    """Move a job to `status`, enforcing TRANSITIONS, and persist the record."""
+    current = job.get("status", "pending")
+    if status not in TRANSITIONS.get(current, set()):
+        raise InvalidTransition(f"Job {job_id}: cannot go from {current} to {status}")
+    job["status"] = status
+    job.update(fields)
+    job["updated_at"] = datetime.utcnow().isoformat()
+    try:
+        save_job(job_id, job)
+    except Exception as e:
+        logging.error(f"Failed to persist job {job_id}: {e}")
+
+
+def load_job(job_id: str) -> Optional[dict]:
+    row = _connect().execute("select record from jobs where id = ?", (job_id,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def load_jobs() -> Dict[str, dict]:
+    """Every persisted job record."""
+    return {job_id: json.loads(record) for job_id, record in _connect().execute("select id, record from jobs")}
+
+
+def count_jobs_by_status() -> Dict[str, int]:
+    return dict(_connect().execute("select status, count(*) from jobs group by status").fetchall())
+
+
+def count_queue() -> Dict[str, int]:
+    """Jobs on the work queue: "leased" (a live worker holds them) and "waiting" (unclaimed or lease expired)."""
+    leased, total = _connect().execute("select coalesce(sum(lease_expires >= ?), 0), count(*) from jobs where queued = 1",
+                                       (time.time(),)).fetchone()
+    return {"leased": leased, "waiting": total - leased}
+
+
+def enqueue_job(job_id: str):
+    """Put a saved job on the work queue; any worker process may claim it."""
+    _connect().execute("update jobs set queued = 1, lease_owner = null, lease_expires = null where id = ?", (job_id,))
+
+
+def is_queued(job_id: str) -> bool:
+    row = _connect().execute("select queued from jobs where id = ?", (job_id,)).fetchone()
+    return bool(row and row[0])
+
+
+def claim_job(worker_id: str, lease_seconds: float) -> Optional[str]:
+    """
+    Atomically take the oldest queued job that no live worker holds. A job whose worker died
+    is taken over once its lease expires and resumes from its stage checkpoints.
+    """
+    conn = _connect()
+    now = time.time()
+    conn.execute("begin immediate")
+    try:
+        row = conn.execute("select id from jobs where queued = 1 and (lease_expires is null or lease_expires < ?) "
+                           "order by created_at limit 1", (now,)).fetchone()
+        if row:
+            conn.execute("update jobs set lease_owner = ?, lease_expires = ? where id = ?", (worker_id, now + lease_seconds, row[0]))
+        conn.execute("commit")
+    except Exception:
+        conn.execute("rollback")
+        raise
+    return row[0] if row else None
+
+
+def renew_lease(job_id: str, worker_id: str, lease_seconds: float) -> bool:
+    """Extend a held lease; False if another worker has taken the job over."""
+    cursor = _connect().execute("update jobs set lease_expires = ? where id = ? and lease_owner = ?",
+                                (time.time() + lease_seconds, job_id, worker_id))
+    return cursor.rowcount == 1
+
+
+def release_job(job_id: str, worker_id: str):
+    """Give up a lease early (e.g. on shutdown) so another worker can pick the job up at once."""
+    _connect().execute("update jobs set lease_owner = null, lease_expires = null where id = ? and lease_owner = ?",
+                       (job_id, worker_id))
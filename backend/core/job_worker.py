@@ -0,0 +1,219 @@
+import os
+import copy
+import uuid
+import socket
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from core.langgraph_pipeline import run_pipeline, build_result, NoReviewsFound, CLEANTEXT_SUBSTEPS
+from core.job_store import set_status, save_job, load_job, claim_job, renew_lease, release_job, PERSISTED_FIELDS
+from core.result_store import save_result, save_summary
+from core.rate_governor import current_job_id
+from core.profiler import JobProfiler
+from core.batch_llm import current_llm_mode
+
+# Pipelines one worker process runs at once
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "2"))
+# A claimed job's lease is renewed every third of this; if the worker dies
+# the job is taken over by another worker once the lease runs out
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+# A job that has crashed its worker this many times is failed instead of retried again
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+
+def store_result(job_id: str, job: dict, source: str = "on_demand"):
+    """Write a finished job to the result store so later /analyze calls can be served from it."""
+    try:
+        save_result(job["sku"], job.get("params", {}), job, source)
+    except Exception as e:
+        logging.warning(f"Failed to store result of job {job_id}: {e}")
+
+
+def store_summary(job_id: str, job: dict):
+    """
+    Add a job's new GPT summary to its stored result, so jobs later served from the store do
+    not pay for it again. computed_at is kept; a job served from the store only updates the
+    computation it was served.
+    """
+    try:
+        if save_summary(job["sku"], job.get("params", {}), job["gpt_summary"], computed_at=job.get("precomputed_at")):
+            return
+        if not job.get("precomputed_at"):
+            save_result(job["sku"], job.get("params", {}), job, "on_demand")  # not stored yet
+    except Exception as e:
+        logging.warning(f"Failed to store the summary of job {job_id}: {e}")
+
+
+class ProgressPublisher:
+    """
+    A running job's job["publish_progress"] hook. Stages call it synchronously (from the loop or
+    a worker thread); the save runs on a thread, one at a time, and calls that arrive while one is
+    in flight coalesce into a single save of the latest state, so stages never wait on SQLite.
+    """
+
+    def __init__(self, job_id: str, job: dict):
+        self.job_id = job_id
+        self.job = job
+        self.loop = asyncio.get_running_loop()
+        self.dirty = False
+        self.closed = False
+        self.task: Optional[asyncio.Task] = None
+
+    def __call__(self):
+        self.loop.call_soon_threadsafe(self._schedule)
+
+    def _schedule(self):
+        if self.closed:
+            return
+        self.dirty = True
+        if self.task is None or self.task.done():
+            self.task = self.loop.create_task(self._save())
+
+    async def _save(self):
+        while self.dirty and not self.closed:
+            self.dirty = False
+            # Copied on the loop: the stages keep changing the job while the thread writes
+            record = copy.deepcopy({k: self.job[k] for k in PERSISTED_FIELDS if k in self.job})
+            try:
+                await asyncio.to_thread(save_job, self.job_id, record)
+            except Exception as e:
+                logging.warning(f"Failed to publish progress of job {self.job_id}: {e}")
+
+    async def close(self):
+        """Drop unsaved progress and wait for the save in flight, so it cannot land after a later status change."""
+        await asyncio.sleep(0)  # run hooks queued from threads
+        self.closed = True
+        if self.task is not None:
+            await asyncio.gather(self.task, return_exceptions=True)
+
+
+async def run_analysis_async(job_id: str, job: dict):
+    """Run a job's pipeline; jobs started with profile=true also record a profile artifact."""
+    if not job.get("profile"):
+        return await _run_analysis(job_id, job)
+    profiler = JobProfiler(job_id, job["sku"])
+    job["profiler"] = profiler  # picked up per stage by time_stage; never persisted
+    profiler.start()
+    try:
+        await _run_analysis(job_id, job)
+    finally:
+        job.pop("profiler", None)
+        await asyncio.to_thread(profiler.stop_and_save)
+
+
+async def _run_analysis(job_id: str, job: dict):
+    sku = job["sku"]
+    print(f"run_analysis_async called for SKU: {sku}, job_id: {job_id}")
+    logging.info(f"run_analysis_async called for SKU: {sku}, job_id: {job_id}")
+    if job.get("attempts", 0) >= JOB_MAX_ATTEMPTS and job["status"] == "processing":
+        await asyncio.to_thread(set_status, job_id, job, "failed", error=f"Gave up after {job['attempts']} attempts")
+        return
+    await asyncio.to_thread(set_status, job_id, job, "processing", attempts=job.get("attempts", 0) + 1, error=None, failed_stage=None,
+               step=0,  # FetchReviews
+               cleantext_substeps={sub: "pending" for sub in CLEANTEXT_SUBSTEPS})
+    # Every LLM/embedding call made under this task is queued fairly against other jobs
+    current_job_id.set(job_id)
+    # Bulk jobs send their LLM stages through the offline Batch API (core.batch_llm)
+    current_llm_mode.set(job.get("llm_mode"))
+    # Stages publish step/sub-step/timing changes as they happen (core.metrics.publish_progress)
+    publisher = job["publish_progress"] = ProgressPublisher(job_id, job)
+    try:
+        state = await run_pipeline(sku, job.get("params", {}), job)
+    except NoReviewsFound as e:
+        await publisher.close()
+        await asyncio.to_thread(set_status, job_id, job, "no_data", step=0, failed_stage=None, result={"error": str(e), "sku": sku})
+        return
+    except Exception as e:
+        logging.exception(f"Job {job_id} failed in stage {job.get('failed_stage')}")
+        await publisher.close()
+        await asyncio.to_thread(set_status, job_id, job, "failed", error=f"{type(e).__name__}: {e}")
+        return
+    finally:
+        job.pop("publish_progress", None)
+        await publisher.close()
+    job["aspect_summary"] = state["aspect_summary"]
+
+    await asyncio.sleep(4)
+    job["step"] = 6  # GptSummary
+    await asyncio.to_thread(save_job, job_id, job)
+    await asyncio.sleep(4)
+    result = build_result(sku, state)
+    await asyncio.to_thread(set_status, job_id, job, "complete", result=result)
+    await asyncio.to_thread(store_result, job_id, job)
+
+
+async def _heartbeat(job_id: str, job: dict, worker_id: str, analysis: asyncio.Task):
+    # Keeps the lease; stages publish their own progress (publish_progress)
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        if job.get("status") != "processing":
+            continue
+        if not await asyncio.to_thread(renew_lease, job_id, worker_id, JOB_LEASE_SECONDS):
+            # The lease ran out and another worker may already own the job: stop running it
+            # here, or both would pay for the same stages and overwrite each other's record
+            logging.warning(f"Worker {worker_id} lost the lease on job {job_id}; cancelling it")
+            analysis.cancel()
+            return
+
+
+async def run_claimed_job(job_id: str, worker_id: str):
+    # Job store calls run in a thread: with RUN_JOBS_IN_API this loop also serves the API
+    job = await asyncio.to_thread(load_job, job_id)
+    if job is None:
+        await asyncio.to_thread(release_job, job_id, worker_id)
+        return
+    analysis = asyncio.create_task(run_analysis_async(job_id, job))
+    heartbeat = asyncio.create_task(_heartbeat(job_id, job, worker_id, analysis))
+    try:
+        await analysis
+    except asyncio.CancelledError:
+        if heartbeat.done() and not heartbeat.cancelled():
+            return  # lease lost: the job is no longer ours to release
+        # Shutting down: hand the job back so another worker resumes it from its checkpoints
+        await asyncio.to_thread(release_job, job_id, worker_id)
+        raise
+    finally:
+        heartbeat.cancel()
+
+
+async def run_worker(concurrency: int = WORKER_CONCURRENCY, worker_id: Optional[str] = None,
+                     wake: Optional[asyncio.Event] = None):
+    """
+    Claim queued jobs and run up to `concurrency` of them at a time, until cancelled. `wake`
+    lets a process that enqueues work (the API) skip the poll interval.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    running: Dict[str, asyncio.Task] = {}
+    logging.info(f"Worker {worker_id} started (concurrency {concurrency})")
+    try:
+        while True:
+            while len(running) < concurrency:
+                job_id = await asyncio.to_thread(claim_job, worker_id, JOB_LEASE_SECONDS)
+                if job_id is None:
+                    break
+                logging.info(f"Worker {worker_id} claimed job {job_id}")
+                task = asyncio.create_task(run_claimed_job(job_id, worker_id))
+                running[job_id] = task
+
+                def on_done(t: asyncio.Task, job_id=job_id):
+                    running.pop(job_id, None)
+                    if not t.cancelled() and t.exception() is not None:
+                        logging.error(f"Job {job_id} task crashed: {t.exception()}")
+                    if wake is not None:
+                        wake.set()  # a slot is free
+                task.add_done_callback(on_done)
+            if wake is None:
+                await asyncio.sleep(JOB_POLL_SECONDS)
+            else:
+                try:
+                    await asyncio.wait_for(wake.wait(), JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                wake.clear()
+    finally:
+        tasks = list(running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
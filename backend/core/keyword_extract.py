@@ -1,6 +1,21 @@
-from keybert import KeyBERT
+import re
+import string
+import logging
 from typing import List, Dict
 
+_kw_model = None
+
+def get_keybert():
+    """
+    KeyBERT pulls in torch and sentence-transformers, so it is imported and its model loaded
+    once, on first use (or during startup warm-up), and shared across jobs.
+    """
+    global _kw_model
+    if _kw_model is None:
+        from keybert import KeyBERT
+        _kw_model = KeyBERT()
+    return _kw_model
+
 def extract_top_keywords_by_sentiment(reviews: List[Dict], top_n: int = 20) -> Dict[str, List[str]]:
     """
     For each sentiment (positive, neutral, negative), extract top N keywords from cleaned review texts using KeyBERT.
@@ -16,7 +31,7 @@ def extract_top_keywords_by_sentiment(reviews: List[Dict], top_n: int = 20) -> D
             text = review.get("clean") or ""
             if text.strip():
                 sentiment_groups[label_str].append(text)
-    kw_model = KeyBERT()
+    kw_model = get_keybert()
     top_keywords = {}
     for sentiment, texts in sentiment_groups.items():
         if texts:
@@ -25,4 +40,41 @@ def extract_top_keywords_by_sentiment(reviews: List[Dict], top_n: int = 20) -> D
             top_keywords[sentiment] = [kw for kw, _ in keywords]
         else:
             top_keywords[sentiment] = []
-    return top_keywords 
\ No newline at end of file
+    return top_keywords
+
+
+def match_keyword_samples(reviews: List[Dict], top_keywords: Dict[str, List[str]], samples_per_keyword: int = 20) -> Dict[str, Dict[str, List[str]]]:
+    """
+    For each sentiment keyword, collect up to samples_per_keyword cleaned reviews of that sentiment
+    containing all of the keyword's words, falling back to reviews containing any of them.
+    Returns: {sentiment: {keyword: [review, ...]}}
+    """
+    def normalize(text):
+        return re.sub(rf'[{re.escape(string.punctuation)}]', '', text.lower())
+
+    keyword_matched_samples = {sentiment: {} for sentiment in top_keywords}
+    for sentiment, keywords in top_keywords.items():
+        sentiment_reviews = [r.get("clean") for r in reviews if r.get("sentiment") == sentiment and r.get("clean")]
+        norm_reviews = [normalize(r) for r in sentiment_reviews]
+        logging.info(f"Sentiment '{sentiment}': {len(sentiment_reviews)} reviews to check.")
+        for kw in keywords:
+            kw_words = normalize(kw).split()
+            # Find up to N reviews containing all words in the keyword
+            matches = []
+            for review, norm_review in zip(sentiment_reviews, norm_reviews):
+                if all(word in norm_review for word in kw_words):
+                    matches.append(review)
+                    if len(matches) >= samples_per_keyword:
+                        break
+            # Fallback: find reviews containing any word in the keyword
+            if len(matches) < samples_per_keyword:
+                for review, norm_review in zip(sentiment_reviews, norm_reviews):
+                    if any(word in norm_review for word in kw_words) and review not in matches:
+                        matches.append(review)
+                        if len(matches) >= samples_per_keyword:
+                            break
+            if matches:
+                keyword_matched_samples[sentiment][kw] = matches
+            else:
+                logging.info(f"  No match found for '{kw}' in sentiment '{sentiment}'.")
+    return keyword_matched_samples
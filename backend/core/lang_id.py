@@ -0,0 +1,94 @@
+import os
+import json
+import math
+import unicodedata
+from functools import lru_cache
+from typing import List
+import regex as re
+
+# Character trigram frequencies (from Wikipedia, see build_lang_id_profiles.py) plus per-language
+# stop words, bundled with the repo: deterministic, no network, no seed needed
+PROFILES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models", "lang_id_profiles.json")
+MIN_LETTERS = 2
+# Text written only in ASCII letters is English unless at least this many of its words are
+# stop words of one other language (and more than its English stop words)
+MIN_FOREIGN_WORDS = 2
+# Without that evidence, the average log-likelihood per trigram by which another language
+# must beat English (accented text such as "Café-style bowl, très chic" stays English)
+MIN_MARGIN = 0.5
+# Log-likelihood bonus per stop word of a language, so stop words settle close n-gram scores (es vs pt)
+WORD_WEIGHT = 2.0
+_TOKEN_RE = re.compile(r"\p{L}+(?:'\p{L}+)?")
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFC", text).lower()
+    text = re.sub(r"[^\p{L}'\s]+", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _char_ngrams(text: str, n: int) -> List[str]:
+    padded = f" {text} "
+    return [padded[i:i+n] for i in range(len(padded) - n + 1)]
+
+
+@lru_cache(maxsize=1)
+def load_model() -> dict:
+    """Build per-language n-gram log-probabilities from the bundled corpus counts."""
+    with open(PROFILES_PATH, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    order = data["ngram_order"]
+    logprobs, unseen, words = {}, {}, {}
+    for lang, spec in data["languages"].items():
+        counts = spec["ngrams"]
+        total = sum(counts.values())
+        logprobs[lang] = {g: math.log(c / total) for g, c in counts.items()}
+        # Trigrams rarer than the profile's cut-off share a floor below its least frequent entry
+        unseen[lang] = math.log(min(counts.values()) / total / 10)
+        words[lang] = set(spec["words"])
+    priors = {lang: math.log(p) for lang, p in data["priors"].items()}
+    scripts = {name: (re.compile(rf"\p{{{name}}}"), lang) for name, lang in data["scripts"].items()}
+    return {"order": order, "logprobs": logprobs, "unseen": unseen, "words": words, "priors": priors, "scripts": scripts}
+
+
+def _detect_one(text: str, model: dict) -> str:
+    if not isinstance(text, str):
+        return 'unknown'
+    letters = re.findall(r"\p{L}", text)
+    if len(letters) < MIN_LETTERS:
+        return 'unknown'
+    # Non-Latin scripts are decided by the dominant script alone
+    for pattern, lang in model["scripts"].values():
+        if len(pattern.findall(text)) * 2 > len(letters):
+            return lang
+    norm = _normalize(text)
+    tokens = _TOKEN_RE.findall(norm)
+    hits = {lang: sum(1 for t in tokens if t in vocab) for lang, vocab in model["words"].items()}
+    en_hits = hits.pop('en', 0)
+    other_hits = max(hits.values(), default=0)
+    foreign_words = other_hits >= MIN_FOREIGN_WORDS and other_hits > en_hits
+    # The catalog is English: unaccented text stays English without clear foreign-word evidence,
+    # whatever its n-grams look like ("Ordered medium, fits perfectly")
+    if all(c.isascii() for c in letters) and not foreign_words:
+        return 'en'
+    grams = _char_ngrams(norm, model["order"])
+    hits['en'] = en_hits
+    scores = {}
+    for lang in sorted(model["logprobs"]):
+        table, floor = model["logprobs"][lang], model["unseen"][lang]
+        scores[lang] = (model["priors"].get(lang, math.log(1e-3)) + sum(table.get(g, floor) for g in grams)
+                        + WORD_WEIGHT * hits.get(lang, 0))
+    best_lang = max(scores, key=scores.get)
+    if best_lang != 'en' and not foreign_words and scores[best_lang] - scores.get('en', -math.inf) < MIN_MARGIN * len(grams):
+        return 'en'
+    return best_lang
+
+
+def detect_languages(texts: List[str]) -> List[str]:
+    """Batch language identification; returns ISO 639-1 codes ('unknown' for blank/letterless text)."""
+    model = load_model()
+    return [_detect_one(t, model) for t in texts]
+
+
+def detect_language(text: str) -> str:
+    return detect_languages([text])[0]
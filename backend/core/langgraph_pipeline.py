@@ -1,60 +1,374 @@
-from typing import List, Dict, TypedDict
+import os
+import json
+import asyncio
+import logging
+from typing import List, Dict, TypedDict, Any
 
-class AnalysisState(TypedDict):
+import numpy as np
+
+from core.stage_graph import Stage, StageGraph
+from core.fetch_reviews import fetch_reviews, fetch_review_strata, fetch_product_info
+from core.snowflake_client import connect_to_snowflake
+from core.clean_text import CleanTextPipeline
+from core.clean_text_graph import clean_reviews_langgraph
+from core.openai_client import classify_embeddings, batch_llm_extract_aspects
+from core.embedding_providers import EMBEDDING_PROVIDER, get_embedding_provider
+from core.keyword_extract import extract_top_keywords_by_sentiment, match_keyword_samples
+from core.stats_build import build_stats_summary, aggregate_aspect_sentiment
+from core.cube import SentimentCube, build_cube, save_cube
+from core.review_export import export_path, write_review_export
+from core.vector_index import save_review_vectors, search_index_path
+from core.near_dedup import NEAR_DEDUP_ENABLED, collapse_near_duplicates
+from core.sampling import SAMPLING_MODE, SAMPLE_TARGET_SIZE, stratified_reservoir_sample, stratum_sizes_from_counts, head_sample
+from core.checkpoints import StageCheckpoints
+from core.metrics import publish_progress
+from core.routing import ROUTING_ENABLED, ROUTE_LLM, ROUTE_SAMPLED, route_reviews, routed_result
+from core.review_table import ReviewTable, MISSING
+
+# Flag to toggle between LLM+LangGraph and classic CleanTextPipeline
+USE_LLM_CLEAN = os.getenv("USE_LLM_CLEAN", "false").lower() == "true"
+logging.info(f"USE_LLM_CLEAN (from env): {USE_LLM_CLEAN}")
+
+CLEANTEXT_SUBSTEPS = ["html", "encoding", "emoji", "control", "whitespace"]
+
+
+class AnalysisState(TypedDict, total=False):
     sku: str
-    raw_reviews: List[dict]
-    clean_reviews: List[str]
-    embeddings: List[List[float]]
-    sentiment_labels: List[str]
-    confidence_scores: List[float]
-    keywords: Dict
-    statistics: Dict
-    executive_summary: str
-
-def fetch_reviews(sku: str) -> List[dict]:
-    # TODO: Implement Snowflake fetch
-    return []
-
-def clean_text(reviews: List[dict]) -> List[str]:
-    # TODO: Clean text
-    return []
-
-def embed_batch(clean_reviews: List[str]) -> List[List[float]]:
-    # TODO: Embed reviews
-    return []
-
-def classify_batch(embeddings: List[List[float]]) -> (List[str], List[float]):
-    # TODO: Classify sentiment
-    return [], []
-
-def keyword_extract(clean_reviews: List[str], sentiment_labels: List[str]) -> Dict:
-    # TODO: Extract keywords
-    return {}
-
-def stats_build(sentiment_labels: List[str], confidence_scores: List[float], keywords: Dict) -> Dict:
-    # TODO: Build stats
-    return {}
-
-def gpt_summary(statistics: Dict) -> str:
-    # TODO: Generate summary
-    return ""
-
-def run_pipeline(sku: str) -> AnalysisState:
-    state: AnalysisState = {
+    params: Dict[str, Any]
+    reviews: List[dict]
+    sampling_report: Dict[str, Any]
+    product_info: Dict[str, Any]
+    # From the filter stage on, reviews are ReviewTables (rows read as dicts via ReviewView)
+    text_reviews: ReviewTable
+    rating_only_reviews: ReviewTable
+    cleaned_reviews: ReviewTable
+    rep_of: List[int]
+    near_dedup_report: Dict[str, Any]
+    classified_reviews: ReviewTable
+    rating_only_scored: ReviewTable
+    routes: List[str]
+    routing_report: Dict[str, Any]
+    aspect_results: List[dict]
+    aspect_summary: List[dict]
+    cube: SentimentCube
+    review_export: Dict[str, Any]
+    top_keywords: Dict[str, List[str]]
+    keyword_matched_samples: Dict[str, Dict[str, list]]
+    stats_summary: Dict[str, Any]
+
+
+class NoReviewsFound(Exception):
+    """Raised by the fetch stage when the SKU has no reviews; the job ends as no_data."""
+
+
+def save_step_output(step_num, data):
+    with open(f"step_{step_num}.json", "w") as f:
+        if isinstance(data, ReviewTable):
+            # One review per line, built as it is written, rather than a list of every review's dict
+            f.write("[")
+            for i, review in enumerate(data):
+                f.write(",\n" if i else "\n")
+                f.write(json.dumps({k: v for k, v in review.items() if k != "embedding"}, default=str))
+            f.write("\n]\n")
+        else:
+            json.dump(data, f, indent=2, default=str)
+
+
+STAGES: List[Stage] = []
+
+
+def stage(name: str, inputs, outputs, step=None):
+    """Register an async stage function with its declared inputs and outputs."""
+    def register(fn):
+        STAGES.append(Stage(name, fn, tuple(inputs), tuple(outputs), step))
+        return fn
+    return register
+
+
+@stage("fetch", inputs=["sku", "params"], outputs=["reviews", "sampling_report", "product_info"], step=0)
+async def fetch_stage(job, sku, params):
+    sample_size = params.get("sample_size", SAMPLE_TARGET_SIZE)
+    filters = params.get("filters") or {}
+
+    def fetch():
+        # One connection for the product row and the review stream
+        conn = connect_to_snowflake()
+        try:
+            product_info = fetch_product_info(sku, conn=conn)
+            if params.get("sampling") == "stratified":
+                # Strata are counted in Snowflake first, so the reservoirs never hold more than the sample
+                sizes = stratum_sizes_from_counts(fetch_review_strata(sku, conn=conn, **filters))
+                rows = fetch_reviews(sku, conn=conn, **filters)
+                # Seed by SKU so re-running the same SKU draws the same sample
+                return (*stratified_reservoir_sample(rows, sample_size, seed=sku, stratum_sizes=sizes), product_info)
+            rows = fetch_reviews(sku, conn=conn, **filters)
+            return (*head_sample(rows, sample_size), product_info)
+        finally:
+            conn.close()
+
+    reviews, sampling_report, product_info = await asyncio.to_thread(fetch)
+    await asyncio.to_thread(save_step_output, 1, reviews)
+    if len(reviews) == 0:
+        raise NoReviewsFound(f"No data fetched for SKU {sku}")
+    logging.info(f"Fetched {len(reviews)} reviews. Starting null/dup filter.")
+    return {"reviews": reviews, "sampling_report": sampling_report, "product_info": product_info}
+
+
+@stage("filter", inputs=["reviews"], outputs=["text_reviews", "rating_only_reviews"])
+async def filter_stage(job, reviews):
+    # --- Null, blank, and duplicate filter ---
+    import pandas as pd
+    df = pd.DataFrame(reviews)
+    before = len(df)
+    # Split into text reviews and rating-only reviews
+    text_df = df.dropna(subset=["customer_review"])
+    text_df = text_df[text_df["customer_review"].str.strip() != ""]
+    text_df = text_df.drop_duplicates(subset=["customer_review"])
+    text_reviews = ReviewTable.from_columns({c: text_df[c].tolist() for c in text_df.columns})
+    # Rating-only: no review text, but has a product_rating
+    rating_only_df = df[(df["customer_review"].isnull() | (df["customer_review"].str.strip() == "")) & df["product_rating"].notnull()]
+    rating_only_reviews = ReviewTable.from_columns({c: rating_only_df[c].tolist() for c in rating_only_df.columns})
+    await asyncio.to_thread(save_step_output, 2, text_reviews)
+    logging.info(f"Filtered reviews: {before} -> {len(text_reviews)} after null/blank/dup filter.")
+    return {"text_reviews": text_reviews, "rating_only_reviews": rating_only_reviews}
+
+
+@stage("clean", inputs=["text_reviews"], outputs=["cleaned_reviews"], step=1)
+async def clean_stage(job, text_reviews):
+    # Set all sub-steps to in_progress at start of CleanText
+    if job is not None:
+        job["cleantext_substeps"] = {sub: "in_progress" for sub in CLEANTEXT_SUBSTEPS}
+        publish_progress(job)
+    texts = [r.get("customer_review") or "" for r in text_reviews]
+    if USE_LLM_CLEAN:
+        logging.info("Using LLM+LangGraph cleaning pipeline.")
+        cleaned_batch = await clean_reviews_langgraph(texts)
+    else:
+        logging.info("Using classic CleanTextPipeline.")
+        cleaned_batch = await asyncio.to_thread(CleanTextPipeline().clean_batch, texts)
+    cleaned_keys = list(dict.fromkeys(k for cleaned in cleaned_batch for k in cleaned))
+    cleaned_reviews = text_reviews.with_columns(sentiment_source="text",
+                                                **{k: [cleaned.get(k) for cleaned in cleaned_batch] for k in cleaned_keys})
+    for idx, cleaned in enumerate(cleaned_batch[:3]):
+        logging.info(f"Cleaned review {idx+1}: {cleaned}")
+    # Set all sub-steps to done when CleanText completes
+    if job is not None:
+        job["cleantext_substeps"] = {sub: "done" for sub in CLEANTEXT_SUBSTEPS}
+        publish_progress(job)
+    await asyncio.sleep(2)  # Delay to allow frontend to show 'done' state
+    await asyncio.to_thread(save_step_output, 3, cleaned_reviews)
+    logging.info(f"Completed CleanText step. {len(cleaned_reviews)} reviews cleaned.")
+    return {"cleaned_reviews": cleaned_reviews}
+
+
+@stage("near_dedup", inputs=["cleaned_reviews"], outputs=["rep_of", "near_dedup_report"])
+async def near_dedup_stage(job, cleaned_reviews):
+    # --- Near-duplicate collapse: only one representative per cluster goes to paid stages ---
+    clean_texts = [r.get("clean") or "" for r in cleaned_reviews]
+    if NEAR_DEDUP_ENABLED:
+        rep_of, near_dedup_report = await asyncio.to_thread(collapse_near_duplicates, clean_texts)
+    else:
+        rep_of, near_dedup_report = list(range(len(clean_texts))), None
+    return {"rep_of": rep_of, "near_dedup_report": near_dedup_report}
+
+
+@stage("embed_classify", inputs=["params", "cleaned_reviews", "rep_of"], outputs=["classified_reviews"], step=2)
+async def embed_classify_stage(job, params, cleaned_reviews, rep_of):
+    # --- EmbedBatch & ClassifyBatch ---
+    # Embeddings and the classifier trained on them come from the job's provider
+    provider = get_embedding_provider(params.get("embedding_provider"))
+    texts_to_embed = [r.get("clean") or "" for r in cleaned_reviews]
+    # Only embed non-empty cleaned reviews that represent their near-duplicate cluster
+    valid_indices = [i for i, t in enumerate(texts_to_embed) if t.strip() and rep_of[i] == i]
+    valid_texts = [texts_to_embed[i] for i in valid_indices]
+    embeddings = np.empty((0, 0), dtype=np.float32)
+    if valid_texts:
+        embeddings = await provider.embed(valid_texts)
+    else:
+        logging.warning("No valid cleaned reviews to embed.")
+    logging.info(f"Completed embedding for {len(valid_texts)} reviews.")
+
+    if job is not None:
+        job["step"] = max(job.get("step", 0), 3)  # ClassifyBatch
+        publish_progress(job)
+    classification_results = []
+    if len(embeddings):
+        classification_results = await asyncio.to_thread(classify_embeddings, embeddings, provider.name)
+    else:
+        logging.warning("No embeddings to classify.")
+    logging.info(f"Completed classification for {len(classification_results)} reviews.")
+
+    # Map results back to original indices, fanning representatives out to their near-duplicates.
+    # Reviews reference rows of the one embedding matrix instead of holding their own copy.
+    n = len(cleaned_reviews)
+    embedding_row = np.full(n, MISSING, dtype=np.int32)
+    embedding_row[valid_indices] = np.arange(len(valid_indices))
+    full_classification = [None] * n
+    for idx, res in zip(valid_indices, classification_results):
+        full_classification[idx] = res
+    for idx, rep in enumerate(rep_of):
+        if rep != idx:
+            embedding_row[idx] = embedding_row[rep]
+            full_classification[idx] = full_classification[rep]
+    await asyncio.to_thread(save_step_output, 4, {"embedded": len(valid_indices), "shape": list(embeddings.shape), "dtype": "float32"})
+    await asyncio.to_thread(save_step_output, 5, full_classification)
+
+    # Map integer sentiment labels (including NumPy types) to string labels for downstream matching
+    sentiment_map = {0: 'negative', 1: 'neutral', 2: 'positive'}
+    labels = []
+    for res in full_classification:
+        label = res["label"] if res else None
+        if isinstance(label, (int, float)) or (hasattr(label, 'item') and callable(label.item)):
+            try:
+                label = sentiment_map.get(int(label), str(int(label)))
+            except Exception:
+                label = str(label)
+        labels.append(label)
+    # Probabilities become one float32 (n, classes) matrix; NaN rows are reviews without a prediction
+    first = next((res["probabilities"] for res in classification_results if res), None)
+    classes = list(first) if isinstance(first, dict) else [str(c) for c in range(len(first or []))]
+    probabilities = np.full((n, len(classes)), np.nan, dtype=np.float32)
+    for idx, res in enumerate(full_classification):
+        if res and res.get("probabilities") is not None:
+            probs = res["probabilities"]
+            probabilities[idx] = [probs[c] for c in classes] if isinstance(probs, dict) else probs
+    classified_reviews = cleaned_reviews.with_classification(embeddings, embedding_row, labels, probabilities, classes, rep_of)
+    logging.info(f"Unique sentiment labels in classified reviews: {set(labels)}")
+    return {"classified_reviews": classified_reviews}
+
+
+@stage("rating_only", inputs=["rating_only_reviews"], outputs=["rating_only_scored"])
+async def rating_only_stage(job, rating_only_reviews):
+    # --- Rating-only sentiment assignment ---
+    rating_sentiment_map = {1: "negative", 2: "negative", 3: "neutral", 4: "positive", 5: "positive"}
+    sentiments = [rating_sentiment_map.get(int(rating)) for rating in rating_only_reviews.product_rating]
+    rating_only_scored = rating_only_reviews.with_columns(sentiment_source="rating_only", clean=None).with_sentiments(sentiments)
+    return {"rating_only_scored": rating_only_scored}
+
+
+# Routing needs classifier confidence, so with it enabled aspect extraction waits for
+# classification; without it every representative goes to the LLM as soon as text is clean
+ROUTING_SOURCE = "classified_reviews" if ROUTING_ENABLED else "cleaned_reviews"
+
+
+@stage("route", inputs=[ROUTING_SOURCE, "rep_of"], outputs=["routes", "routing_report"])
+async def route_stage(job, rep_of, **reviews):
+    # --- Routing: decide per review whether the LLM, a default, or a reduced sample handles it ---
+    routes, routing_report = await asyncio.to_thread(route_reviews, reviews[ROUTING_SOURCE], rep_of)
+    return {"routes": routes, "routing_report": routing_report}
+
+
+@stage("aspect_extract", inputs=["cleaned_reviews", "rep_of", "routes"], outputs=["aspect_results"], step=3.5)
+async def aspect_extract_stage(job, cleaned_reviews, rep_of, routes):
+    # --- Aspect Extraction (LLM) --- only for representatives routed to the LLM or its sample
+    llm_indices = [i for i, rep in enumerate(rep_of) if rep == i and routes[i] in (ROUTE_LLM, ROUTE_SAMPLED)]
+    llm_results = await batch_llm_extract_aspects([cleaned_reviews[i].get('clean', '') for i in llm_indices])
+    llm_result_of = dict(zip(llm_indices, llm_results))
+    rep_results = {i: routed_result(routes[i], llm_result_of.get(i)) for i, rep in enumerate(rep_of) if rep == i}
+    aspect_results = [rep_results[rep] for rep in rep_of]
+    return {"aspect_results": aspect_results}
+
+
+@stage("aspect_summary", inputs=["aspect_results", "classified_reviews"], outputs=["aspect_summary"])
+async def aspect_summary_stage(job, aspect_results, classified_reviews):
+    # Aggregation is cheap but picks sample reviews by embedding, so it waits for classification
+    aspect_summary = await asyncio.to_thread(aggregate_aspect_sentiment, aspect_results, classified_reviews, 10, 3)
+    await asyncio.to_thread(save_step_output, "aspect", aspect_summary)
+    return {"aspect_summary": aspect_summary}
+
+
+@stage("cube", inputs=["sku", "params", "classified_reviews", "rating_only_scored", "aspect_results"], outputs=["cube"])
+async def cube_stage(job, sku, params, classified_reviews, rating_only_scored, aspect_results):
+    # Month x rating x sentiment x aspect counts, sliced by /jobs/{job_id}/cube without re-running the job
+    cube = await asyncio.to_thread(build_cube, classified_reviews, rating_only_scored, aspect_results)
+    await asyncio.to_thread(save_cube, sku, params, cube)
+    logging.info(f"Built sentiment cube ({cube.nbytes()} bytes) over {len(cube.labels['month'])} months and {len(cube.labels['aspect'])} aspects.")
+    return {"cube": cube}
+
+
+@stage("export", inputs=["sku", "params", "classified_reviews", "rating_only_scored", "aspect_results"], outputs=["review_export"])
+async def export_stage(job, sku, params, classified_reviews, rating_only_scored, aspect_results):
+    # Per-review output for /jobs/{job_id}/export, written in row groups so it is streamed without loading it whole
+    path = export_path(sku, params)
+    rows = await asyncio.to_thread(write_review_export, path, classified_reviews, rating_only_scored, aspect_results)
+    logging.info(f"Wrote {rows} reviews to {path}.")
+    return {"review_export": {"path": path, "rows": rows}}
+
+
+@stage("search_index", inputs=["sku", "params", "classified_reviews"], outputs=["search_index"])
+async def search_index_stage(job, sku, params, classified_reviews):
+    # Vectors for /jobs/{job_id}/similar, kept as long as the export they point into
+    rows = await asyncio.to_thread(save_review_vectors, sku, params, classified_reviews)
+    logging.info(f"Saved {rows} review vectors for similarity search.")
+    return {"search_index": {"path": search_index_path(sku, params), "rows": rows}}
+
+
+@stage("keyword_extract", inputs=["classified_reviews"], outputs=["top_keywords"], step=4)
+async def keyword_extract_stage(job, classified_reviews):
+    # --- KeywordExtract --- (KeyBERT is CPU-bound; keep it off the event loop)
+    top_keywords = await asyncio.to_thread(extract_top_keywords_by_sentiment, classified_reviews, 25)
+    await asyncio.to_thread(save_step_output, 6, top_keywords)
+    logging.info(f"Extracted top keywords for each sentiment.")
+    return {"top_keywords": top_keywords}
+
+
+@stage("keyword_samples", inputs=["classified_reviews", "top_keywords"], outputs=["keyword_matched_samples"])
+async def keyword_samples_stage(job, classified_reviews, top_keywords):
+    # --- Keyword-Matched Sample Reviews (Flexible Matching) ---
+    keyword_matched_samples = await asyncio.to_thread(match_keyword_samples, classified_reviews, top_keywords, 20)
+    await asyncio.to_thread(save_step_output, 6.1, keyword_matched_samples)
+    logging.info(f"Saved keyword-matched sample reviews for each sentiment (flexible matching).")
+    return {"keyword_matched_samples": keyword_matched_samples}
+
+
+@stage("stats_build", inputs=["classified_reviews", "rating_only_scored", "top_keywords", "keyword_matched_samples", "sampling_report"],
+       outputs=["stats_summary"], step=5)
+async def stats_build_stage(job, classified_reviews, rating_only_scored, top_keywords, keyword_matched_samples, sampling_report):
+    # --- StatsBuild --- over text and rating-only reviews together
+    all_reviews_for_stats = list(classified_reviews) + list(rating_only_scored)
+    stats_summary = await asyncio.to_thread(build_stats_summary, all_reviews_for_stats, top_keywords, keyword_matched_samples, 20, sampling_report)
+    await asyncio.to_thread(save_step_output, 7, stats_summary)
+    logging.info(f"Built stats summary for dashboard and summary step.")
+    return {"stats_summary": stats_summary}
+
+
+ANALYSIS_GRAPH = StageGraph(STAGES, initial_inputs=("sku", "params"))
+
+
+def analysis_params(sampling: str = None, sample_size: int = None, filters: Dict[str, Any] = None,
+                    embedding_provider: str = None) -> Dict[str, Any]:
+    """
+    Job parameters with defaults filled in; they key checkpoints, stored results, cubes and
+    exports. The embedding model and dimension are included so a job run after the serving
+    classifier changes does not reuse outputs computed with another one.
+    """
+    provider = get_embedding_provider(embedding_provider or EMBEDDING_PROVIDER)
+    return {"sampling": (sampling or SAMPLING_MODE).lower(), "sample_size": sample_size or SAMPLE_TARGET_SIZE,
+            "filters": filters or {}, "embedding_provider": provider.name, **provider.artifact_params()}
+
+
+def build_result(sku: str, state: AnalysisState) -> Dict[str, Any]:
+    """The job result served by /results, from a finished pipeline state."""
+    # Product metadata comes from its own one-row query, not from every review row
+    product_info_fields = ["mc1", "mc2", "mc3", "product_name", "product_link"]
+    product_info = {k: state["product_info"].get(k) for k in product_info_fields}
+    return {
+        "summary": f"Fetched {len(state['reviews'])} reviews for SKU {sku}",
         "sku": sku,
-        "raw_reviews": fetch_reviews(sku),
-        "clean_reviews": [],
-        "embeddings": [],
-        "sentiment_labels": [],
-        "confidence_scores": [],
-        "keywords": {},
-        "statistics": {},
-        "executive_summary": ""
+        "product_info": product_info,
+        "stats": state["stats_summary"],
+        # Which reviews skipped LLM aspect extraction, and why (see core.routing)
+        "aspect_routing": state["routing_report"],
     }
-    state["clean_reviews"] = clean_text(state["raw_reviews"])
-    state["embeddings"] = embed_batch(state["clean_reviews"])
-    state["sentiment_labels"], state["confidence_scores"] = classify_batch(state["embeddings"])
-    state["keywords"] = keyword_extract(state["clean_reviews"], state["sentiment_labels"])
-    state["statistics"] = stats_build(state["sentiment_labels"], state["confidence_scores"], state["keywords"])
-    state["executive_summary"] = gpt_summary(state["statistics"])
-    return state 
\ No newline at end of file
+
+
+async def run_pipeline(sku: str, params: Dict[str, Any], job: dict = None) -> AnalysisState:
+    """
+    Run the full analysis graph for one SKU; stage timings and progress are written to `job`.
+    Every completed stage is checkpointed, and stages checkpointed by an earlier (crashed or
+    failed) run with the same inputs are restored instead of paid for again.
+    """
+    checkpoints = StageCheckpoints(sku, params)
+    if job is not None:
+        job["checkpoint_key"] = checkpoints.key
+    return await ANALYSIS_GRAPH.run({"sku": sku, "params": params}, job, checkpoints)
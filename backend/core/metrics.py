@@ -0,0 +1,283 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import resource
+import threading
+import traceback
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# Latency buckets (seconds) shared by stage and request histograms
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_registry: List["_Metric"] = []
+_lock = threading.Lock()
+
+
+def _format_labels(label_names: Tuple[str, ...], label_values: Tuple[str, ...], extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.extend(extra.items())
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        with _lock:
+            _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with _lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = value
+
+    def clear(self):
+        with _lock:
+            self._values.clear()
+
+    def replace(self, values: Dict[Tuple[str, ...], float]):
+        """Swap in a full set of samples (label values in labelnames order -> value) in one step, so scrapes never see it half-built."""
+        values = {tuple(str(v) for v in key): value for key, value in values.items()}
+        with _lock:
+            self._values = values
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with _lock:
+            items = [(k, {"counts": list(v["counts"]), "sum": v["sum"], "count": v["count"]}) for k, v in self._values.items()]
+        for key, state in items:
+            for bound, count in zip(self.buckets, state["counts"]):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': repr(bound)})} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': '+Inf'})} {state['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {state['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state['count']}")
+        return lines
+
+
+# --- Metric definitions ---
+STAGE_DURATION = Histogram("analysis_stage_duration_seconds", "Wall time of each analysis pipeline stage.", ("stage",))
+LLM_REQUEST_DURATION = Histogram("llm_request_duration_seconds", "Latency of LLM and embedding API requests.", ("operation", "model", "outcome"))
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported by the API usage field.", ("operation", "model", "kind"))
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by cache name and result.", ("cache", "result"))
+JOBS = Gauge("analysis_jobs", "Analysis jobs in the shared job store by status, across all workers (finished jobs included).", ("status",))
+JOB_QUEUE = Gauge("analysis_job_queue", "Jobs on the shared work queue: waiting for a worker, or leased by one.", ("state",))
+EVENT_LOOP_LAG = Gauge("event_loop_lag_seconds", "Most recent event loop scheduling lag.")
+EVENT_LOOP_LAG_HIST = Histogram("event_loop_lag_observed_seconds", "Distribution of event loop scheduling lag.",
+                                buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+EVENT_LOOP_BLOCKS = Counter("event_loop_blocks_total", "Event loop callbacks that held the loop longer than LOOP_BLOCK_THRESHOLD_MS.")
+PROCESS_RSS = Gauge("process_resident_memory_bytes", "Resident set size of this process.")
+LLM_CONCURRENCY_LIMIT = Gauge("llm_concurrency_limit", "Current AIMD concurrency limit of each rate governor.", ("governor",))
+LLM_QUEUE_DEPTH = Gauge("llm_queue_depth", "Requests waiting for admission in each rate governor.", ("governor",))
+LLM_RATE_LIMITED = Counter("llm_rate_limited_total", "429 responses seen by each rate governor.", ("governor",))
+
+
+def current_rss_bytes() -> int:
+    """Current resident set size, falling back to peak RSS where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@contextmanager
+def time_stage(job: Optional[dict], stage: str):
+    """
+    Time a pipeline stage: observes the stage histogram and, when a job record is given,
+    appends {stage, seconds, rss_bytes} to job["stage_timings"] and publishes it for /status.
+    Jobs run with profiling carry a core.profiler.JobProfiler in job["profiler"], which gets the stage too.
+    """
+    profiler = job.get("profiler") if job is not None else None
+    token = profiler.stage_started(stage) if profiler is not None else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.observe(elapsed, stage=stage)
+        if profiler is not None:
+            profiler.stage_finished(token, elapsed)
+        if job is not None:
+            rss = current_rss_bytes()
+            job.setdefault("stage_timings", []).append({"stage": stage, "seconds": round(elapsed, 4), "rss_bytes": rss})
+            job["peak_rss_bytes"] = max(job.get("peak_rss_bytes", 0), rss)
+            publish_progress(job)
+
+
+def publish_progress(job: Optional[dict]):
+    """
+    Save a running job's step/sub-step/timing changes to the shared job store right away, so
+    /status in other processes is current. The worker sets job["publish_progress"] to a hook that
+    queues the save instead of blocking (core.job_worker.ProgressPublisher); never persisted.
+    """
+    publish = job.get("publish_progress") if job is not None else None
+    if publish is None:
+        return
+    try:
+        publish()
+    except Exception as e:
+        logging.warning(f"Failed to publish job progress: {e}")
+
+
+def record_llm_call(operation: str, model: str, seconds: float, usage=None, outcome: str = "ok"):
+    """Record one API request's latency and the token counts from its `usage` field (no re-tokenizing)."""
+    LLM_REQUEST_DURATION.observe(seconds, operation=operation, model=model, outcome=outcome)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+    completion_tokens = getattr(usage, "completion_tokens", None) or 0
+    LLM_TOKENS.inc(prompt_tokens, operation=operation, model=model, kind="prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, operation=operation, model=model, kind="completion")
+    logging.info(f"[{operation.upper()}] {model} tokens: prompt={prompt_tokens} completion={completion_tokens} ({seconds:.2f}s)")
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    """Background task: measure how late the loop wakes us up compared with the requested sleep."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        EVENT_LOOP_LAG.set(lag)
+        EVENT_LOOP_LAG_HIST.observe(lag)
+
+
+# A callback holding the event loop longer than this is logged with its stack (0 turns the watchdog off)
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "250"))
+LOOP_STALLS_KEPT = 50
+LOOP_STALL_STACK_DEPTH = 30
+
+
+class LoopWatchdog:
+    """
+    Flags event-loop callbacks that block. A heartbeat task stamps the time every half
+    threshold; a watcher thread that sees the stamp go stale captures the loop thread's
+    current stack (the blocking callback) and keeps the most recent stalls for /loop-stalls.
+    """
+
+    def __init__(self, threshold_seconds: float, keep: int = LOOP_STALLS_KEPT):
+        self.threshold = threshold_seconds
+        self.interval = threshold_seconds / 2
+        self.stalls = deque(maxlen=keep)
+        self.count = 0
+        self._beat = None
+        self._loop_thread = None
+
+    async def run(self):
+        """Heartbeat; runs the watcher thread until cancelled."""
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        stop = threading.Event()
+        threading.Thread(target=self._watch, args=(stop,), name="loop-watchdog", daemon=True).start()
+        try:
+            while True:
+                self._beat = time.monotonic()
+                await asyncio.sleep(self.interval)
+        finally:
+            stop.set()
+
+    def _watch(self, stop: threading.Event):
+        stalled_beat, stall = None, None
+        while not stop.wait(self.interval / 2):
+            beat = self._beat
+            if stall is not None and beat != stalled_beat:
+                # The loop is running again: the heartbeat came this much later than scheduled
+                stall["blocked_seconds"] = round(beat - stalled_beat - self.interval, 3)
+                logging.warning(f"Event loop was blocked for {stall['blocked_seconds']:.3f}s by:\n{stall['stack']}")
+                stalled_beat, stall = None, None
+            if stall is None and time.monotonic() - beat > self.interval + self.threshold:
+                frame = sys._current_frames().get(self._loop_thread)
+                stack = "".join(traceback.format_stack(frame)[-LOOP_STALL_STACK_DEPTH:]) if frame is not None else ""
+                stalled_beat = beat
+                stall = {"at": datetime.utcnow().isoformat(), "blocked_seconds": round(time.monotonic() - beat - self.interval, 3),
+                         "stack": stack}
+                self.stalls.append(stall)
+                self.count += 1
+                EVENT_LOOP_BLOCKS.inc()
+
+    def report(self) -> dict:
+        return {"threshold_seconds": self.threshold, "count": self.count, "stalls": list(self.stalls)}
+
+
+LOOP_WATCHDOG = LoopWatchdog(LOOP_BLOCK_THRESHOLD_MS / 1000)
+
+
+def start_loop_watchdog() -> Optional[asyncio.Task]:
+    """Start LOOP_WATCHDOG on the running loop, unless LOOP_BLOCK_THRESHOLD_MS is 0."""
+    if LOOP_BLOCK_THRESHOLD_MS <= 0:
+        return None
+    return asyncio.create_task(LOOP_WATCHDOG.run())
+
+
+def render_metrics() -> str:
+    """Render every registered metric in the Prometheus text exposition format."""
+    PROCESS_RSS.set(current_rss_bytes())
+    lines: List[str] = []
+    with _lock:
+        metrics = list(_registry)
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
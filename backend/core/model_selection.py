@@ -0,0 +1,139 @@
+import io
+import time
+import pickle
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, f1_score, log_loss
+from sklearn.neural_network import MLPClassifier
+from sklearn.svm import LinearSVC
+
+from core.openai_client import reduce_embedding_dimensions
+
+# Sentiment classifier candidates, compared on quality and on what they cost to serve. Every
+# candidate is a plain scikit-learn estimator with predict_proba and classes_, so the winner
+# pickles into the artifact load_classifier()/classify_embeddings() already serve.
+
+SERVING_BATCH = 10000
+ECE_BINS = 15
+
+
+@dataclass
+class Candidate:
+    kind: str  # "logreg", "svm" or "mlp"
+    dimensions: int
+    params: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def name(self) -> str:
+        params = ",".join(f"{k}={v}" for k, v in self.params.items())
+        return f"{self.kind}[{params}]@d{self.dimensions}" if params else f"{self.kind}@d{self.dimensions}"
+
+    def build(self):
+        if self.kind == "logreg":
+            return LogisticRegression(max_iter=1000, solver="lbfgs", **self.params)
+        if self.kind == "svm":
+            # LinearSVC has no probabilities; sigmoid calibration on held-out folds adds them
+            return CalibratedClassifierCV(LinearSVC(dual="auto", **self.params), method="sigmoid", cv=3, ensemble=False)
+        if self.kind == "mlp":
+            mlp = MLPClassifier(hidden_layer_sizes=self.params.get("hidden", (128,)), early_stopping=True, max_iter=200, random_state=42)
+            return CalibratedClassifierCV(mlp, method="sigmoid", cv=3, ensemble=False)
+        raise ValueError(f"Unknown candidate kind {self.kind!r}")
+
+
+def candidate_grid(dimensions: Sequence[int], c_values: Sequence[float], kinds: Sequence[str] = ("logreg", "svm", "mlp")) -> List[Candidate]:
+    """Logistic regression at every C and dimension; linear SVM and the MLP once per dimension."""
+    candidates = []
+    for dim in dimensions:
+        if "logreg" in kinds:
+            candidates += [Candidate("logreg", dim, {"C": c}) for c in c_values]
+        if "svm" in kinds:
+            candidates.append(Candidate("svm", dim, {"C": 1.0}))
+        if "mlp" in kinds:
+            candidates.append(Candidate("mlp", dim, {"hidden": (128,)}))
+    return candidates
+
+
+def expected_calibration_error(probabilities: np.ndarray, y: np.ndarray, bins: int = ECE_BINS) -> float:
+    """Weighted gap between confidence (top probability) and accuracy over equal-width confidence bins."""
+    confidence = probabilities.max(axis=1)
+    correct = probabilities.argmax(axis=1) == y
+    edges = np.linspace(0.0, 1.0, bins + 1)
+    ece = 0.0
+    for low, high in zip(edges[:-1], edges[1:]):
+        in_bin = (confidence > low) & (confidence <= high)
+        if in_bin.any():
+            ece += in_bin.mean() * abs(correct[in_bin].mean() - confidence[in_bin].mean())
+    return float(ece)
+
+
+def reduce(X: np.ndarray, dimensions: int) -> np.ndarray:
+    """Shorten cached vectors the way serving receives them (as load_embedding_matrix does)."""
+    return reduce_embedding_dimensions(X, dimensions) if dimensions < X.shape[1] else np.asarray(X, dtype=np.float32)
+
+
+def fit_candidate(candidate: Candidate, X_train: np.ndarray, y_train: np.ndarray, X_test: np.ndarray, y_test: np.ndarray) -> dict:
+    """Fit one candidate on cached full-size embeddings (reduced to its dimension here) and score it. Runs in a worker process."""
+    train = reduce(X_train, candidate.dimensions)
+    test = reduce(X_test, candidate.dimensions)
+    clf = candidate.build()
+    start = time.perf_counter()
+    clf.fit(train, y_train)
+    fit_seconds = time.perf_counter() - start
+    # Serving maps argmax(predict_proba) through classes_, so score exactly that
+    probabilities = clf.predict_proba(test)
+    y_pred = clf.classes_[probabilities.argmax(axis=1)]
+    return {
+        "model": candidate.name,
+        "kind": candidate.kind,
+        "dimensions": candidate.dimensions,
+        "accuracy": accuracy_score(y_test, y_pred),
+        "macro_f1": f1_score(y_test, y_pred, average="macro"),
+        "log_loss": log_loss(y_test, probabilities, labels=clf.classes_),
+        "ece": expected_calibration_error(probabilities, np.searchsorted(clf.classes_, y_test)),
+        "fit_seconds": round(fit_seconds, 3),
+        "artifact": pickle.dumps(clf),
+    }
+
+
+def serving_cost(artifact: bytes, dimensions: int, repeats: int = 3, seed: int = 0) -> dict:
+    """Size, unpickle time and predict_proba latency per SERVING_BATCH reviews (best of `repeats`)."""
+    batch = np.random.RandomState(seed).standard_normal((SERVING_BATCH, dimensions)).astype(np.float32)
+    load_seconds, predict_seconds = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        clf = pickle.load(io.BytesIO(artifact))
+        load_seconds.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        clf.predict_proba(batch)
+        predict_seconds.append(time.perf_counter() - start)
+    return {
+        "model_bytes": len(artifact),
+        "load_ms": round(1000 * min(load_seconds), 3),
+        "predict_ms_per_10k": round(1000 * min(predict_seconds) * 10000 / SERVING_BATCH, 3),
+        "embedding_bytes_per_review": dimensions * 4,
+    }
+
+
+def pareto_front(rows: List[dict], quality: str = "macro_f1", cost: str = "predict_ms_per_10k") -> List[str]:
+    """Models no other model beats on both quality (higher) and serving latency (lower)."""
+    front = []
+    for row in rows:
+        dominated = any(other[quality] >= row[quality] and other[cost] <= row[cost]
+                        and (other[quality] > row[quality] or other[cost] < row[cost]) for other in rows)
+        if not dominated:
+            front.append(row["model"])
+    return front
+
+
+def pick_winner(rows: List[dict], max_predict_ms: float = None, max_model_bytes: int = None, quality: str = "macro_f1") -> dict:
+    """Best quality within the serving budget; near-ties (0.002) go to the faster model."""
+    eligible = [r for r in rows if (max_predict_ms is None or r["predict_ms_per_10k"] <= max_predict_ms)
+                and (max_model_bytes is None or r["model_bytes"] <= max_model_bytes)]
+    if not eligible:
+        raise ValueError("No candidate fits the serving budget")
+    best = max(r[quality] for r in eligible)
+    return min((r for r in eligible if r[quality] >= best - 0.002), key=lambda r: r["predict_ms_per_10k"])
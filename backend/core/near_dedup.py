@@ -0,0 +1,136 @@
+import os
+import zlib
+import logging
+from collections import defaultdict
+from typing import List, Tuple
+import numpy as np
+import regex as re
+
+NEAR_DEDUP_ENABLED = os.getenv("NEAR_DEDUP_ENABLED", "true").lower() == "true"
+NEAR_DEDUP_THRESHOLD = float(os.getenv("NEAR_DEDUP_THRESHOLD", "0.8"))
+
+NUM_PERM = 128
+BANDS = 16  # 16 bands x 8 rows: candidate pairs start around Jaccard 0.7, verified against the threshold
+SHINGLE_SIZE = 5
+VERIFY_CHUNK = 64  # bucket members compared against the rest of their bucket at once
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32, so a*h + b stays inside uint64
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 2**32 - 1, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 2**32 - 1, size=NUM_PERM, dtype=np.uint64)
+_MAX_HASH = np.uint64(2**32 - 1)
+
+
+def normalize_for_shingles(text: str) -> str:
+    text = re.sub(r"[\p{P}\p{S}]+", " ", (text or "").lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def shingle_hashes(text: str, k: int = SHINGLE_SIZE) -> np.ndarray:
+    """32-bit hashes of the character k-grams of the normalized text."""
+    norm = normalize_for_shingles(text)
+    if not norm:
+        return np.empty(0, dtype=np.uint64)
+    if len(norm) <= k:
+        grams = {norm}
+    else:
+        grams = {norm[i:i+k] for i in range(len(norm) - k + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    hashes = shingle_hashes(text)
+    if hashes.size == 0:
+        return np.full(NUM_PERM, _MAX_HASH, dtype=np.uint64)
+    permuted = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _PRIME
+    return permuted.min(axis=1)
+
+
+def _link(labels: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Merge the components joined by edges a[k]-b[k]; labels[x] is the smallest member of x's component."""
+    while True:
+        la, lb = labels[a], labels[b]
+        split = la != lb
+        if not split.any():
+            return labels
+        # Hook the larger root under the smaller one, then jump pointers until every label is a root
+        np.minimum.at(labels, np.maximum(la[split], lb[split]), np.minimum(la[split], lb[split]))
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+
+
+def near_duplicate_representatives(texts: List[str], threshold: float = NEAR_DEDUP_THRESHOLD) -> List[int]:
+    """
+    Cluster near-duplicate texts with MinHash + LSH banding and return, for each text,
+    the index of its cluster representative (the earliest text in the cluster).
+    Empty texts are never merged.
+    """
+    n = len(texts)
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    valid = [i for i, t in enumerate(texts) if t and normalize_for_shingles(t)]
+    if len(valid) < 2:
+        return parent
+    signatures = np.vstack([minhash_signature(texts[i]) for i in valid])
+
+    def union(a, b):
+        ra, rb = find(valid[a]), find(valid[b])
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+
+    # Identical signatures match outright; only the first of each goes through banding
+    distinct = {}
+    for pos in range(len(valid)):
+        key = signatures[pos].tobytes()
+        if key in distinct:
+            union(distinct[key], pos)
+        else:
+            distinct[key] = pos
+    heads = np.fromiter(distinct.values(), dtype=np.int64)
+    rows = NUM_PERM // BANDS
+    for band in range(BANDS):
+        buckets = defaultdict(list)
+        band_sigs = signatures[heads, band*rows:(band+1)*rows]
+        for k, pos in enumerate(heads):
+            buckets[band_sigs[k].tobytes()].append(pos)
+        for members in buckets.values():
+            # Every pair in the bucket is verified, so a cluster is found whichever member comes first
+            if len(members) < 2 or len({find(valid[m]) for m in members}) == 1:
+                continue
+            members = np.array(members)
+            bucket_sigs = signatures[members]
+            labels = np.arange(len(members))
+            for start in range(0, len(members), VERIFY_CHUNK):
+                similarity = (bucket_sigs[start:start+VERIFY_CHUNK, None, :] == bucket_sigs[None, :, :]).mean(axis=2)
+                i, j = np.nonzero(similarity >= threshold)
+                labels = _link(labels, i + start, j)
+            for member, label in zip(members, labels):
+                if label != member:
+                    union(members[label], member)
+    return [find(i) for i in range(n)]
+
+
+def collapse_near_duplicates(texts: List[str], threshold: float = NEAR_DEDUP_THRESHOLD) -> Tuple[List[int], dict]:
+    """
+    Returns (rep_of, report): rep_of[i] is the representative index for texts[i]; only
+    representatives need to go through embedding and LLM stages, and results fan back
+    out through rep_of.
+    """
+    rep_of = near_duplicate_representatives(texts, threshold)
+    representatives = sum(1 for i, r in enumerate(rep_of) if i == r)
+    report = {
+        "reviews": len(texts),
+        "representatives": representatives,
+        "collapsed": len(texts) - representatives,
+        "threshold": threshold,
+    }
+    logging.info(f"Near-duplicate collapse: {len(texts)} -> {representatives} representative reviews.")
+    return rep_of, report
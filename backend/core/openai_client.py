@@ -1,27 +1,102 @@
 import os
-from openai import AsyncOpenAI
 from typing import List
 import json
-import aiohttp
 import numpy as np
 import pickle
 import asyncio
+import time
 from .aspect_extract import batch_llm_extract_aspects
-import tiktoken
+from .metrics import record_llm_call, record_cache
+from .rate_governor import get_governor, estimate_tokens, total_usage_tokens, gather_or_cancel
+from .batch_llm import chat_completion
 
-def get_openai_client():
+# One pooled client per process: connections and TLS sessions are reused across stages and jobs
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "50"))
+OPENAI_KEEPALIVE_SECONDS = float(os.getenv("OPENAI_KEEPALIVE_SECONDS", "90"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10"))
+OPENAI_READ_TIMEOUT = float(os.getenv("OPENAI_READ_TIMEOUT", "180"))
+# 429s and transient errors are retried by core.rate_governor, which also backs off the whole
+# process; SDK-level retries would bypass it, so they are off by default
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "0"))
+
+_client = None
+_client_loop = None
+
+def _build_openai_client():
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise RuntimeError("OPENAI_API_KEY not set in environment")
-    return AsyncOpenAI(api_key=api_key)
+    import httpx
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                            max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                            keepalive_expiry=OPENAI_KEEPALIVE_SECONDS),
+        timeout=httpx.Timeout(OPENAI_READ_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT, pool=OPENAI_READ_TIMEOUT),
+    )
+    return AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=OPENAI_MAX_RETRIES)
+
+def get_openai_client():
+    """
+    Shared AsyncOpenAI client. Created at app startup (see start_openai_client) or lazily on
+    first use, e.g. in scripts. An httpx pool is tied to the event loop that opened its
+    connections, so a new loop (a second asyncio.run) gets a fresh client.
+    """
+    global _client, _client_loop
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if _client is None or (loop is not None and _client_loop is not None and loop is not _client_loop):
+        _client = _build_openai_client()
+        _client_loop = loop
+    elif _client_loop is None:
+        _client_loop = loop
+    return _client
+
+def start_openai_client():
+    """Create the shared client up front so the first job does not pay for it."""
+    return get_openai_client()
+
+async def close_openai_client():
+    global _client, _client_loop
+    if _client is not None:
+        await _client.close()
+    _client, _client_loop = None, None
 
 # Embedding
-async def embed_texts(texts: List[str]) -> List[List[float]]:
+EMBED_MODEL = "text-embedding-3-large"
+FULL_EMBEDDING_DIMENSIONS = 3072
+# text-embedding-3 models accept a `dimensions` parameter; smaller vectors cut memory, transfer and classifier cost
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", str(FULL_EMBEDDING_DIMENSIONS)))
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+
+def reduce_embedding_dimensions(embeddings: np.ndarray, dimensions: int) -> np.ndarray:
+    """
+    Shorten full-size text-embedding-3 vectors to `dimensions` the same way the API's
+    `dimensions` parameter does: keep the leading components and re-normalize to unit length.
+    """
+    X = np.asarray(embeddings, dtype=np.float32)[:, :dimensions]
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+def classifier_model_path(dimensions: int = EMBEDDING_DIMENSIONS, provider: str = "openai") -> str:
     """
-    Call OpenAI embedding API (text-embedding-3-small) for a batch of texts.
-    Returns a list of 1536-D float vectors.
+    Sentiment model artifacts are tagged by embedding provider and dimension, e.g.
+    logreg_sentiment_d512.pkl (OpenAI) or logreg_sentiment_local_d384.pkl.
+    """
+    tag = "" if provider == "openai" else f"{provider}_"
+    return os.path.join(MODELS_DIR, f"logreg_sentiment_{tag}d{dimensions}.pkl")
+
+async def embed_texts(texts: List[str], dimensions: int = None) -> np.ndarray:
+    """
+    Call OpenAI embedding API (text-embedding-3-large) for a batch of texts.
+    Returns a float32 (n, `dimensions`) matrix (EMBEDDING_DIMENSIONS by default, 3072 at full size).
     Automatically batches requests to avoid API limits.
     """
+    dimensions = dimensions or EMBEDDING_DIMENSIONS
     # Sanitize input: remove non-string and empty string values
     input_texts = [t for t in texts if isinstance(t, str) and t.strip()]
     print(f"Embedding input sample: {input_texts[:5]}")
@@ -30,28 +105,62 @@ async def embed_texts(texts: List[str]) -> List[List[float]]:
         raise ValueError("No valid texts to embed: input is empty after filtering.")
     client = get_openai_client()
     BATCH_SIZE = 2048
-    all_embeddings = []
-    for i in range(0, len(input_texts), BATCH_SIZE):
-        batch = input_texts[i:i+BATCH_SIZE]
-        print(f"Embedding batch {i//BATCH_SIZE+1}: size {len(batch)}")
-        response = await client.embeddings.create(
-            model="text-embedding-3-large",
-            input=batch
-        )
-        all_embeddings.extend([d.embedding for d in response.data])
-    return all_embeddings
+    model = EMBED_MODEL
+    extra = {"dimensions": dimensions} if dimensions < FULL_EMBEDDING_DIMENSIONS else {}
+    governor = get_governor("embeddings")
+    matrix = None
+
+    async def embed_batch(offset, batch):
+        nonlocal matrix
+        print(f"Embedding batch {offset // BATCH_SIZE + 1}: size {len(batch)}")
+        start = time.perf_counter()
+        try:
+            response = await governor.call(
+                lambda: client.embeddings.create(model=model, input=batch, **extra),
+                estimate_tokens(batch), usage_tokens=total_usage_tokens)
+        except Exception:
+            record_llm_call("embedding", model, time.perf_counter() - start, outcome="error")
+            raise
+        record_llm_call("embedding", model, time.perf_counter() - start, response.usage)
+        # Each response goes straight into the float32 result; no per-review Python float lists are kept
+        vectors = np.array([d.embedding for d in response.data], dtype=np.float32)
+        if matrix is None:
+            matrix = np.empty((len(input_texts), vectors.shape[1]), dtype=np.float32)
+        matrix[offset:offset + len(vectors)] = vectors
+
+    # Batches run concurrently; the governor keeps them inside the RPM/TPM quota
+    await gather_or_cancel(*(embed_batch(i, input_texts[i:i+BATCH_SIZE]) for i in range(0, len(input_texts), BATCH_SIZE)))
+    return matrix
 
 # Classification
+_classifiers = {}
+
+def load_classifier(dimensions: int = EMBEDDING_DIMENSIONS, provider: str = "openai"):
+    """
+    Load the logistic regression model for an embedding provider and dimension once per process and reuse it across jobs.
+    Falls back to the untagged legacy artifact for full-size (3072-d) OpenAI embeddings.
+    """
+    key = (provider, dimensions)
+    record_cache("classifier", key in _classifiers)
+    if key not in _classifiers:
+        model_path = classifier_model_path(dimensions, provider)
+        if not os.path.exists(model_path) and provider == "openai" and dimensions == FULL_EMBEDDING_DIMENSIONS:
+            model_path = os.path.join(MODELS_DIR, 'logreg_sentiment.pkl')
+        with open(model_path, 'rb') as f:
+            clf = pickle.load(f)
+        n_features = getattr(clf, "n_features_in_", dimensions)
+        if n_features != dimensions:
+            raise ValueError(f"Model {model_path} expects {n_features}-d embeddings, got {dimensions}-d")
+        _classifiers[key] = clf
+    return _classifiers[key]
 
-def classify_embeddings(embeddings: List[List[float]]):
+def classify_embeddings(embeddings: List[List[float]], provider: str = "openai"):
     """
-    Load logistic regression model and predict sentiment for each embedding.
+    Load the logistic regression model trained on `provider` embeddings and predict sentiment for each embedding.
     Returns a list of dicts: {label, probabilities}
     """
-    model_path = os.path.join(os.path.dirname(__file__), '../models/logreg_sentiment.pkl')
-    with open(model_path, 'rb') as f:
-        clf = pickle.load(f)
-    X = np.array(embeddings)
+    X = np.asarray(embeddings, dtype=np.float32)
+    clf = load_classifier(X.shape[1], provider)
     probs = clf.predict_proba(X)
     labels = clf.classes_[np.argmax(probs, axis=1)]
     results = []
@@ -72,12 +181,8 @@ async def get_cleaning_steps_batch(reviews: List[str]) -> List[List[str]]:
     """
     For each review, use GPT-4.1 to decide which cleaning steps to apply.
     Returns a list of lists of step names (e.g., [ ["html", "emoji"], ... ])
+    In bulk LLM mode the request is answered through an offline batch (see core.batch_llm).
     """
-    import openai
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY not set in environment")
-    client = openai.AsyncOpenAI(api_key=api_key)
 
     system_prompt = (
         "You are a text cleaning expert. For each review, decide which cleaning steps are needed from the following list:\n"
@@ -97,26 +202,25 @@ async def get_cleaning_steps_batch(reviews: List[str]) -> List[List[str]]:
     )
     user_prompt = "Reviews:\n" + "\n".join(f"{i+1}. {r}" for i, r in enumerate(reviews))
 
-    # encoding = tiktoken.encoding_for_model("gpt-4.1-2025-04-14")
-    encoding = tiktoken.get_encoding("cl100k_base")
-    system_tokens = len(encoding.encode(system_prompt))
-    user_tokens = len(encoding.encode(user_prompt))
-    print(f"[CLEANING] System prompt tokens: {system_tokens}")
-    print(f"[CLEANING] User prompt tokens: {user_tokens}")
-
-    response = await client.chat.completions.create(
-        model="gpt-4.1-2025-04-14",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        temperature=0.0,
-        max_tokens=15000
-    )
+    model = "gpt-4.1-2025-04-14"
+    max_tokens = 15000
+    start = time.perf_counter()
+    try:
+        response = await chat_completion(
+            get_governor("chat"), estimate_tokens([system_prompt, user_prompt], max_tokens),
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=0.0,
+            max_tokens=max_tokens)
+    except Exception:
+        record_llm_call("cleaning", model, time.perf_counter() - start, outcome="error")
+        raise
+    # Token counts come from the API usage field; re-encoding prompts just to log them costs CPU
+    record_llm_call("cleaning", model, time.perf_counter() - start, response.usage)
     output_text = response.choices[0].message.content
-    output_tokens = len(encoding.encode(output_text))
-    print(f"[CLEANING] Output tokens: {output_tokens}")
-    print(f"[CLEANING] Total tokens: {system_tokens + user_tokens + output_tokens}")
     try:
         steps = json.loads(output_text.strip())
         if isinstance(steps, list) and all(isinstance(x, list) for x in steps):
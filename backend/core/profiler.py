@@ -0,0 +1,197 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Opt-in per-job profiles (POST /analyze/{sku}?profile=true) are written to PROFILE_DIR/{job_id}.json
+# and downloaded from GET /jobs/{job_id}/profile as speedscope JSON or collapsed stacks
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+# Allocation peaks come from tracemalloc, which slows the whole process while any profiled job runs
+PROFILE_TRACEMALLOC = os.getenv("PROFILE_TRACEMALLOC", "true").lower() == "true"
+PROFILE_MAX_DEPTH = 128
+PROFILE_TOP_ALLOCATIONS = 25
+
+# Leaf frames of threads that are only waiting for work (idle event loop, idle pool workers)
+_IDLE_LEAVES = {("selectors.py", "select"), ("thread.py", "_worker"), ("threading.py", "wait")}
+
+_tracemalloc_users = 0
+_tracemalloc_lock = threading.Lock()
+
+
+def _frame_name(code) -> str:
+    parts = code.co_filename.replace("\\", "/").split("/")
+    return f"{code.co_name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})"
+
+
+def _start_tracemalloc() -> bool:
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and tracemalloc.is_tracing():
+            return False  # traced by someone else (e.g. PYTHONTRACEMALLOC); leave it alone
+        if _tracemalloc_users == 0:
+            tracemalloc.start()
+        _tracemalloc_users += 1
+        return True
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+
+
+class JobProfiler:
+    """
+    Sampling profiler for one job. A background thread records the Python stack of every
+    busy thread every PROFILE_INTERVAL_MS, and time_stage() reports each stage's wall time,
+    process CPU time and peak traced memory. Stacks and CPU/memory figures are process-wide,
+    so other jobs running in the same worker at the same time show up too; profile with
+    WORKER_CONCURRENCY=1 for a clean picture.
+    """
+
+    def __init__(self, job_id: str, sku: str = None, interval_ms: float = PROFILE_INTERVAL_MS,
+                 trace_memory: bool = PROFILE_TRACEMALLOC):
+        self.job_id = job_id
+        self.sku = sku
+        self.interval = interval_ms / 1000.0
+        self.trace_memory = trace_memory
+        self.samples: Counter = Counter()
+        self.stages: List[dict] = []
+        self._active: Dict[int, dict] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._tracing = False
+
+    def start(self):
+        self._tracing = self.trace_memory and _start_tracemalloc()
+        self.started_at = datetime.utcnow().isoformat()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._thread = threading.Thread(target=self._sample_loop, name=f"profiler-{self.job_id[:8]}", daemon=True)
+        self._thread.start()
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                self.samples[(names.get(ident, str(ident)), tuple(reversed(stack)))] += 1
+            if self._tracing:
+                traced = tracemalloc.get_traced_memory()[0]
+                with self._lock:
+                    for active in self._active.values():
+                        active["peak_traced_bytes"] = max(active["peak_traced_bytes"], traced)
+
+    def stage_started(self, stage: str) -> int:
+        traced = tracemalloc.get_traced_memory()[0] if self._tracing else 0
+        entry = {"stage": stage, "cpu_start": time.process_time(), "start_traced_bytes": traced, "peak_traced_bytes": traced,
+                 "offset_seconds": round(time.perf_counter() - self._wall_start, 4)}
+        with self._lock:
+            token = id(entry)
+            self._active[token] = entry
+        return token
+
+    def stage_finished(self, token: int, wall_seconds: float):
+        with self._lock:
+            entry = self._active.pop(token)
+        if self._tracing:
+            entry["peak_traced_bytes"] = max(entry["peak_traced_bytes"], tracemalloc.get_traced_memory()[0])
+        else:
+            entry.pop("start_traced_bytes")
+            entry.pop("peak_traced_bytes")
+        entry["wall_seconds"] = round(wall_seconds, 4)
+        entry["process_cpu_seconds"] = round(time.process_time() - entry.pop("cpu_start"), 4)
+        self.stages.append(entry)
+
+    def stop(self) -> dict:
+        """Stop sampling and return the profile record."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        profile = {
+            "job_id": self.job_id,
+            "sku": self.sku,
+            "started_at": self.started_at,
+            "interval_seconds": self.interval,
+            "wall_seconds": round(time.perf_counter() - self._wall_start, 4),
+            "process_cpu_seconds": round(time.process_time() - self._cpu_start, 4),
+            "stages": self.stages,
+            "samples": [[thread, list(stack), count] for (thread, stack), count in self.samples.most_common()],
+        }
+        if self._tracing:
+            profile["peak_traced_bytes"] = tracemalloc.get_traced_memory()[1]
+            # Largest live allocation sites when the pipeline finished (its state is still referenced)
+            stats = tracemalloc.take_snapshot().statistics("lineno")[:PROFILE_TOP_ALLOCATIONS]
+            profile["top_allocations"] = [{"site": f"{s.traceback[0].filename}:{s.traceback[0].lineno}", "bytes": s.size, "count": s.count}
+                                          for s in stats]
+            _stop_tracemalloc()
+            self._tracing = False
+        return profile
+
+    def stop_and_save(self, root: str = None) -> str:
+        profile = self.stop()
+        path = profile_path(self.job_id, root)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(profile, f, default=str)
+        os.replace(f"{path}.tmp", path)
+        logging.info(f"Saved profile of job {self.job_id} ({sum(self.samples.values())} samples) to {path}")
+        return path
+
+
+def profile_path(job_id: str, root: str = None) -> str:
+    return os.path.join(root or PROFILE_DIR, f"{job_id}.json")
+
+
+def load_profile(job_id: str, root: str = None) -> Optional[dict]:
+    path = profile_path(job_id, root)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def to_collapsed(profile: dict) -> str:
+    """Brendan Gregg collapsed stacks ("thread;outer;...;inner count" per line), for flamegraph.pl and friends."""
+    return "".join(f"{';'.join([thread] + stack)} {count}\n" for thread, stack, count in profile["samples"])
+
+
+def to_speedscope(profile: dict) -> dict:
+    """speedscope.app file format: one sampled profile per thread, weighted in seconds."""
+    frames, frame_index = [], {}
+    by_thread: Dict[str, list] = {}
+    for thread, stack, count in profile["samples"]:
+        indices = []
+        for name in stack:
+            if name not in frame_index:
+                frame_index[name] = len(frames)
+                frames.append({"name": name})
+            indices.append(frame_index[name])
+        by_thread.setdefault(thread, []).append((indices, count * profile["interval_seconds"]))
+    profiles = []
+    for thread, samples in by_thread.items():
+        total = sum(weight for _, weight in samples)
+        profiles.append({"type": "sampled", "name": thread, "unit": "seconds", "startValue": 0, "endValue": total,
+                         "samples": [indices for indices, _ in samples], "weights": [weight for _, weight in samples]})
+    return {"$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"job {profile['job_id']} (SKU {profile.get('sku')})", "exporter": "sentiment-analysis job profiler",
+            "shared": {"frames": frames}, "profiles": profiles}
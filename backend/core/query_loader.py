@@ -1,8 +1,36 @@
 import yaml
+from functools import lru_cache
 from pathlib import Path
- 
+from typing import Any, Dict, Tuple
+
+QUERY_TEMPLATES_PATH = Path(__file__).parent.parent / "config" / "query_templates.yaml"
+
+
+@lru_cache(maxsize=1)
+def load_query_config() -> Dict[str, Any]:
+    """Parse query_templates.yaml once per process."""
+    with open(QUERY_TEMPLATES_PATH, "r") as f:
+        return yaml.safe_load(f)
+
+
 def load_query_template(name: str) -> str:
-    config_path = Path(__file__).parent.parent / "config" / "query_templates.yaml"
-    with open(config_path, "r") as f:
-        config = yaml.safe_load(f)
-    return config[name]["query"] 
\ No newline at end of file
+    return load_query_config()[name]["query"]
+
+
+def build_query(name: str, params: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """
+    SQL text and bind parameters for a template. Optional filters (and the limit clause) are
+    appended only for parameters that are set, followed by the template's `suffix` (e.g. a
+    group by) if it has one; values always travel as bind parameters.
+    """
+    config = load_query_config()[name]
+    params = {k: v for k, v in params.items() if v is not None}
+    sql = config["query"].rstrip()
+    for key, clause in config.get("filters", {}).items():
+        if key in params:
+            sql += f"\n{clause}"
+    if config.get("suffix"):
+        sql += f"\n{config['suffix'].rstrip()}"
+    if "limit" in params and config.get("limit"):
+        sql += f"\n{config['limit']}"
+    return sql, params
@@ -0,0 +1,242 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import contextvars
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from core.metrics import LLM_CONCURRENCY_LIMIT, LLM_QUEUE_DEPTH, LLM_RATE_LIMITED
+
+# Per-minute quotas for this process (match the organisation's OpenAI tier)
+OPENAI_CHAT_RPM = int(os.getenv("OPENAI_CHAT_RPM", "500"))
+OPENAI_CHAT_TPM = int(os.getenv("OPENAI_CHAT_TPM", "800000"))
+OPENAI_EMBED_RPM = int(os.getenv("OPENAI_EMBED_RPM", "3000"))
+OPENAI_EMBED_TPM = int(os.getenv("OPENAI_EMBED_TPM", "1000000"))
+# AIMD concurrency window: starts at INITIAL, +1 per window of successes, halves on a 429
+LLM_INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", "8"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+# Successful calls slower than this do not grow the window
+LLM_LATENCY_TARGET_SECONDS = float(os.getenv("LLM_LATENCY_TARGET_SECONDS", "30"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "6"))
+
+# Job and priority of the work running in the current task; set by the pipeline, inherited by
+# every task it spawns. Lower priority values are served first.
+current_job_id = contextvars.ContextVar("current_job_id", default=None)
+current_priority = contextvars.ContextVar("current_priority", default=1)
+PRIORITY_INTERACTIVE = 0  # an analyst is waiting on this call (e.g. the summary view)
+PRIORITY_PIPELINE = 1
+PRIORITY_BULK = 2
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding up to one minute of quota."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def seconds_until(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        """Debit `amount` (negative refunds). The level may go below zero after a correction."""
+        self._refill()
+        self.level = min(self.capacity, self.level - amount)
+
+
+def is_rate_limit_error(e: Exception) -> bool:
+    return getattr(e, "status_code", None) == 429 or type(e).__name__ == "RateLimitError"
+
+
+def is_transient_error(e: Exception) -> bool:
+    status = getattr(e, "status_code", None)
+    return (status is not None and status >= 500) or type(e).__name__ in ("APITimeoutError", "APIConnectionError", "TimeoutError")
+
+
+def _retry_after_seconds(e: Exception) -> Optional[float]:
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header in ("retry-after-ms", "retry-after"):
+        value = headers.get(header)
+        if value:
+            try:
+                return float(value) / (1000.0 if header.endswith("ms") else 1.0)
+            except ValueError:
+                pass
+    return None
+
+
+class RateGovernor:
+    """
+    Process-wide admission control for one API resource (chat or embeddings).
+
+    A request is started only when the RPM and TPM buckets can cover it and fewer than
+    `limit` requests are in flight. `limit` follows AIMD: it grows by 1/limit per fast
+    success and halves (at most once per cool-down) when the API answers 429. Waiting
+    requests are served by priority, then by whichever job has been served least, so
+    one large job cannot starve the others.
+    """
+
+    def __init__(self, name: str, rpm: int, tpm: int, initial_concurrency: int = LLM_INITIAL_CONCURRENCY,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, latency_target: float = LLM_LATENCY_TARGET_SECONDS):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.limit = float(initial_concurrency)
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._last_decrease = 0.0
+        self._waiters: List[list] = []  # [priority, seq, job_id, est_tokens, future]
+        self._served = Counter()
+        self._seq = 0
+        self._timer = None
+        self._publish()
+
+    def _publish(self):
+        LLM_CONCURRENCY_LIMIT.set(round(self.limit, 2), governor=self.name)
+        LLM_QUEUE_DEPTH.set(len(self._waiters), governor=self.name)
+
+    def stats(self) -> Dict[str, float]:
+        return {"limit": round(self.limit, 2), "in_flight": self.in_flight, "queued": len(self._waiters),
+                "rpm_available": round(self.requests.level, 1), "tpm_available": round(self.tokens.level)}
+
+    def _next_waiter(self) -> Optional[list]:
+        self._waiters = [w for w in self._waiters if not w[4].done()]
+        if not self._waiters:
+            return None
+        return min(self._waiters, key=lambda w: (w[0], self._served[w[2]], w[1]))
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self.in_flight < max(1, int(self.limit)):
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            wait = max(self.paused_until - time.monotonic(),
+                       self.requests.seconds_until(1), self.tokens.seconds_until(waiter[3]))
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                break
+            self._waiters.remove(waiter)
+            self.requests.take(1)
+            self.tokens.take(waiter[3])
+            self.in_flight += 1
+            self._served[waiter[2]] += 1
+            waiter[4].set_result(None)
+        self._publish()
+
+    async def acquire(self, est_tokens: int, job_id: Optional[str] = None, priority: Optional[int] = None):
+        future = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        priority = current_priority.get() if priority is None else priority
+        job_id = current_job_id.get() if job_id is None else job_id
+        self._waiters.append([priority, self._seq, job_id, est_tokens, future])
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted just as we were cancelled; give it back
+                self.release(0.0, 0, 0)
+            raise
+
+    def release(self, latency: float, used_tokens: int, est_tokens: int, rate_limited: bool = False,
+                retry_after: Optional[float] = None):
+        self.in_flight -= 1
+        # Settle the token bucket against what the request really used
+        self.tokens.take(used_tokens - est_tokens)
+        now = time.monotonic()
+        if rate_limited:
+            LLM_RATE_LIMITED.inc(governor=self.name)
+            if now - self._last_decrease > max(1.0, latency):
+                self.limit = max(1.0, self.limit / 2)
+                self._last_decrease = now
+                logging.warning(f"Rate governor {self.name}: 429 received, concurrency limit -> {self.limit:.1f}")
+            self.paused_until = max(self.paused_until, now + (retry_after or 1.0))
+        elif latency <= self.latency_target:
+            self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+        self._dispatch()
+
+    async def call(self, fn: Callable[[], Awaitable], est_tokens: int, max_attempts: int = LLM_MAX_ATTEMPTS,
+                   job_id: Optional[str] = None, priority: Optional[int] = None, usage_tokens=None):
+        """
+        Run `fn()` (one API request) under the governor. 429s and transient errors are retried
+        with backoff (honouring Retry-After) instead of being swallowed; the last error is raised.
+        `usage_tokens(response)` returns the tokens actually used, to correct the TPM estimate.
+        """
+        for attempt in range(max_attempts):
+            await self.acquire(est_tokens, job_id, priority)
+            start = time.monotonic()
+            used, rate_limited, retry_after, backoff = est_tokens, False, None, None
+            try:
+                response = await fn()
+                reported = usage_tokens(response) if usage_tokens else None
+                used = est_tokens if reported is None else reported
+            except Exception as e:
+                rate_limited = is_rate_limit_error(e)
+                retry_after = _retry_after_seconds(e)
+                if rate_limited:
+                    used = 0  # A rejected request consumed no tokens
+                if not (rate_limited or is_transient_error(e)) or attempt == max_attempts - 1:
+                    raise
+                backoff = retry_after or min(60.0, 2 ** attempt) * (0.5 + random.random())
+            finally:
+                # Also when the caller is cancelled mid-request, or in_flight would leak the slot
+                self.release(time.monotonic() - start, used, est_tokens, rate_limited, retry_after)
+            if backoff is None:
+                return response
+            logging.info(f"Rate governor {self.name}: attempt {attempt + 1} failed, retrying in {backoff:.1f}s")
+            await asyncio.sleep(backoff)
+
+
+async def gather_or_cancel(*aws) -> list:
+    """
+    asyncio.gather for a fan-out of governed requests: if one fails, the others are cancelled
+    (releasing their slots) before the error is raised, instead of running on orphaned.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def estimate_tokens(texts, max_output_tokens: int = 0) -> int:
+    """Rough pre-call token estimate (~4 characters per token) plus the completion budget."""
+    return sum(len(t or "") for t in texts) // 4 + 1 + max_output_tokens
+
+
+def total_usage_tokens(response) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+
+_governors: Dict[str, RateGovernor] = {}
+
+
+def get_governor(name: str) -> RateGovernor:
+    """Shared governor for "chat" or "embeddings" requests."""
+    if name not in _governors:
+        if name == "embeddings":
+            _governors[name] = RateGovernor(name, OPENAI_EMBED_RPM, OPENAI_EMBED_TPM)
+        else:
+            _governors[name] = RateGovernor(name, OPENAI_CHAT_RPM, OPENAI_CHAT_TPM)
+    return _governors[name]
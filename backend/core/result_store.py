@@ -0,0 +1,241 @@
+import os
+import glob
+import uuid
+import zlib
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import orjson
+
+from core.checkpoints import input_hash
+
+# Finished results as an append-only parquet dataset with a typed column per field:
+# RESULT_STORE_DIR/bucket=NN/part-*.parquet. The bucket comes from the SKU, so a lookup reads
+# one directory. Every save (batch_runner, on-demand jobs, a GPT summary added later) appends a
+# row version; readers take the newest, and compact_results() folds each bucket into one file.
+RESULT_STORE_DIR = os.getenv("RESULT_STORE_DIR", "result_store")
+# A stored result younger than this is served by /analyze instead of recomputing
+RESULT_MAX_AGE_HOURS = float(os.getenv("RESULT_MAX_AGE_HOURS", "24"))
+# Changing this re-homes every SKU: compact into a fresh directory or let the results expire
+RESULT_STORE_BUCKETS = int(os.getenv("RESULT_STORE_BUCKETS", "32"))
+# batch_runner appends results this many at a time per part file; a crash loses at most these
+# rows, and their stage checkpoints make recomputing them cheap
+RESULT_FLUSH_ROWS = int(os.getenv("RESULT_FLUSH_ROWS", "50"))
+RESULT_ROW_GROUP_ROWS = 1000
+
+SENTIMENTS = ("positive", "neutral", "negative")
+# Stats fields with a column of their own, in the order build_stats_summary produces them
+STATS_COLUMNS = ("sentiment_percentage_ci", "star_rating_distribution", "top_keywords", "sample_reviews",
+                 "keyword_matched_samples", "sentiment_confidence", "review_length_stats", "time_trends", "common_bigrams")
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _schema():
+    import pyarrow as pa  # deferred: keeps pyarrow out of API startup
+    f64, i64, text = pa.float64(), pa.int64(), pa.string()
+    texts_by_key = pa.map_(text, pa.list_(text))
+    counts_by_month = pa.map_(text, pa.map_(text, i64))
+    aspect = pa.struct([("aspect", text), ("positive", f64), ("neutral", f64), ("negative", f64), ("mentions", i64),
+                        ("trend", counts_by_month), ("sample_reviews", texts_by_key)])
+    return pa.schema(
+        [("sku", text), ("params_hash", text), ("sampling", text), ("sample_size", i64), ("embedding_provider", text),
+         ("filters", pa.map_(text, text)), ("computed_at", pa.timestamp("us", tz="UTC")),
+         ("updated_at", pa.timestamp("us", tz="UTC")), ("source", text)]
+        + [(name, text) for name in ("mc1", "mc2", "mc3", "product_name", "product_link", "fetched_summary")]
+        + [("review_count", i64)] + [(f"{s}_count", i64) for s in SENTIMENTS] + [(f"{s}_pct", f64) for s in SENTIMENTS]
+        + [("sentiment_percentage_ci", pa.map_(text, pa.struct([("low", f64), ("high", f64)]))),
+           ("star_rating_distribution", pa.map_(text, i64)),
+           ("top_keywords", texts_by_key), ("sample_reviews", texts_by_key),
+           ("keyword_matched_samples", pa.map_(text, texts_by_key)),
+           ("sentiment_confidence", pa.map_(text, pa.struct([("avg", f64), ("min", f64), ("max", f64), ("std", f64)]))),
+           ("review_length_stats", pa.map_(text, pa.struct([("avg", f64), ("min", i64), ("max", i64), ("median", f64)]))),
+           ("time_trends", counts_by_month), ("common_bigrams", texts_by_key),
+           ("aspect_summary", pa.list_(aspect)), ("gpt_summary", text),
+           # Sampling and routing reports change shape with the mode, so they stay JSON
+           ("reports", text)])
+
+
+def _bucket_dir(sku: str, root: str = None) -> str:
+    bucket = zlib.crc32(str(sku).encode("utf-8")) % RESULT_STORE_BUCKETS
+    return os.path.join(root or RESULT_STORE_DIR, f"bucket={bucket:02d}")
+
+
+def _plain(value):
+    """numpy scalars and containers -> Python values pyarrow converts against the schema."""
+    return orjson.loads(orjson.dumps(value, option=_ORJSON_OPTIONS, default=str))
+
+
+def _row(sku: str, params: Dict[str, Any], job: dict, source: str, now: datetime) -> dict:
+    result = _plain(job.get("result") or {})
+    stats = dict(result.get("stats") or {})
+    product_info = result.get("product_info") or {}
+    counts = stats.pop("sentiment_counts", None) or {}
+    percentages = stats.pop("sentiment_percentages", None) or {}
+    row = {
+        "sku": str(sku), "params_hash": input_hash(sku, params), "sampling": params.get("sampling"),
+        "sample_size": params.get("sample_size"), "embedding_provider": params.get("embedding_provider"),
+        "filters": {k: str(v) for k, v in (params.get("filters") or {}).items()},
+        "computed_at": now, "updated_at": now, "source": source,
+        **{k: product_info.get(k) for k in ("mc1", "mc2", "mc3", "product_name", "product_link")},
+        "fetched_summary": result.get("summary"),
+        "review_count": sum(counts.values()),
+        **{f"{s}_count": counts.get(s) for s in SENTIMENTS}, **{f"{s}_pct": percentages.get(s) for s in SENTIMENTS},
+        **{name: stats.pop(name, None) for name in STATS_COLUMNS},
+        "aspect_summary": _plain(job.get("aspect_summary")),
+        "gpt_summary": job.get("gpt_summary"),
+    }
+    extra = {k: v for k, v in result.items() if k not in ("summary", "sku", "product_info", "stats")}
+    row["reports"] = orjson.dumps({"stats": stats, "result": extra}, option=_ORJSON_OPTIONS, default=str).decode("utf-8")
+    return row
+
+
+def _write_part(bucket_dir: str, table):
+    """Add an arrow table, sorted by SKU so lookups skip row groups, to a bucket as a new part file."""
+    import pyarrow.parquet as pq
+    os.makedirs(bucket_dir, exist_ok=True)
+    name = f"part-{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}.parquet"
+    tmp = os.path.join(bucket_dir, f".{name}.tmp")
+    pq.write_table(table, tmp, compression="zstd", row_group_size=RESULT_ROW_GROUP_ROWS)
+    os.replace(tmp, os.path.join(bucket_dir, name))
+
+
+def append_rows(rows: List[dict], root: str = None):
+    """Append rows (column name -> value) to the store: one part file per bucket they fall in."""
+    import pyarrow as pa
+    by_bucket: Dict[str, List[dict]] = {}
+    for row in rows:
+        by_bucket.setdefault(_bucket_dir(row["sku"], root), []).append(row)
+    for bucket_dir, bucket_rows in by_bucket.items():
+        bucket_rows.sort(key=lambda r: (r["sku"], r["params_hash"]))
+        _write_part(bucket_dir, pa.Table.from_pylist(bucket_rows, schema=_schema()))
+
+
+def save_result(sku: str, params: Dict[str, Any], job: dict, source: str, root: str = None):
+    """Store a completed job's result, aspect summary, keywords and GPT summary."""
+    append_rows([_row(sku, params, job, source, datetime.now(timezone.utc))], root)
+
+
+class ResultWriter:
+    """Buffers results (batch_runner) and appends them RESULT_FLUSH_ROWS at a time. Thread-safe."""
+
+    def __init__(self, root: str = None, flush_rows: int = RESULT_FLUSH_ROWS):
+        self.root = root
+        self.flush_rows = max(1, flush_rows)
+        self._rows: List[dict] = []
+        self._lock = threading.Lock()
+
+    def add(self, sku: str, params: Dict[str, Any], job: dict, source: str):
+        with self._lock:
+            self._rows.append(_row(sku, params, job, source, datetime.now(timezone.utc)))
+            if len(self._rows) >= self.flush_rows:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        rows, self._rows = self._rows, []
+        if rows:
+            append_rows(rows, self.root)
+
+
+def _latest_row(sku: str, params: Dict[str, Any], root: str = None) -> Optional[dict]:
+    """Newest stored version for this SKU and parameter set, as raw column values."""
+    import pyarrow.parquet as pq
+    bucket_dir = _bucket_dir(sku, root)
+    filters = [("sku", "=", str(sku)), ("params_hash", "=", input_hash(sku, params))]
+    for attempt in range(2):
+        rows = []
+        try:
+            for path in sorted(glob.glob(os.path.join(bucket_dir, "part-*.parquet"))):
+                rows += pq.read_table(path, filters=filters, schema=_schema()).to_pylist(maps_as_pydicts="strict")
+        except FileNotFoundError:
+            continue  # compact_results replaced the parts while we read them; list them again
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable stored results in {bucket_dir}: {e}")
+            return None
+        return max(rows, key=lambda r: r["updated_at"]) if rows else None
+    return None
+
+
+def _drop_missing(value: Optional[dict]) -> Optional[dict]:
+    return None if value is None else {k: v for k, v in value.items() if v is not None}
+
+
+def _result(row: dict) -> dict:
+    """The job result payload (as build_result made it) from a stored row."""
+    reports = orjson.loads(row["reports"]) if row.get("reports") else {}
+    stats = {"sentiment_counts": {s: row[f"{s}_count"] for s in SENTIMENTS if row[f"{s}_count"] is not None},
+             "sentiment_percentages": {s: row[f"{s}_pct"] for s in SENTIMENTS if row[f"{s}_pct"] is not None}}
+    stats.update({name: row[name] for name in STATS_COLUMNS if row[name] is not None})
+    stats.update(reports.get("stats") or {})
+    product_info = {k: row[k] for k in ("mc1", "mc2", "mc3", "product_name", "product_link")}
+    return {"summary": row["fetched_summary"], "sku": row["sku"], "product_info": product_info, "stats": stats,
+            **(reports.get("result") or {})}
+
+
+def load_result(sku: str, params: Dict[str, Any], max_age_hours: float = None, root: str = None) -> Optional[dict]:
+    """The stored result for this SKU and parameter set, or None if there is none or it is stale."""
+    max_age_hours = RESULT_MAX_AGE_HOURS if max_age_hours is None else max_age_hours
+    row = _latest_row(sku, params, root)
+    if row is None:
+        return None
+    computed_at = row["computed_at"]
+    age_hours = (datetime.now(timezone.utc) - computed_at).total_seconds() / 3600
+    if age_hours > max_age_hours:
+        return None
+    stored = {k: row[k] for k in ("sku", "params_hash", "source", "review_count", "mc1", "mc2", "product_name", "gpt_summary")}
+    stored["result"] = _result(row)
+    aspects = row["aspect_summary"]
+    stored["aspect_summary"] = None if aspects is None else [_drop_missing(a) for a in aspects]
+    stored["computed_at"] = computed_at.isoformat()
+    stored["age_hours"] = round(age_hours, 3)
+    return stored
+
+
+def save_summary(sku: str, params: Dict[str, Any], gpt_summary: str, computed_at: str = None, root: str = None) -> bool:
+    """
+    Add a GPT summary to the stored result, keeping its computed_at (the analysis did not
+    change). With `computed_at`, only that computation is updated. False if there is no such row.
+    """
+    row = _latest_row(sku, params, root)
+    if row is None or (computed_at and row["computed_at"].isoformat() != computed_at):
+        return False
+    row["gpt_summary"] = gpt_summary
+    row["updated_at"] = datetime.now(timezone.utc)
+    append_rows([row], root)
+    return True
+
+
+def compact_results(root: str = None) -> int:
+    """
+    Rewrite each bucket's part files as one file holding only the newest version of every
+    result. Safe next to writers: new parts are left alone and readers take the newest row.
+    Returns the number of results kept.
+    """
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    kept = 0
+    for bucket_dir in sorted(glob.glob(os.path.join(root or RESULT_STORE_DIR, "bucket=*"))):
+        parts = sorted(glob.glob(os.path.join(bucket_dir, "part-*.parquet")))
+        if len(parts) < 2:
+            kept += sum(pq.ParquetFile(p).metadata.num_rows for p in parts)
+            continue
+        table = pa.concat_tables([pq.read_table(p, schema=_schema()) for p in parts])
+        table = table.sort_by([("sku", "ascending"), ("params_hash", "ascending"), ("updated_at", "descending")])
+        keys = [f"{s}\x00{h}" for s, h in zip(table.column("sku").to_pylist(), table.column("params_hash").to_pylist())]
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = np.array(keys[1:], dtype=object) != np.array(keys[:-1], dtype=object)
+        table = table.filter(pa.array(first))
+        _write_part(bucket_dir, table)
+        for path in parts:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        kept += table.num_rows
+    return kept
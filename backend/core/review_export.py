@@ -0,0 +1,222 @@
+import os
+from datetime import date, datetime, time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import orjson
+
+from core.checkpoints import input_hash
+from core.review_table import SENTIMENTS, MISSING
+
+# Per-review output of each job (clean text, sentiment, probabilities, aspects), one parquet
+# file per SKU and parameter set: EXPORT_DIR/{sku}/{params_hash}.parquet. Written by the
+# pipeline's export stage in row groups, streamed by GET /jobs/{job_id}/export.
+EXPORT_DIR = os.getenv("EXPORT_DIR", "review_exports")
+# Rows per parquet row group and per streamed chunk; memory use scales with this, not the job
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+
+_TEXT_COLUMNS = ("sku", "customer_review", "clean", "lang")
+# Filters and the column each one reads
+FILTER_COLUMNS = {"sentiment": "sentiment", "source": "source", "min_rating": "product_rating", "max_rating": "product_rating",
+                  "since": "created_date", "until": "created_date", "aspect": "aspects"}
+
+
+def export_path(sku: str, params: Dict[str, Any], root: str = None) -> str:
+    return os.path.join(root or EXPORT_DIR, str(sku), f"{input_hash(sku, params)}.parquet")
+
+
+def _probability_column(cls: str) -> str:
+    return f"prob_{SENTIMENTS[int(cls)]}" if cls.isdigit() and int(cls) < len(SENTIMENTS) else f"prob_{cls}"
+
+
+def _schema(probability_classes: Sequence[str]):
+    import pyarrow as pa
+    aspect = pa.struct([("aspect", pa.string()), ("sentiment", pa.string())])
+    return pa.schema([("review_index", pa.int32()), ("source", pa.string())] + [(c, pa.string()) for c in _TEXT_COLUMNS]
+                     + [("product_rating", pa.int8()), ("created_date", pa.timestamp("us")), ("sentiment", pa.string())]
+                     + [(_probability_column(c), pa.float32()) for c in probability_classes]
+                     + [("near_duplicate_of", pa.int32()), ("duplicate_count", pa.int32()), ("sample_weight", pa.float64()),
+                        ("aspects", pa.list_(aspect))])
+
+
+def _timestamp(value) -> Optional[datetime]:
+    """created_date as a datetime; None for missing (None, NaN, NaT) or unparseable values."""
+    import pandas as pd  # deferred: keeps pandas out of API startup
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value) if value else None
+        except ValueError:
+            return None
+    if value is None or value is pd.NaT or (not isinstance(value, date) and pd.isna(value)):
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, time())
+    return None
+
+
+def _aspects(result) -> list:
+    if not isinstance(result, dict):
+        return []
+    return [{"aspect": str(a.get("aspect", "")).lower(), "sentiment": str(a.get("sentiment", "")).lower()}
+            for a in result.get("aspects", []) if isinstance(a, dict)]
+
+
+def _chunk(table, start: int, stop: int, offset: int, schema, aspect_results) -> "pa.Table":
+    """Rows [start, stop) of a ReviewTable as an arrow table, read straight from its column arrays."""
+    import pyarrow as pa
+    n = stop - start
+    column = lambda name: table.columns[name][start:stop] if name in table.columns else np.full(n, None, dtype=object)
+    rating = table.product_rating[start:stop]
+    codes = table.sentiment[start:stop]
+    categories = np.array(table.sentiment_categories + [None], dtype=object)
+    weights = [None if w is None or w != w else float(w) for w in column("sample_weight")]
+    data = {
+        "review_index": np.arange(offset + start, offset + stop, dtype=np.int32),
+        "source": column("sentiment_source"),
+        **{name: [None if v is None or v != v else str(v) for v in column(name)] for name in _TEXT_COLUMNS},
+        "product_rating": pa.array(rating, mask=rating == MISSING),
+        "created_date": [_timestamp(v) for v in column("created_date")],
+        "sentiment": categories[codes],
+    }
+    for k, cls in enumerate(table.probability_classes):
+        probs = table.probabilities[start:stop, k]
+        data[_probability_column(cls)] = pa.array(probs, mask=np.isnan(probs))
+    if table.rep_of is not None:
+        rep = table.rep_of[start:stop]
+        own = rep == np.arange(start, stop)
+        data["near_duplicate_of"] = pa.array(rep, mask=own)
+        data["duplicate_count"] = pa.array(table._duplicate_count[start:stop], mask=~own)
+    data["sample_weight"] = weights
+    data["aspects"] = [_aspects(r) for r in aspect_results[start:stop]] if aspect_results is not None else [[] for _ in range(n)]
+    return pa.Table.from_pydict({f.name: data.get(f.name, [None] * n) for f in schema}, schema=schema)
+
+
+def write_review_export(path: str, classified_reviews, rating_only_scored, aspect_results: List[dict],
+                        chunk_rows: int = EXPORT_CHUNK_ROWS) -> int:
+    """Write text reviews (with their aspect results) then rating-only reviews, one row group per chunk. Returns rows written."""
+    import pyarrow.parquet as pq
+    schema = _schema(classified_reviews.probability_classes)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    rows = 0
+    with pq.ParquetWriter(tmp, schema, compression="zstd") as writer:
+        for table, results in ((classified_reviews, aspect_results), (rating_only_scored, None)):
+            for start in range(0, len(table), chunk_rows):
+                chunk = _chunk(table, start, min(start + chunk_rows, len(table)), rows, schema, results)
+                writer.write_table(chunk, row_group_size=chunk_rows)
+            rows += len(table)
+    os.replace(tmp, path)
+    return rows
+
+
+def export_columns(path: str) -> List[str]:
+    import pyarrow.parquet as pq
+    return pq.read_schema(path).names
+
+
+def read_export_rows(path: str, review_indexes: Sequence[int], columns: List[str]) -> Dict[int, dict]:
+    """The given rows of an export by review_index; only row groups that can contain them are read."""
+    import pyarrow.parquet as pq
+    if not review_indexes:
+        return {}
+    table = pq.read_table(path, columns=["review_index"] + columns, filters=[("review_index", "in", list(review_indexes))])
+    return {row.pop("review_index"): row for row in table.to_pylist()}
+
+
+def _filter_mask(batch, filters: Dict[str, Any]):
+    """Boolean numpy mask of the rows of a record batch that pass every filter."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    mask = np.ones(batch.num_rows, dtype=bool)
+    keep = lambda condition: np.asarray(pc.fill_null(condition, False).to_numpy(zero_copy_only=False), dtype=bool)
+    if filters.get("sentiment"):
+        mask &= keep(pc.is_in(batch.column("sentiment"), value_set=pa.array(filters["sentiment"])))
+    if filters.get("source"):
+        mask &= keep(pc.is_in(batch.column("source"), value_set=pa.array(filters["source"])))
+    if filters.get("min_rating") is not None:
+        mask &= keep(pc.greater_equal(batch.column("product_rating"), pa.scalar(filters["min_rating"], pa.int8())))
+    if filters.get("max_rating") is not None:
+        mask &= keep(pc.less_equal(batch.column("product_rating"), pa.scalar(filters["max_rating"], pa.int8())))
+    if filters.get("since") is not None:
+        mask &= keep(pc.greater_equal(batch.column("created_date"), pa.scalar(filters["since"], pa.timestamp("us"))))
+    if filters.get("until") is not None:
+        mask &= keep(pc.less(batch.column("created_date"), pa.scalar(filters["until"], pa.timestamp("us"))))
+    if filters.get("aspect"):
+        aspects = batch.column("aspects")
+        hits = pc.is_in(pc.struct_field(pc.list_flatten(aspects), [0]), value_set=pa.array([a.lower() for a in filters["aspect"]]))
+        mentioned = np.zeros(batch.num_rows, dtype=bool)
+        mentioned[pc.list_parent_indices(aspects).to_numpy()[keep(hits)]] = True
+        mask &= mentioned
+    return mask
+
+
+def _batches(path: str, columns: Optional[List[str]], filters: Dict[str, Any], chunk_rows: int):
+    """Filtered record batches with the requested columns, EXPORT_CHUNK_ROWS at a time."""
+    import pyarrow.parquet as pq
+    filters = {k: v for k, v in (filters or {}).items() if v is not None and v != []}
+    names = pq.read_schema(path).names
+    columns = columns or names
+    read = columns + [c for c in dict.fromkeys(FILTER_COLUMNS[f] for f in filters) if c not in columns]
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=read):
+        if filters:
+            batch = batch.filter(_filter_mask(batch, filters))
+        if batch.num_rows:
+            yield batch.select(columns)
+
+
+def iter_ndjson(path: str, columns: List[str] = None, filters: Dict[str, Any] = None, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """One JSON object per line, yielded one chunk of rows at a time."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    for batch in _batches(path, columns, filters, chunk_rows):
+        # float32 probabilities would print as 0.800000011920929
+        arrays = [pc.round(a.cast(pa.float64()), 6) if a.type == pa.float32() else a for a in batch.columns]
+        batch = pa.RecordBatch.from_arrays(arrays, names=batch.schema.names)
+        yield b"".join(orjson.dumps(row) + b"\n" for row in batch.to_pylist())
+
+
+class _StreamSink:
+    """Write-only file object that hands written bytes to the caller instead of keeping them."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position  # parquet footers record absolute offsets
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def iter_parquet(path: str, columns: List[str] = None, filters: Dict[str, Any] = None, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """A parquet file, one row group per chunk; bytes are yielded as each row group is written."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pq.read_schema(path)
+    schema = pa.schema([schema.field(c) for c in (columns or schema.names)])
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for batch in _batches(path, columns, filters, chunk_rows):
+            writer.write_batch(batch)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
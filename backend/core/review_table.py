@@ -0,0 +1,208 @@
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+# Sentiment labels are stored as int8 codes into a per-table category list that starts with these
+SENTIMENTS = ("negative", "neutral", "positive")
+MISSING = -1
+
+# Columns with a typed representation; every other column is kept as an object array
+_TYPED = ("product_rating", "sentiment", "sentiment_probabilities", "embedding", "duplicate_count", "near_duplicate_of")
+
+
+class ReviewTable:
+    """
+    Columnar storage for one job's reviews. Text and metadata columns are object arrays,
+    `product_rating` is int8 and `sentiment` an int8 code, classifier probabilities form one
+    float32 (n, classes) matrix and embeddings one contiguous float32 (m, dim) matrix that
+    rows reference by index, so near-duplicates share their representative's vector.
+
+    Deriving a table (with_columns / with_classification) shares the unchanged arrays.
+    Indexing or iterating yields ReviewView dict-views for code written against review dicts.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], n: int, product_rating: Optional[np.ndarray] = None,
+                 sentiment: Optional[np.ndarray] = None, sentiment_categories: Sequence[str] = SENTIMENTS,
+                 probabilities: Optional[np.ndarray] = None, probability_classes: Sequence[str] = (),
+                 embeddings: Optional[np.ndarray] = None, embedding_row: Optional[np.ndarray] = None,
+                 rep_of: Optional[np.ndarray] = None):
+        self.n = n
+        self.columns = columns
+        self.product_rating = product_rating if product_rating is not None else np.full(n, MISSING, dtype=np.int8)
+        self.sentiment = sentiment if sentiment is not None else np.full(n, MISSING, dtype=np.int8)
+        self.sentiment_categories = list(sentiment_categories)
+        self.probabilities = probabilities
+        self.probability_classes = list(probability_classes)
+        self.embeddings = embeddings
+        self.embedding_row = embedding_row if embedding_row is not None else np.full(n, MISSING, dtype=np.int32)
+        self.rep_of = rep_of
+        self._duplicate_count = np.bincount(rep_of, minlength=n).astype(np.int32) if rep_of is not None else None
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, Iterable], n: int = None) -> "ReviewTable":
+        """Build from column name -> values (e.g. DataFrame columns). product_rating and sentiment are encoded."""
+        columns = {k: _object_array(v) for k, v in columns.items()}
+        n = n if n is not None else (len(next(iter(columns.values()))) if columns else 0)
+        rating = columns.pop("product_rating", None)
+        sentiment = columns.pop("sentiment", None)
+        table = cls(columns, n, product_rating=encode_ratings(rating) if rating is not None else None)
+        if sentiment is not None:
+            table.sentiment, table.sentiment_categories = encode_sentiments(sentiment)
+        return table
+
+    @classmethod
+    def from_records(cls, records: Sequence[dict]) -> "ReviewTable":
+        keys = list(dict.fromkeys(k for r in records for k in r if k not in _TYPED[2:]))
+        return cls.from_columns({k: [r.get(k) for r in records] for k in keys}, n=len(records))
+
+    def _derive(self, **changes) -> "ReviewTable":
+        fields = dict(columns=self.columns, n=self.n, product_rating=self.product_rating, sentiment=self.sentiment,
+                      sentiment_categories=self.sentiment_categories, probabilities=self.probabilities,
+                      probability_classes=self.probability_classes, embeddings=self.embeddings,
+                      embedding_row=self.embedding_row, rep_of=self.rep_of)
+        fields.update(changes)
+        return ReviewTable(**fields)
+
+    def with_columns(self, **columns) -> "ReviewTable":
+        """New table with added/replaced object columns (scalars are broadcast); other arrays are shared."""
+        added = {k: np.full(self.n, v, dtype=object) if v is None or isinstance(v, (str, int, float)) else _object_array(v)
+                 for k, v in columns.items()}
+        return self._derive(columns={**self.columns, **added})
+
+    def with_sentiments(self, labels: Iterable) -> "ReviewTable":
+        codes, categories = encode_sentiments(labels)
+        return self._derive(sentiment=codes, sentiment_categories=categories)
+
+    def with_classification(self, embeddings: np.ndarray, embedding_row: np.ndarray, labels: Iterable,
+                            probabilities: np.ndarray, probability_classes: Sequence[str], rep_of: Sequence[int]) -> "ReviewTable":
+        """
+        Attach classifier output. `embeddings` holds one row per embedded review and
+        `embedding_row[i]` points into it (MISSING for none); `probabilities` is (n, classes)
+        with NaN rows for unclassified reviews.
+        """
+        codes, categories = encode_sentiments(labels)
+        return self._derive(embeddings=np.ascontiguousarray(embeddings, dtype=np.float32),
+                            embedding_row=np.asarray(embedding_row, dtype=np.int32), sentiment=codes,
+                            sentiment_categories=categories, probabilities=np.asarray(probabilities, dtype=np.float32),
+                            probability_classes=[str(c) for c in probability_classes],
+                            rep_of=np.asarray(rep_of, dtype=np.int32))
+
+    def __len__(self) -> int:
+        return self.n
+
+    def __getitem__(self, i: int) -> "ReviewView":
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError(i)
+        return ReviewView(self, i)
+
+    def __iter__(self) -> Iterator["ReviewView"]:
+        return (ReviewView(self, i) for i in range(self.n))
+
+    def column(self, name: str) -> np.ndarray:
+        """Object column by name, or the decoded sentiment/rating column."""
+        if name == "sentiment":
+            categories = np.array(self.sentiment_categories + [None], dtype=object)
+            return categories[self.sentiment]  # MISSING (-1) picks the trailing None
+        if name == "product_rating":
+            return np.array([None if r == MISSING else int(r) for r in self.product_rating], dtype=object)
+        return self.columns[name]
+
+    def embedding_matrix(self, rows: Sequence[int]) -> np.ndarray:
+        """float32 embeddings for `rows`, which must all have one."""
+        return self.embeddings[self.embedding_row[np.asarray(rows, dtype=np.int64)]]
+
+    def records(self) -> List[dict]:
+        """Plain dicts (e.g. for JSON dumps); embeddings are left out."""
+        return [{k: v for k, v in view.items() if k != "embedding"} for view in self]
+
+    def nbytes(self) -> int:
+        arrays = [self.product_rating, self.sentiment, self.embedding_row, self.probabilities, self.embeddings, self.rep_of]
+        return int(sum(a.nbytes for a in arrays if a is not None))
+
+
+class ReviewView(Mapping):
+    """Read-only dict view of one table row with the keys of the legacy review dicts."""
+    __slots__ = ("table", "i")
+
+    def __init__(self, table: ReviewTable, i: int):
+        self.table = table
+        self.i = i
+
+    def _keys(self) -> List[str]:
+        t = self.table
+        keys = list(t.columns) + ["product_rating", "sentiment", "sentiment_probabilities", "embedding"]
+        if t.rep_of is not None:
+            keys.append("duplicate_count" if t.rep_of[self.i] == self.i else "near_duplicate_of")
+        return keys
+
+    def __getitem__(self, key):
+        t, i = self.table, self.i
+        if key in t.columns:
+            return t.columns[key][i]
+        if key == "product_rating":
+            rating = t.product_rating[i]
+            return None if rating == MISSING else int(rating)
+        if key == "sentiment":
+            code = t.sentiment[i]
+            return None if code == MISSING else t.sentiment_categories[code]
+        if key == "sentiment_probabilities":
+            if t.probabilities is None or np.isnan(t.probabilities[i, 0]):
+                return None
+            return {cls: float(p) for cls, p in zip(t.probability_classes, t.probabilities[i])}
+        if key == "embedding":
+            row = t.embedding_row[i]
+            return None if row == MISSING else t.embeddings[row]
+        if t.rep_of is not None:
+            if key == "duplicate_count" and t.rep_of[i] == i:
+                return int(t._duplicate_count[i])
+            if key == "near_duplicate_of" and t.rep_of[i] != i:
+                return int(t.rep_of[i])
+        raise KeyError(key)
+
+    def __contains__(self, key) -> bool:
+        return key in self._keys()
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self) -> int:
+        return len(self._keys())
+
+    def __repr__(self) -> str:
+        return f"ReviewView({self.i}, clean={self.get('clean')!r}, sentiment={self.get('sentiment')!r})"
+
+
+def _object_array(values) -> np.ndarray:
+    array = np.empty(len(values), dtype=object)
+    array[:] = list(values)
+    return array
+
+
+def encode_ratings(ratings: Iterable) -> np.ndarray:
+    """Star ratings as int8, MISSING for None/NaN/unparseable."""
+    codes = []
+    for r in ratings:
+        try:
+            codes.append(int(r))
+        except (TypeError, ValueError):
+            codes.append(MISSING)
+    return np.array(codes, dtype=np.int8)
+
+
+def encode_sentiments(labels: Iterable):
+    """(int8 codes, categories): SENTIMENTS first, then any other label in order of appearance."""
+    categories = list(SENTIMENTS)
+    index = {c: i for i, c in enumerate(categories)}
+    codes = []
+    for label in labels:
+        if label is None:
+            codes.append(MISSING)
+            continue
+        if label not in index:
+            index[label] = len(categories)
+            categories.append(label)
+        codes.append(index[label])
+    return np.array(codes, dtype=np.int8), categories
@@ -0,0 +1,118 @@
+import os
+import zlib
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import regex as re
+
+# Route each review to the LLM aspect stage, a cheap default, or a reduced sample
+ROUTING_ENABLED = os.getenv("ROUTING_ENABLED", "true").lower() == "true"
+# Below this classifier confidence a review is ambiguous and always goes to the LLM
+ROUTE_CONFIDENCE_THRESHOLD = float(os.getenv("ROUTE_CONFIDENCE_THRESHOLD", "0.85"))
+# Confident reviews this short with no aspect cue ("Love it") get the default: no aspects
+ROUTE_SHORT_TOKENS = int(os.getenv("ROUTE_SHORT_TOKENS", "6"))
+# Reviews this long, or with this many aspect cues, always go to the LLM
+ROUTE_LONG_TOKENS = int(os.getenv("ROUTE_LONG_TOKENS", "40"))
+ROUTE_MIN_CUES_LLM = int(os.getenv("ROUTE_MIN_CUES_LLM", "2"))
+# Fraction of the remaining (confident, medium, few-cue) reviews sent to the LLM; each sampled
+# review then stands for 1/rate reviews in the aspect aggregates
+ROUTE_SAMPLE_RATE = float(os.getenv("ROUTE_SAMPLE_RATE", "0.35"))
+
+ROUTE_LLM = "llm"
+ROUTE_DEFAULT = "default"
+ROUTE_SAMPLED = "sample"
+ROUTE_SAMPLE_SKIPPED = "sample_skipped"
+
+# Words that signal a concrete product aspect or a contrast between aspects
+ASPECT_CUES = {
+    "size", "sizing", "fit", "fits", "small", "large", "big", "tiny", "tight", "loose", "weight", "heavy", "light",
+    "material", "fabric", "plastic", "rubber", "metal", "stitching", "seam", "seams", "zipper", "strap", "clip", "buckle",
+    "durable", "durability", "sturdy", "flimsy", "broke", "broken", "ripped", "tore", "torn", "chewed", "destroyed", "lasted",
+    "smell", "smells", "odor", "taste", "flavor", "texture", "ingredients", "kibble", "treat", "treats", "calories",
+    "price", "expensive", "cheap", "value", "cost", "worth",
+    "shipping", "delivery", "arrived", "package", "packaging", "box", "damaged", "leaking", "leaked",
+    "color", "design", "shape", "easy", "hard", "difficult", "assemble", "assembly", "clean", "cleaning", "wash", "washable",
+    "noise", "loud", "quiet", "battery", "instructions", "quality", "comfortable", "soft", "stiff", "itchy",
+    "vomit", "vomited", "diarrhea", "allergies", "allergic", "sick", "stomach", "digestion", "coat", "teeth",
+    "but", "however", "although", "though", "except", "unfortunately",
+}
+_TOKEN_RE = re.compile(r"\p{L}+(?:'\p{L}+)?")
+
+
+def review_signals(review: dict) -> Tuple[int, int, Optional[float]]:
+    """(token count, aspect cue count, classifier confidence or None) for one cleaned review."""
+    tokens = _TOKEN_RE.findall((review.get("clean") or "").lower())
+    cues = sum(1 for t in tokens if t in ASPECT_CUES)
+    probabilities = review.get("sentiment_probabilities")
+    if isinstance(probabilities, dict):
+        probabilities = list(probabilities.values())
+    confidence = max(probabilities) if probabilities else None
+    return len(tokens), cues, confidence
+
+
+def _in_sample(key: str, rate: float) -> bool:
+    # Deterministic per review text, so resumed or repeated runs route identically
+    return (zlib.crc32(key.encode("utf-8")) % 10000) < rate * 10000
+
+
+def route_review(review: dict, sample_rate: float = None) -> str:
+    sample_rate = ROUTE_SAMPLE_RATE if sample_rate is None else sample_rate
+    n_tokens, cues, confidence = review_signals(review)
+    if confidence is None or confidence < ROUTE_CONFIDENCE_THRESHOLD:
+        return ROUTE_LLM
+    if n_tokens >= ROUTE_LONG_TOKENS or cues >= ROUTE_MIN_CUES_LLM:
+        return ROUTE_LLM
+    if n_tokens <= ROUTE_SHORT_TOKENS and cues == 0:
+        return ROUTE_DEFAULT
+    return ROUTE_SAMPLED if _in_sample(review.get("clean") or "", sample_rate) else ROUTE_SAMPLE_SKIPPED
+
+
+def route_reviews(reviews: List[dict], rep_of: List[int], enabled: bool = None) -> Tuple[List[Optional[str]], Dict]:
+    """
+    Route every near-duplicate representative (duplicates follow their representative and get
+    None). Returns (routes, report) where the report counts routes and the LLM calls saved.
+    """
+    enabled = ROUTING_ENABLED if enabled is None else enabled
+    routes: List[Optional[str]] = []
+    for i, review in enumerate(reviews):
+        if rep_of[i] != i:
+            routes.append(None)
+        elif not enabled or not (review.get("clean") or "").strip():
+            routes.append(ROUTE_LLM)
+        else:
+            routes.append(route_review(review))
+    counts = Counter(r for r in routes if r is not None)
+    total = sum(counts.values())
+    to_llm = counts[ROUTE_LLM] + counts[ROUTE_SAMPLED]
+    report = {
+        "enabled": enabled,
+        "representatives": total,
+        "routes": dict(counts),
+        "llm_reviews": to_llm,
+        "skipped_reviews": total - to_llm,
+        "skipped_fraction": round((total - to_llm) / total, 4) if total else 0.0,
+        "sample_rate": ROUTE_SAMPLE_RATE,
+        "thresholds": {
+            "confidence": ROUTE_CONFIDENCE_THRESHOLD,
+            "short_tokens": ROUTE_SHORT_TOKENS,
+            "long_tokens": ROUTE_LONG_TOKENS,
+            "min_cues_llm": ROUTE_MIN_CUES_LLM,
+        },
+    }
+    logging.info(f"Aspect routing: {report['routes']} -> {to_llm}/{total} reviews sent to the LLM")
+    return routes, report
+
+
+def routed_result(route: str, llm_result: Optional[dict] = None, sample_rate: float = None) -> dict:
+    """
+    Aspect result for a routed review. `weight` scales the review in aspect aggregates:
+    sampled reviews stand for 1/rate reviews, skipped sample-pool reviews are covered by them.
+    """
+    sample_rate = ROUTE_SAMPLE_RATE if sample_rate is None else sample_rate
+    if route == ROUTE_LLM:
+        return {**(llm_result or {}), "route": route}
+    if route == ROUTE_SAMPLED:
+        return {**(llm_result or {}), "route": route, "weight": 1.0 / sample_rate if sample_rate > 0 else 0.0}
+    if route == ROUTE_SAMPLE_SKIPPED:
+        return {"aspects": [], "route": route, "weight": 0.0}
+    return {"aspects": [], "route": route}
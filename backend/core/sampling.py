@@ -0,0 +1,132 @@
+import os
+import heapq
+import random
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+# "head" keeps the first N rows Snowflake returns; "stratified" draws a rating x month stratified sample
+SAMPLING_MODE = os.getenv("SAMPLING_MODE", "head").lower()
+SAMPLE_TARGET_SIZE = int(os.getenv("SAMPLE_TARGET_SIZE", "15000"))
+
+
+def review_stratum(review: Dict) -> Tuple[str, str]:
+    """Stratum key for a review: (star rating, created month)."""
+    rating = review.get("product_rating")
+    rating_key = str(rating) if rating is not None else "none"
+    date = review.get("created_date")
+    month = "unknown"
+    if date:
+        try:
+            dt = datetime.fromisoformat(date) if isinstance(date, str) else date
+            month = dt.strftime('%Y-%m')
+        except Exception:
+            pass
+    return rating_key, month
+
+
+def allocate_proportional(stratum_sizes: Dict[Tuple, int], target_size: int) -> Dict[Tuple, int]:
+    """
+    Split target_size across strata proportionally to their population (largest remainder),
+    giving every non-empty stratum at least one row when the target allows it.
+    """
+    population = sum(stratum_sizes.values())
+    if population <= target_size:
+        return dict(stratum_sizes)
+    quotas = {h: target_size * n / population for h, n in stratum_sizes.items()}
+    alloc = {h: min(stratum_sizes[h], int(q)) for h, q in quotas.items()}
+    if target_size >= len(stratum_sizes):
+        for h in alloc:
+            if alloc[h] == 0:
+                alloc[h] = 1
+    remaining = target_size - sum(alloc.values())
+    by_remainder = sorted(quotas, key=lambda h: quotas[h] - int(quotas[h]), reverse=True)
+    for h in by_remainder:
+        if remaining <= 0:
+            break
+        if alloc[h] < stratum_sizes[h]:
+            alloc[h] += 1
+            remaining -= 1
+    # Minimum-one guarantees can overshoot the target; trim from the largest allocations
+    while remaining < 0:
+        h = max(alloc, key=lambda k: alloc[k])
+        alloc[h] -= 1
+        remaining += 1
+    return alloc
+
+
+def stratum_sizes_from_counts(rows: Iterable[Tuple]) -> Dict[Tuple, int]:
+    """(product_rating, created month, count) rows (core.fetch_reviews.fetch_review_strata) -> stratum sizes."""
+    sizes: Dict[Tuple, int] = defaultdict(int)
+    for rating, month, count in rows:
+        sizes[review_stratum({"product_rating": rating, "created_date": month})] += int(count)
+    return dict(sizes)
+
+
+def stratified_reservoir_sample(reviews: Iterable[Dict], target_size: int, seed=None,
+                                stratum_sizes: Dict[Tuple, int] = None) -> Tuple[List[Dict], Dict]:
+    """
+    Single pass over a review stream drawing a proportional stratified sample by rating and month.
+    The target is allocated across strata up front from `stratum_sizes` (counted in the fetch
+    query); each row gets a uniform random key and per stratum only the alloc[h] rows with the
+    smallest keys are kept, so at most target_size rows are held while streaming. Without
+    `stratum_sizes` the stream is counted in a first pass, which holds all of it.
+    Every sampled review carries sample_weight = N_h / n_h. Returns (sampled_reviews, sampling_report).
+    """
+    if stratum_sizes is None:
+        reviews = list(reviews)
+        stratum_sizes = defaultdict(int)
+        for review in reviews:
+            stratum_sizes[review_stratum(review)] += 1
+    caps = allocate_proportional(stratum_sizes, target_size)
+    rng = random.Random(seed)
+    heaps: Dict[Tuple, list] = defaultdict(list)
+    seen: Dict[Tuple, int] = defaultdict(int)
+    seq = 0
+    for review in reviews:
+        h = review_stratum(review)
+        seen[h] += 1
+        key = rng.random()
+        heap = heaps[h]
+        # Max-heap on key (stored negated) so the largest key is evicted first. A stratum the
+        # counts missed (rows added between the two queries) keeps one row
+        if len(heap) < caps.get(h, 1):
+            heapq.heappush(heap, (-key, seq, review))
+        elif heap and -heap[0][0] > key:
+            heapq.heapreplace(heap, (-key, seq, review))
+        seq += 1
+
+    # Weights use the strata as streamed; the reservoirs hold at most their up-front allocation
+    alloc = allocate_proportional(seen, target_size)
+    sample = []
+    for h, n_h in alloc.items():
+        n_h = min(n_h, len(heaps[h]))
+        if n_h <= 0:
+            continue
+        chosen = heapq.nlargest(n_h, heaps[h])  # largest negated key == smallest key
+        weight = seen[h] / n_h
+        for _, order, review in chosen:
+            sample.append((order, {**review, "sample_weight": weight}))
+    # Keep stream order so downstream steps see reviews in the order Snowflake returned them
+    sample.sort(key=lambda x: x[0])
+    sampled = [review for _, review in sample]
+    report = {
+        "mode": "stratified",
+        "population": seq,
+        "sample_size": len(sampled),
+        "target_size": target_size,
+        "strata": len(seen),
+    }
+    logging.info(f"Stratified sample: {len(sampled)} of {seq} reviews across {len(seen)} rating x month strata.")
+    return sampled, report
+
+
+def head_sample(reviews: Iterable[Dict], target_size: int) -> Tuple[List[Dict], Dict]:
+    """Legacy behaviour: keep the first target_size rows of the stream."""
+    sampled = []
+    for review in reviews:
+        sampled.append(review)
+        if len(sampled) >= target_size:
+            break
+    return sampled, {"mode": "head", "sample_size": len(sampled), "target_size": target_size}
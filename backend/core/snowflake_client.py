@@ -1,13 +1,15 @@
-import snowflake.connector
 from typing import Dict, List, Any
 import os
 from dotenv import load_dotenv
 import logging
 
-def connect_to_snowflake() -> snowflake.connector.SnowflakeConnection:
+# snowflake.connector is imported inside the functions below so importing the API does not load it
+
+def connect_to_snowflake() -> "snowflake.connector.SnowflakeConnection":
     """
     Establishes a connection to Snowflake using SSO authentication.
     """
+    import snowflake.connector
     # Load environment variables from .env file
     load_dotenv()
     
@@ -39,10 +41,11 @@ def connect_to_snowflake() -> snowflake.connector.SnowflakeConnection:
         logging.error('Error connecting to Snowflake: %s', str(e), exc_info=True)
         raise
 
-def execute_query(conn: snowflake.connector.SnowflakeConnection, query: str) -> List[Dict[str, Any]]:
+def execute_query(conn: "snowflake.connector.SnowflakeConnection", query: str) -> List[Dict[str, Any]]:
     """
     Executes a SQL query and returns the results as a list of dictionaries.
     """
+    import snowflake.connector
     logging.info('Executing query: %s', query)
     try:
         cursor = conn.cursor(snowflake.connector.DictCursor)
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from core.metrics import time_stage, publish_progress
+
+
+@dataclass
+class Stage:
+    """
+    One pipeline stage. `fn(job, **inputs)` is awaited with the state values named in
+    `inputs` and must return a dict with exactly the keys named in `outputs`.
+    `step` is the frontend stepper index shown while the stage runs.
+    """
+    name: str
+    fn: Callable[..., Awaitable[Dict[str, Any]]]
+    inputs: Tuple[str, ...]
+    outputs: Tuple[str, ...]
+    step: Optional[float] = None
+
+
+class StageGraph:
+    """
+    Declarative DAG of stages. A stage starts as soon as all of its inputs exist, so
+    independent branches run concurrently and end-to-end latency follows the critical path.
+    """
+
+    def __init__(self, stages: Iterable[Stage], initial_inputs: Iterable[str] = ()):
+        self.stages: List[Stage] = list(stages)
+        self.initial_inputs = tuple(initial_inputs)
+        self._validate()
+
+    def _validate(self):
+        producers = {key: None for key in self.initial_inputs}
+        for stage in self.stages:
+            for key in stage.outputs:
+                if key in producers:
+                    raise ValueError(f"'{key}' is produced by both {producers[key] or 'the initial state'} and {stage.name}")
+                producers[key] = stage.name
+        for stage in self.stages:
+            missing = [key for key in stage.inputs if key not in producers]
+            if missing:
+                raise ValueError(f"Stage {stage.name} needs {missing}, which no stage produces")
+        self.topological_order()  # raises on cycles
+
+    def topological_order(self) -> List[str]:
+        available = set(self.initial_inputs)
+        remaining = list(self.stages)
+        order = []
+        while remaining:
+            ready = [s for s in remaining if all(key in available for key in s.inputs)]
+            if not ready:
+                raise ValueError(f"Cycle between stages: {[s.name for s in remaining]}")
+            for stage in ready:
+                order.append(stage.name)
+                available.update(stage.outputs)
+                remaining.remove(stage)
+        return order
+
+    async def _run_stage(self, stage: Stage, state: Dict[str, Any], job: Optional[dict], checkpoints) -> Dict[str, Any]:
+        if job is not None and stage.step is not None and job.get("step", 0) < stage.step:
+            job["step"] = stage.step
+            publish_progress(job)
+        if checkpoints is not None:
+            outputs = await asyncio.to_thread(checkpoints.load, stage.name)
+            if outputs is not None and set(outputs) == set(stage.outputs):
+                logging.info(f"Stage {stage.name} restored from checkpoint.")
+                if job is not None:
+                    job.setdefault("resumed_stages", []).append(stage.name)
+                return outputs
+        logging.info(f"Stage {stage.name} started.")
+        try:
+            with time_stage(job, stage.name):
+                outputs = await stage.fn(job, **{key: state[key] for key in stage.inputs})
+        except Exception:
+            if job is not None:
+                job["failed_stage"] = stage.name
+            raise
+        if set(outputs) != set(stage.outputs):
+            raise ValueError(f"Stage {stage.name} returned {sorted(outputs)}, declared {sorted(stage.outputs)}")
+        if checkpoints is not None:
+            await asyncio.to_thread(checkpoints.save, stage.name, outputs)
+        logging.info(f"Stage {stage.name} finished.")
+        return outputs
+
+    async def run(self, initial_state: Dict[str, Any], job: Optional[dict] = None, checkpoints=None) -> Dict[str, Any]:
+        """
+        Run every stage, launching each one as soon as its inputs are ready. Returns the final state.
+        With `checkpoints` (load(stage)/save(stage, outputs)), completed stages are saved and
+        stages that already have a checkpoint are restored instead of re-run.
+        """
+        state = dict(initial_state)
+        pending = list(self.stages)
+        running: Dict[asyncio.Task, Stage] = {}
+        start = time.perf_counter()
+        try:
+            while pending or running:
+                for stage in [s for s in pending if all(key in state for key in s.inputs)]:
+                    pending.remove(stage)
+                    running[asyncio.create_task(self._run_stage(stage, state, job, checkpoints))] = stage
+                if not running:
+                    raise RuntimeError(f"Stages can never run: {[s.name for s in pending]}")
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    running.pop(task)
+                    if task.exception() is not None and checkpoints is not None and running:
+                        # Let sibling stages that are already under way finish and checkpoint,
+                        # so a resume does not pay for their work twice
+                        await asyncio.gather(*running, return_exceptions=True)
+                        running.clear()
+                    state.update(task.result())  # re-raises the stage's exception
+        finally:
+            for task in running:
+                task.cancel()
+        if job is not None:
+            job["pipeline_wall_seconds"] = round(time.perf_counter() - start, 4)
+        return state
@@ -0,0 +1,275 @@
+import os
+import re
+import json
+import time
+import zlib
+import pickle
+import random
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import List
+
+import numpy as np
+
+# Local stand-ins for Snowflake and OpenAI, used by load_test.py to drive the real API and
+# pipeline without credentials or spend. Latencies imitate the real services: the Snowflake
+# connector blocks its thread, OpenAI calls are awaited.
+
+_PHRASES = {
+    5: ["My dog loves this toy", "Great quality and the price was right", "Arrived quickly, my cat plays with it every day",
+        "Very durable, survived my heavy chewer", "Soft material and the size is perfect"],
+    4: ["Good product overall", "Nice toy but a bit small", "My puppy likes it, shipping was slow", "Works well for the price"],
+    3: ["It is ok", "Average quality, not sure I would buy again", "Smell is strong but the dog does not mind"],
+    2: ["Broke after a week", "Too small for my dog", "The packaging was damaged and the color is off"],
+    1: ["Terrible, fell apart in a day", "My dog got sick after eating these", "Waste of money, the seams ripped immediately"],
+}
+_EXTRAS = ["", " Would recommend!", " <br/>Five stars.", " 😀😀", " Autoship makes it easy.", " Not worth it imo.",
+           " Ordered two sizes to compare and kept the larger one for our lab mix."]
+_ASPECT_WORDS = {"durab": "durability", "price": "price", "money": "value", "ship": "shipping", "size": "size", "small": "size",
+                 "smell": "smell", "packag": "packaging", "color": "color", "sick": "pet_safety", "loves": "pet_enjoyment",
+                 "likes": "pet_enjoyment", "quality": "quality", "material": "material"}
+_NEGATIVE_WORDS = ("broke", "terrible", "waste", "sick", "damaged", "ripped", "slow", "small", "not worth")
+
+
+def synthetic_reviews(sku: str, n: int, rating_only_share: float = 0.15):
+    """Deterministic review rows (sku, customer_review, product_rating, created_date) for a SKU."""
+    rng = random.Random(sku)
+    start = datetime(2022, 1, 1)
+    for i in range(n):
+        rating = rng.choices([5, 4, 3, 2, 1], weights=[50, 20, 10, 8, 12])[0]
+        text = None if rng.random() < rating_only_share else rng.choice(_PHRASES[rating]) + rng.choice(_EXTRAS) + f" #{i}"
+        yield (sku, text, rating, start + timedelta(hours=rng.randrange(24 * 900)))
+
+
+class StandInCursor:
+    def __init__(self, conn: "StandInSnowflake"):
+        self.conn = conn
+        self._rows = iter(())
+
+    def execute(self, query: str, params=None):
+        time.sleep(self.conn.latency)  # the real connector blocks the calling thread for the round trip
+        params = params or {}
+        sql = query.lower()
+        if "created_month" in sql:
+            counts = {}
+            for _, _, rating, created in synthetic_reviews(params["sku"], params.get("limit") or self.conn.reviews_per_sku):
+                key = (rating, created.replace(day=1, hour=0, minute=0, second=0, microsecond=0))
+                counts[key] = counts.get(key, 0) + 1
+            rows = [(rating, month, n) for (rating, month), n in counts.items()]
+        elif "review_txt" in sql:
+            rows = synthetic_reviews(params["sku"], params.get("limit") or self.conn.reviews_per_sku)
+        elif "product_link" in sql:
+            sku = params["sku"]
+            rows = iter([("Dog", "Toys", "Chew Toys", f"Stand-in product {sku}", f"Stand-in product {sku}", sku,
+                          f"https://www.chewy.com/stand-in/dp/{sku}")])
+        else:
+            rows = iter([(f"LT{i}", self.conn.reviews_per_sku) for i in range(params.get("limit") or 10)])
+        self._rows = iter(rows)
+
+    def fetchmany(self, size: int):
+        time.sleep(self.conn.latency / 10)
+        return [row for _, row in zip(range(size), self._rows)]
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def close(self):
+        pass
+
+
+class StandInSnowflake:
+    """Snowflake connection stand-in serving synthetic reviews for any SKU."""
+
+    def __init__(self, reviews_per_sku: int = 1000, latency: float = 0.5):
+        self.reviews_per_sku = reviews_per_sku
+        self.latency = latency
+
+    def cursor(self, *args):
+        return StandInCursor(self)
+
+    def close(self):
+        pass
+
+
+def _usage(prompt: str, completion: str = ""):
+    prompt_tokens, completion_tokens = len(prompt) // 4, len(completion) // 4
+    return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, total_tokens=prompt_tokens + completion_tokens)
+
+
+def _embedding(text: str, dimensions: int) -> List[float]:
+    vector = np.random.RandomState(zlib.crc32(text.encode("utf-8"))).standard_normal(dimensions).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def _aspects(review: str) -> dict:
+    text = review.lower()
+    sentiment = "negative" if any(w in text for w in _NEGATIVE_WORDS) else "positive"
+    aspects = {aspect for word, aspect in _ASPECT_WORDS.items() if word in text}
+    return {"aspects": [{"aspect": a, "sentiment": sentiment} for a in sorted(aspects)]}
+
+
+def _chat_answer(messages: list):
+    """(content, reviews answered, usage dict) for a chat request, like the real model would shape it."""
+    system, user = messages[0]["content"], messages[-1]["content"]
+    if "aspects" in system:
+        reviews = re.findall(r"^\s*Review \d+: (.*)$", user, flags=re.M)
+        content = json.dumps([_aspects(r) for r in reviews])
+    elif "cleaning steps" in system:
+        reviews = re.findall(r"^\d+\. ", user, flags=re.M)
+        content = json.dumps([["html", "encoding", "emoji", "control", "whitespace"] for _ in reviews])
+    else:
+        reviews = []
+        content = "### Executive Summary\nStand-in summary: customers mostly like the product; durability is the main complaint."
+    return content, len(reviews), vars(_usage(system + user, content))
+
+
+class StandInFiles:
+    """Files API stand-in: uploads and batch outputs are plain files in one directory."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, file_id: str) -> str:
+        return os.path.join(self.root, f"{file_id}.jsonl")
+
+    async def create(self, file, purpose: str):
+        name, content = file
+        file_id = f"file-{zlib.crc32(content):08x}{random.randrange(16 ** 6):06x}"
+        os.makedirs(self.root, exist_ok=True)
+        with open(self._path(file_id), "wb") as f:
+            f.write(content)
+        return SimpleNamespace(id=file_id, filename=name, purpose=purpose, bytes=len(content))
+
+    async def content(self, file_id: str):
+        with open(self._path(file_id), encoding="utf-8") as f:
+            return SimpleNamespace(text=f.read())
+
+
+class StandInBatches:
+    """
+    Batch API stand-in. Batch state is a JSON file next to the uploads, so any process can
+    retrieve it; the batch "runs" in the creating process and completes after `latency`
+    seconds. Requests without messages come back as per-request 400 errors.
+    """
+
+    def __init__(self, files: StandInFiles, latency: float = 1.0):
+        self.files = files
+        self.latency = latency
+        self._tasks = set()
+
+    def _path(self, batch_id: str) -> str:
+        return os.path.join(self.files.root, f"{batch_id}.batch.json")
+
+    def _write(self, batch: dict):
+        with open(self._path(batch["id"]), "w") as f:
+            json.dump(batch, f)
+
+    async def create(self, input_file_id: str, endpoint: str, completion_window: str, metadata: dict = None):
+        batch = {"id": f"batch_{input_file_id[5:]}", "status": "validating", "endpoint": endpoint, "input_file_id": input_file_id,
+                 "completion_window": completion_window, "metadata": metadata, "output_file_id": None, "error_file_id": None}
+        self._write(batch)
+        task = asyncio.get_running_loop().create_task(self._process(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return SimpleNamespace(**batch)
+
+    async def retrieve(self, batch_id: str):
+        with open(self._path(batch_id)) as f:
+            return SimpleNamespace(**json.load(f))
+
+    async def _process(self, batch: dict):
+        self._write({**batch, "status": "in_progress"})
+        await asyncio.sleep(self.latency)
+        output, errors = [], []
+        for line in (await self.files.content(batch["input_file_id"])).text.splitlines():
+            request = json.loads(line)
+            messages = request["body"].get("messages")
+            if not messages:
+                errors.append({"custom_id": request["custom_id"], "response": {"status_code": 400, "body": {"error": {"message": "messages is required"}}}})
+                continue
+            content, _, usage = _chat_answer(messages)
+            body = {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}], "usage": usage}
+            output.append({"custom_id": request["custom_id"], "response": {"status_code": 200, "body": body}, "error": None})
+        for kind, records in (("output_file_id", output), ("error_file_id", errors)):
+            if records:
+                upload = await self.files.create((f"{batch['id']}_{kind}.jsonl", "".join(json.dumps(r) + "\n" for r in records).encode("utf-8")),
+                                                 purpose="batch_output")
+                batch[kind] = upload.id
+        self._write({**batch, "status": "completed"})
+
+
+class StandInOpenAI:
+    """
+    AsyncOpenAI stand-in for the calls this backend makes: embeddings (deterministic unit
+    vectors per text), aspect extraction, cleaning-step selection and the executive summary,
+    plus the Files/Batch API used by bulk LLM mode (file-based, under `batch_dir`).
+    Each call sleeps around `latency` seconds; chat calls also scale with their batch size.
+    """
+
+    def __init__(self, latency: float = 0.5, per_item_latency: float = 0.02, batch_dir: str = "standin_batches",
+                 batch_latency: float = 1.0):
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.embeddings = SimpleNamespace(create=self._embed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.files = StandInFiles(batch_dir)
+        self.batches = StandInBatches(self.files, batch_latency)
+
+    async def _sleep(self, items: int = 1):
+        await asyncio.sleep(random.uniform(0.5, 1.5) * self.latency + items * self.per_item_latency)
+
+    async def _embed(self, model: str, input: List[str], dimensions: int = None, **kwargs):
+        from core.openai_client import FULL_EMBEDDING_DIMENSIONS
+        await self._sleep()
+        dimensions = dimensions or FULL_EMBEDDING_DIMENSIONS
+        data = [SimpleNamespace(embedding=_embedding(text, dimensions)) for text in input]
+        return SimpleNamespace(data=data, usage=_usage(" ".join(input)))
+
+    async def _chat(self, model: str, messages: list, **kwargs):
+        content, items, usage = _chat_answer(messages)
+        await self._sleep(items)
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=SimpleNamespace(**usage))
+
+    async def close(self):
+        pass
+
+
+def ensure_standin_classifier(dimensions: int, models_dir: str) -> str:
+    """
+    Write a sentiment classifier for `dimensions`-d OpenAI embeddings to `models_dir` if the
+    real one is not there, trained on random vectors: it costs the same to load and run.
+    """
+    from core.openai_client import classifier_model_path
+    import core.openai_client as openai_client
+    if os.path.exists(classifier_model_path(dimensions)):
+        return classifier_model_path(dimensions)
+    from sklearn.linear_model import LogisticRegression
+    rng = np.random.RandomState(0)
+    X = rng.standard_normal((300, dimensions)).astype(np.float32)
+    clf = LogisticRegression(max_iter=200).fit(X, np.arange(300) % 3)
+    openai_client.MODELS_DIR = models_dir
+    os.makedirs(models_dir, exist_ok=True)
+    with open(classifier_model_path(dimensions), "wb") as f:
+        pickle.dump(clf, f)
+    logging.info(f"Using a stand-in {dimensions}-d sentiment classifier in {models_dir}")
+    return classifier_model_path(dimensions)
+
+
+def install_standins(reviews_per_sku: int = 1000, snowflake_latency: float = 0.5, openai_latency: float = 0.5,
+                     models_dir: str = "standin_models"):
+    """Point the pipeline's Snowflake connections and the shared OpenAI client at the stand-ins."""
+    import core.fetch_reviews as fetch_reviews
+    import core.langgraph_pipeline as pipeline
+    import core.openai_client as openai_client
+    connect = lambda: StandInSnowflake(reviews_per_sku, snowflake_latency)
+    pipeline.connect_to_snowflake = connect
+    fetch_reviews.connect_to_snowflake = connect
+    openai_client._build_openai_client = lambda: StandInOpenAI(openai_latency)
+    openai_client._client = None
+    ensure_standin_classifier(openai_client.EMBEDDING_DIMENSIONS, models_dir)
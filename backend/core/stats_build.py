@@ -1,42 +1,81 @@
 import numpy as np
 from collections import Counter, defaultdict
+from collections.abc import Mapping
 from typing import List, Dict, Any
-import random
+from core.vector_index import diverse_central_sample
 from datetime import datetime
 import re
 
+def review_weight(review: Dict) -> float:
+    """Sampling weight of a review (1.0 unless it came from a stratified sample)."""
+    weight = review.get('sample_weight')
+    # NaN shows up when pandas fills the column for rows that never had it
+    return float(weight) if weight and weight == weight else 1.0
+
+def aspect_result_weight(result: Dict) -> float:
+    """Extra weight of an aspect result from review routing (sampled reviews stand for several)."""
+    weight = result.get('weight')
+    return 1.0 if weight is None else float(weight)
+
+def weighted_counts(keys, weights) -> Dict[str, Any]:
+    """Sum weights per key, rounded to whole (estimated) review counts."""
+    counts = defaultdict(float)
+    for key, weight in zip(keys, weights):
+        counts[key] += weight
+    return {k: int(round(v)) for k, v in counts.items()}
+
+def proportion_confidence_intervals(labels, weights, z: float = 1.96) -> Dict[str, Dict[str, float]]:
+    """
+    95% normal-approximation interval (in percent) for each label's share, using the
+    Kish effective sample size so stratified-sample weights widen the interval accordingly.
+    """
+    weights = np.asarray(weights, dtype=float)
+    total = weights.sum()
+    if total <= 0:
+        return {}
+    n_eff = total ** 2 / float(np.sum(weights ** 2))
+    intervals = {}
+    labels = np.asarray(labels, dtype=object)
+    for label in set(labels.tolist()):
+        p = float(weights[labels == label].sum() / total)
+        half = z * np.sqrt(p * (1 - p) / n_eff)
+        intervals[label] = {'low': round(100 * max(0.0, p - half), 2), 'high': round(100 * min(1.0, p + half), 2)}
+    return intervals
+
 # remember the n_samples is for sameple review per sentiment and not per keyword.
-def build_stats_summary(reviews: List[Dict], top_keywords: Dict[str, List[str]], keyword_matched_samples: Dict[str, Dict[str, list]], n_samples: int = 5) -> Dict[str, Any]:
+def build_stats_summary(reviews: List[Dict], top_keywords: Dict[str, List[str]], keyword_matched_samples: Dict[str, Dict[str, list]], n_samples: int = 5, sampling: Dict[str, Any] = None) -> Dict[str, Any]:
     """
     keyword_matched_samples: {sentiment: {keyword: [sample_review1, sample_review2, ...]}}
+    sampling: optional sampling report; when reviews carry 'sample_weight', counts and
+    percentages are scaled population estimates.
     """
+    weights = [review_weight(r) for r in reviews]
     # Sentiment counts and percentages
     sentiment_labels = [r.get('sentiment') for r in reviews]
     label_map = {"0": "negative", "1": "neutral", "2": "positive", 0: "negative", 1: "neutral", 2: "positive"}
     sentiment_strs = [label_map.get(str(l), str(l)) for l in sentiment_labels]
-    sentiment_counts = dict(Counter(sentiment_strs))
+    sentiment_counts = weighted_counts(sentiment_strs, weights)
     total = sum(sentiment_counts.values())
     sentiment_percentages = {k: round(100*v/total, 2) for k, v in sentiment_counts.items()}
+    sentiment_percentage_ci = proportion_confidence_intervals(sentiment_strs, weights)
 
     # Star rating distribution
-    star_ratings = [str(r.get('product_rating')) for r in reviews if r.get('product_rating') is not None]
-    star_rating_distribution = dict(Counter(star_ratings))
+    rated = [(str(r.get('product_rating')), w) for r, w in zip(reviews, weights) if r.get('product_rating') is not None]
+    star_rating_distribution = weighted_counts([k for k, _ in rated], [w for _, w in rated])
 
-    # Sample reviews by sentiment
+    # Sample reviews by sentiment: central but mutually diverse, picked by embedding (MMR)
     sample_reviews = {}
     for sentiment in ['positive', 'neutral', 'negative']:
-        texts = [r.get('clean') for r in reviews if label_map.get(str(r.get('sentiment')), str(r.get('sentiment'))) == sentiment and r.get('clean')]
-        if texts:
-            sample_reviews[sentiment] = random.sample(texts, min(n_samples, len(texts)))
-        else:
-            sample_reviews[sentiment] = []
+        group = [r for r in reviews if label_map.get(str(r.get('sentiment')), str(r.get('sentiment'))) == sentiment
+                 and r.get('clean') and 'near_duplicate_of' not in r]
+        sample_reviews[sentiment] = diverse_central_sample([r.get('clean') for r in group], [r.get('embedding') for r in group], n_samples)
 
     # Sentiment confidence (average and distribution)
     sentiment_confidence = {}
     sentiment_to_idx = {'negative': '0', 'neutral': '1', 'positive': '2'}
     for sentiment in ['positive', 'neutral', 'negative']:
         idx = sentiment_to_idx[sentiment]
-        probs = [r['sentiment_probabilities'].get(idx, None) for r in reviews if isinstance(r, dict) and isinstance(r.get('sentiment_probabilities'), dict)]
+        probs = [r['sentiment_probabilities'].get(idx, None) for r in reviews if isinstance(r, Mapping) and isinstance(r.get('sentiment_probabilities'), dict)]
         probs = [float(p) for p in probs if p is not None]
         if probs:
             sentiment_confidence[sentiment] = {
@@ -63,8 +102,8 @@ def build_stats_summary(reviews: List[Dict], top_keywords: Dict[str, List[str]],
             review_length_stats[sentiment] = None
 
     # Time trends (if created_date available)
-    time_trends = defaultdict(lambda: Counter())
-    for r in reviews:
+    time_trends = defaultdict(lambda: defaultdict(float))
+    for r, weight in zip(reviews, weights):
         date = r.get('created_date')
         sentiment = label_map.get(str(r.get('sentiment')), str(r.get('sentiment')))
         if date and sentiment:
@@ -74,10 +113,10 @@ def build_stats_summary(reviews: List[Dict], top_keywords: Dict[str, List[str]],
                 else:
                     dt = date
                 month = dt.strftime('%Y-%m')
-                time_trends[month][sentiment] += 1
+                time_trends[month][sentiment] += weight
             except Exception:
                 continue
-    time_trends = {month: dict(counts) for month, counts in time_trends.items()}
+    time_trends = {month: {k: int(round(v)) for k, v in counts.items()} for month, counts in time_trends.items()}
 
     # Most common bigrams (optional, per sentiment)
     def get_bigrams(texts):
@@ -91,9 +130,10 @@ def build_stats_summary(reviews: List[Dict], top_keywords: Dict[str, List[str]],
         texts = [r.get('clean') for r in reviews if label_map.get(str(r.get('sentiment')), str(r.get('sentiment'))) == sentiment and r.get('clean')]
         common_bigrams[sentiment] = get_bigrams(texts)
 
-    return {
+    summary = {
         'sentiment_counts': sentiment_counts,
         'sentiment_percentages': sentiment_percentages,
+        'sentiment_percentage_ci': sentiment_percentage_ci,
         'star_rating_distribution': star_rating_distribution,
         'top_keywords': top_keywords,
         'sample_reviews': sample_reviews,
@@ -103,6 +143,9 @@ def build_stats_summary(reviews: List[Dict], top_keywords: Dict[str, List[str]],
         'time_trends': time_trends,
         'common_bigrams': common_bigrams,
     }
+    if sampling:
+        summary['sampling'] = sampling
+    return summary
 
 def calculate_aspect_trend(aspect_results, cleaned_reviews):
     from collections import defaultdict, Counter
@@ -122,13 +165,14 @@ def calculate_aspect_trend(aspect_results, cleaned_reviews):
                 month = dt.strftime('%Y-%m')
             except Exception:
                 pass
+        weight = review_weight(review) * aspect_result_weight(result)
         for asp in result.get('aspects', []):
             aspect = asp['aspect'].lower()
             sentiment = asp['sentiment'].lower()
             if month:
-                aspect_trends[aspect][month][sentiment] += 1
+                aspect_trends[aspect][month][sentiment] += weight
     # Convert to regular dicts for JSON serialization
-    return {a: {m: dict(c) for m, c in months.items()} for a, months in aspect_trends.items()}
+    return {a: {m: {k: int(round(v)) for k, v in c.items()} for m, c in months.items()} for a, months in aspect_trends.items()}
 
 
 def aggregate_aspect_sentiment(aspect_results, cleaned_reviews, top_n=10, samples_per_aspect=3):
@@ -139,20 +183,20 @@ def aggregate_aspect_sentiment(aspect_results, cleaned_reviews, top_n=10, sample
     """
     from collections import defaultdict, Counter
     aspect_counts = defaultdict(lambda: Counter())
-    # aspect_samples = defaultdict(lambda: {'positive': [], 'neutral': [], 'negative': []})
-    aspect_samples = defaultdict(lambda: defaultdict(list))
+    # Candidate review indices per aspect and sentiment; samples are picked from them by embedding below
+    aspect_candidates = defaultdict(lambda: defaultdict(list))
     aspect_trends = calculate_aspect_trend(aspect_results, cleaned_reviews)
     for idx, result in enumerate(aspect_results):
         if not isinstance(result, dict):
             continue
+        weight = review_weight(cleaned_reviews[idx]) * aspect_result_weight(result)
         for asp in result.get('aspects', []):
             aspect = asp['aspect'].lower()
             sentiment = asp['sentiment'].lower()
-            aspect_counts[aspect][sentiment] += 1
-            aspect_counts[aspect]['total'] += 1
-            # Collect sample reviews per sentiment
-            if len(aspect_samples[aspect][sentiment]) < samples_per_aspect:
-                aspect_samples[aspect][sentiment].append(cleaned_reviews[idx].get('clean', ''))
+            aspect_counts[aspect][sentiment] += weight
+            aspect_counts[aspect]['total'] += weight
+            if 'near_duplicate_of' not in cleaned_reviews[idx]:
+                aspect_candidates[aspect][sentiment].append(idx)
     aspect_summary = []
     for aspect, counts in aspect_counts.items():
         total = counts['total']
@@ -162,10 +206,17 @@ def aggregate_aspect_sentiment(aspect_results, cleaned_reviews, top_n=10, sample
             'positive': 100 * counts['positive'] / total if total else 0,
             'neutral': 100 * counts['neutral'] / total if total else 0,
             'negative': 100 * counts['negative'] / total if total else 0,
-            'mentions': total,
-            'sample_reviews': aspect_samples[aspect],
+            'mentions': int(round(total)),
             'trend': trend
         }
         aspect_summary.append(aspect_obj)
     aspect_summary.sort(key=lambda x: x['mentions'], reverse=True)
-    return aspect_summary[:top_n] 
\ No newline at end of file
+    aspect_summary = aspect_summary[:top_n]
+    # Sample reviews per sentiment for the kept aspects: central but mutually diverse (MMR over embeddings)
+    for aspect_obj in aspect_summary:
+        aspect_obj['sample_reviews'] = {
+            sentiment: diverse_central_sample([cleaned_reviews[i].get('clean', '') for i in indices],
+                                              [cleaned_reviews[i].get('embedding') for i in indices], samples_per_aspect)
+            for sentiment, indices in aspect_candidates[aspect_obj['aspect']].items()
+        }
+    return aspect_summary 
\ No newline at end of file
@@ -0,0 +1,224 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+from core.checkpoints import input_hash
+from core.review_table import ReviewTable, MISSING
+
+# Jobs with at least this many vectors get an IVF index with int8-quantized rows instead of a flat scan
+VECTOR_INDEX_IVF_MIN = int(os.getenv("VECTOR_INDEX_IVF_MIN", "100000"))
+VECTOR_INDEX_NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", "8"))
+# Trade-off between centrality and diversity when picking sample reviews (1.0 = most central only)
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+# Indexed review vectors of each job, SEARCH_INDEX_DIR/{sku}/{params_hash}.npz, written by the
+# pipeline's search_index stage; GET /jobs/{job_id}/similar builds its index from them
+SEARCH_INDEX_DIR = os.getenv("SEARCH_INDEX_DIR", "search_indexes")
+# Indexes an API process keeps in memory; the least recently searched is dropped first
+SEARCH_INDEX_CACHE_SIZE = int(os.getenv("SEARCH_INDEX_CACHE_SIZE", "8"))
+
+KMEANS_ITERATIONS = 10
+KMEANS_TRAIN_SIZE = 20000
+
+
+def normalize_rows(X) -> np.ndarray:
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k largest scores, best first (argpartition, then sort only those k)."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def _spherical_kmeans(X: np.ndarray, n_clusters: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.RandomState(seed)
+    train = X[rng.choice(len(X), min(len(X), KMEANS_TRAIN_SIZE), replace=False)]
+    centroids = train[rng.choice(len(train), n_clusters, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assign = np.argmax(train @ centroids.T, axis=1)
+        for c in range(n_clusters):
+            members = train[assign == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids = normalize_rows(centroids)
+    return centroids
+
+
+class VectorIndex:
+    """
+    Cosine-similarity index over one job's review embeddings.
+
+    "flat" keeps a normalized float32 matrix and scores a query with one matrix-vector
+    product. "ivf" clusters the rows (spherical k-means, ~sqrt(n) lists), stores them as
+    int8 codes with a per-row scale, and only scans the `nprobe` lists closest to the query.
+    """
+
+    def __init__(self, vectors, ids: Optional[Sequence[int]] = None, mode: str = "auto", nprobe: int = VECTOR_INDEX_NPROBE):
+        X = normalize_rows(vectors)
+        self.ids = np.arange(len(X)) if ids is None else np.asarray(ids)
+        self.input_ids = self.ids  # construction order, which `mask` in search() is aligned with
+        self.dim = X.shape[1] if X.ndim == 2 else 0
+        self.nprobe = nprobe
+        if mode == "auto":
+            mode = "ivf" if len(X) >= VECTOR_INDEX_IVF_MIN else "flat"
+        self.mode = mode
+        if mode == "flat":
+            self.matrix = X
+        elif mode == "ivf":
+            self._build_ivf(X)
+        else:
+            raise ValueError(f"Unknown vector index mode: {mode}")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _build_ivf(self, X: np.ndarray):
+        n_lists = max(1, min(len(X), int(np.sqrt(len(X)))))
+        self.centroids = _spherical_kmeans(X, n_lists)
+        assign = np.concatenate([np.argmax(X[i:i+8192] @ self.centroids.T, axis=1) for i in range(0, len(X), 8192)])
+        order = np.argsort(assign, kind="stable")
+        # Rows are stored grouped by list so each probe is a contiguous slice
+        self.order = order
+        self.ids = self.ids[order]
+        X = X[order]
+        self.offsets = np.searchsorted(assign[order], np.arange(n_lists + 1))
+        self.scales = (np.abs(X).max(axis=1) / 127.0).astype(np.float32)
+        self.scales[self.scales == 0] = 1.0
+        self.codes = np.round(X / self.scales[:, None]).astype(np.int8)
+        logging.info(f"Built IVF index: {len(X)} vectors, {n_lists} lists, int8 codes ({self.codes.nbytes / 1e6:.1f} MB)")
+
+    def search(self, query, k: int = 10, mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Top-k (id, cosine score) pairs for a query vector. `mask` is an optional boolean
+        array aligned with `input_ids`, restricting which rows can match.
+        """
+        q = normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        if self.mode == "flat":
+            scores = self.matrix @ q
+            if mask is not None:
+                scores = np.where(mask, scores, -np.inf)
+            top = _top_k(scores, k)
+            return [(int(self.ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+        lists = _top_k(self.centroids @ q, self.nprobe)
+        rows = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in lists])
+        if mask is not None:
+            # mask is aligned with construction order; rows are stored in list order
+            rows = rows[mask[self.order[rows]]]
+        scores = (self.codes[rows].astype(np.float32) @ q) * self.scales[rows]
+        top = _top_k(scores, k)
+        return [(int(self.ids[rows[i]]), float(scores[i])) for i in top]
+
+
+def build_review_index(reviews, mode: str = "auto") -> Optional[VectorIndex]:
+    """Index the embedded reviews of a job (near-duplicates skipped); ids are positions in `reviews`."""
+    if isinstance(reviews, ReviewTable):
+        # Gather rows straight from the table's embedding matrix
+        ids = _indexed_rows(reviews)
+        return VectorIndex(reviews.embedding_matrix(ids), ids=ids, mode=mode) if len(ids) else None
+    ids = [i for i, r in enumerate(reviews) if r.get("embedding") is not None and "near_duplicate_of" not in r]
+    if not ids:
+        return None
+    return VectorIndex([reviews[i]["embedding"] for i in ids], ids=ids, mode=mode)
+
+
+def _indexed_rows(table: ReviewTable) -> np.ndarray:
+    keep = table.embedding_row != MISSING
+    if table.rep_of is not None:
+        keep &= table.rep_of == np.arange(len(table))
+    return np.flatnonzero(keep)
+
+
+def search_index_path(sku: str, params: Dict[str, Any], root: str = None) -> str:
+    return os.path.join(root or SEARCH_INDEX_DIR, str(sku), f"{input_hash(sku, params)}.npz")
+
+
+def save_review_vectors(sku: str, params: Dict[str, Any], reviews: ReviewTable, root: str = None) -> int:
+    """
+    Persist what /similar needs to rebuild a job's index: the indexed rows' ids (review_index in
+    the job's export), their vectors and sentiments. Returns the number of vectors saved.
+    """
+    ids = _indexed_rows(reviews)
+    path = search_index_path(sku, params, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    sentiments = [s or "" for s in reviews.column("sentiment")[ids]]
+    tmp = f"{path}.tmp.npz"
+    np.savez(tmp, ids=ids.astype(np.int64), vectors=normalize_rows(reviews.embedding_matrix(ids)) if len(ids) else np.empty((0, 0), np.float32),
+             sentiments=np.array(sentiments, dtype=str))
+    os.replace(tmp, path)
+    return len(ids)
+
+
+class SearchIndexCache:
+    """Bounded LRU of (VectorIndex, sentiment per indexed row) by saved-vectors file; a rewritten file is reloaded."""
+
+    def __init__(self, size: int = SEARCH_INDEX_CACHE_SIZE):
+        self.size = size
+        self._entries: "OrderedDict[tuple, Tuple[VectorIndex, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> Optional[Tuple[VectorIndex, np.ndarray]]:
+        """Blocking (reads the file and may build an IVF index): call from a thread."""
+        try:
+            key = (path, os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        with np.load(path, allow_pickle=False) as data:
+            ids, vectors, sentiments = data["ids"], data["vectors"], data["sentiments"]
+        entry = (VectorIndex(vectors, ids=ids), sentiments) if len(ids) else None
+        with self._lock:
+            for stale in [k for k in self._entries if k[0] == path]:
+                del self._entries[stale]
+            if entry is not None:
+                self._entries[key] = entry
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+        return entry
+
+
+def mmr_select(vectors, k: int, lambda_: float = MMR_LAMBDA) -> List[int]:
+    """
+    Maximal marginal relevance over one group of vectors: each pick maximizes
+    lambda * similarity-to-group-centroid - (1 - lambda) * similarity-to-already-picked,
+    so samples are typical of the group without repeating each other. Returns row positions.
+    """
+    X = normalize_rows(vectors)
+    if len(X) == 0 or k <= 0:
+        return []
+    centroid = normalize_rows(X.mean(axis=0, keepdims=True))[0]
+    relevance = X @ centroid
+    max_sim = np.full(len(X), -np.inf, dtype=np.float32)
+    picked = []
+    for _ in range(min(k, len(X))):
+        penalty = np.where(np.isfinite(max_sim), max_sim, 0.0)
+        score = lambda_ * relevance - (1 - lambda_) * penalty
+        score[picked] = -np.inf
+        best = int(np.argmax(score))
+        picked.append(best)
+        max_sim = np.maximum(max_sim, X @ X[best])
+    return picked
+
+
+def diverse_central_sample(items: list, embeddings: list, k: int) -> list:
+    """
+    Pick k items whose embeddings are central to and spread across the group. Items without
+    an embedding are only used to fill up when too few embedded items exist.
+    """
+    embedded = [i for i, e in enumerate(embeddings) if e is not None and len(e)]
+    picked = [embedded[p] for p in mmr_select([embeddings[i] for i in embedded], k)] if embedded else []
+    if len(picked) < k:
+        chosen = set(picked)
+        picked += [i for i in range(len(items)) if i not in chosen][:k - len(picked)]
+    return [items[i] for i in picked]
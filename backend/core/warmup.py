@@ -0,0 +1,115 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Callable, Dict, Iterable
+
+# Run warm-up in the background once the server is accepting traffic
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+# /ready waits only for these; the rest are warmed too, but a failure there (a model download,
+# a classifier artifact for another provider) must not keep the process out of rotation
+WARMUP_REQUIRED = [c.strip() for c in os.getenv("WARMUP_REQUIRED", "text_libs,lang_id,openai_sdk").split(",") if c.strip()]
+# Failed components are retried, waiting this long at first and doubling up to the max
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+WARMUP_RETRY_MAX_SECONDS = float(os.getenv("WARMUP_RETRY_MAX_SECONDS", "300"))
+
+_state: Dict[str, dict] = {}
+_lock = threading.Lock()
+
+
+def _import_text_libs():
+    import bs4, ftfy, emoji  # noqa: F401
+
+
+def _load_lang_id():
+    from core.lang_id import load_model
+    load_model()
+
+
+def _build_spell_index():
+    from core.clean_text import get_spellchecker
+    get_spellchecker('en').correction("dgo")
+
+
+def _load_wordnet():
+    from core.clean_text import get_lemmatizer
+    get_lemmatizer().lemmatize("dogs")
+
+
+def _load_classifier():
+    from core.embedding_providers import get_embedding_provider
+    from core.openai_client import load_classifier
+    # With the local provider as default this also loads its ONNX model
+    provider = get_embedding_provider()
+    load_classifier(provider.dimensions, provider.name)
+
+
+def _load_keybert():
+    from core.keyword_extract import get_keybert
+    get_keybert()
+
+
+def _import_openai():
+    import openai  # noqa: F401
+
+
+# Component name -> loader, in the order they are warmed
+COMPONENTS: Dict[str, Callable[[], None]] = {
+    "text_libs": _import_text_libs,
+    "lang_id": _load_lang_id,
+    "spell_index": _build_spell_index,
+    "wordnet": _load_wordnet,
+    "classifier": _load_classifier,
+    "openai_sdk": _import_openai,
+    "keybert": _load_keybert,
+}
+
+for _name in COMPONENTS:
+    _state[_name] = {"status": "pending", "required": _name in WARMUP_REQUIRED, "attempts": 0}
+
+
+def warm_up(names: Iterable[str] = None):
+    """
+    Load every heavy dependency the pipeline stages need (or only `names`). Blocking; meant to
+    be run in a worker thread after startup so the first analysis does not pay for it.
+    """
+    for name in names or list(COMPONENTS):
+        with _lock:
+            attempts = _state[name]["attempts"] + 1
+            _state[name] = {"status": "loading", "required": name in WARMUP_REQUIRED, "attempts": attempts}
+        start = time.perf_counter()
+        try:
+            COMPONENTS[name]()
+            status = {"status": "ready"}
+        except Exception as e:
+            logging.warning(f"Warm-up of {name} failed: {e}")
+            status = {"status": "failed", "error": str(e)}
+        status.update(required=name in WARMUP_REQUIRED, attempts=attempts, seconds=round(time.perf_counter() - start, 3))
+        with _lock:
+            _state[name] = status
+        logging.info(f"Warm-up {name}: {status}")
+
+
+async def warm_up_with_retries():
+    """Warm every component in a thread, then keep retrying failed ones with exponential backoff until all load (or cancelled)."""
+    await asyncio.to_thread(warm_up)
+    delay = WARMUP_RETRY_SECONDS
+    while True:
+        failed = [name for name, state in warm_state().items() if state["status"] == "failed"]
+        if not failed:
+            return
+        await asyncio.sleep(delay)
+        await asyncio.to_thread(warm_up, failed)
+        delay = min(delay * 2, WARMUP_RETRY_MAX_SECONDS)
+
+
+def warm_state() -> Dict[str, dict]:
+    with _lock:
+        return {name: dict(state) for name, state in _state.items()}
+
+
+def is_ready() -> bool:
+    """True once every required component has loaded; optional ones may still be loading or retrying."""
+    with _lock:
+        return all(state["status"] == "ready" for state in _state.values() if state["required"])
@@ -0,0 +1,213 @@
+import logging
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s %(levelname)s %(message)s')
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+import numpy as np
+
+# Drives /analyze -> /status polling -> /results -> /summary sessions at fixed arrival rates and
+# reports latency percentiles, errors and event-loop stalls per rate. By default it starts the
+# API in-process (uvicorn on a local port) with Snowflake and OpenAI replaced by core.standins.
+
+ENDPOINTS = ("analyze", "status", "results", "summary")
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ms = np.asarray(values) * 1000
+    return {"count": len(values), "p50_ms": round(float(np.percentile(ms, 50)), 1), "p90_ms": round(float(np.percentile(ms, 90)), 1),
+            "p99_ms": round(float(np.percentile(ms, 99)), 1), "max_ms": round(float(ms.max()), 1)}
+
+
+class StepStats:
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Counter] = defaultdict(Counter)
+        self.outcomes = Counter()
+        self.session_seconds: List[float] = []
+
+    async def request(self, client, endpoint: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except Exception as e:
+            self.errors[endpoint][type(e).__name__] += 1
+            return None
+        self.latencies[endpoint].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[endpoint][str(response.status_code)] += 1
+        return response
+
+
+async def session(client, sku: str, stats: StepStats, poll_seconds: float, timeout: float):
+    """One analyst: start an analysis, poll it like the frontend does, then load results and summary."""
+    start = time.perf_counter()
+    response = await stats.request(client, "analyze", "POST", f"/api/analyze/{sku}", params={"refresh": "true"})
+    if response is None or response.status_code != 200:
+        stats.outcomes["analyze_failed"] += 1
+        return
+    job_id = response.json()["job_id"]
+    status = None
+    while status not in ("complete", "failed", "no_data"):
+        if time.perf_counter() - start > timeout:
+            stats.outcomes["timeout"] += 1
+            return
+        await asyncio.sleep(poll_seconds)
+        response = await stats.request(client, "status", "GET", f"/api/status/{job_id}")
+        if response is not None and response.status_code == 200:
+            status = response.json()["status"]
+    if status == "complete":
+        await stats.request(client, "results", "GET", f"/api/results/{job_id}")
+        await stats.request(client, "summary", "GET", f"/api/summary/{job_id}")
+        stats.session_seconds.append(time.perf_counter() - start)
+    stats.outcomes[status] += 1
+
+
+async def run_step(client, rate: float, duration: float, args, run_id: str) -> StepStats:
+    """Open-loop Poisson arrivals at `rate` sessions/s for `duration` s, then wait for stragglers."""
+    stats = StepStats(rate)
+    rng = random.Random(f"{run_id}:{rate}")
+    tasks = []
+    end = time.perf_counter() + duration
+    n = 0
+    while time.perf_counter() < end:
+        # A fresh SKU per session, so no session is served from another's checkpoints
+        sku = f"LT{run_id}R{rate}N{n}"
+        tasks.append(asyncio.create_task(session(client, sku, stats, args.poll_seconds, args.session_timeout)))
+        n += 1
+        await asyncio.sleep(rng.expovariate(rate))
+    await asyncio.gather(*tasks)
+    return stats
+
+
+def start_local_server(args) -> str:
+    """Start the API with stand-ins on a local port in a background thread; returns its base URL."""
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    for var, name in (("JOB_STORE_DIR", "job_store"), ("RESULT_STORE_DIR", "result_store"), ("CHECKPOINT_DIR", "checkpoints"),
+                      ("PROFILE_DIR", "profiles")):
+        os.environ[var] = os.path.join(workdir, name)
+    os.environ["LOOP_BLOCK_THRESHOLD_MS"] = str(args.block_threshold_ms)
+    os.environ["WORKER_CONCURRENCY"] = str(args.worker_concurrency)
+    os.chdir(workdir)  # step_*.json debug dumps land here
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import uvicorn
+    from core.standins import install_standins
+    from main import app
+    install_standins(args.reviews, args.snowflake_latency, args.openai_latency, os.path.join(workdir, "models"))
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    threading.Thread(target=server.run, name="api-server", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    print(f"Started API with stand-ins on port {args.port} (working dir {workdir})")
+    return f"http://127.0.0.1:{args.port}"
+
+
+def summarize(stats: StepStats, stalls: List[dict], args) -> dict:
+    started = sum(stats.outcomes.values())
+    status_p99 = percentiles(stats.latencies["status"]).get("p99_ms", 0)
+    session_p90 = percentiles(stats.session_seconds).get("p90_ms", 0) / 1000
+    errors = {endpoint: dict(counts) for endpoint, counts in stats.errors.items() if counts}
+    return {
+        "rate_per_second": stats.rate,
+        "sessions": started,
+        "outcomes": dict(stats.outcomes),
+        "session_seconds": percentiles(stats.session_seconds),
+        "latency": {endpoint: percentiles(stats.latencies[endpoint]) for endpoint in ENDPOINTS},
+        "errors": errors,
+        "loop_stalls": len(stalls),
+        "max_stall_seconds": max((s["blocked_seconds"] for s in stalls), default=0.0),
+        # Sustainable: every session completed without errors, /status stayed responsive and jobs
+        # did not pile up in the queue (which shows as growing session times)
+        "sustained": (started > 0 and stats.outcomes["complete"] == started and not errors
+                      and status_p99 <= args.slo_status_p99_ms and session_p90 <= args.slo_session_p90_seconds),
+    }
+
+
+def top_stalls(stalls: List[dict], n: int = 3) -> List[dict]:
+    """The longest stalls, one per distinct blocking frame."""
+    seen, top = set(), []
+    for stall in sorted(stalls, key=lambda s: -s["blocked_seconds"]):
+        frames = [line for line in stall["stack"].splitlines() if line.strip().startswith("File ")]
+        key = frames[-1] if frames else stall["stack"]
+        if key not in seen:
+            seen.add(key)
+            top.append(stall)
+    return top[:n]
+
+
+async def run(args) -> List[dict]:
+    import httpx
+    base_url = args.url or start_local_server(args)
+    run_id = f"{int(time.time()) % 100000}"
+    reports = []
+    limits = httpx.Limits(max_connections=1000, max_keepalive_connections=100)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout, limits=limits) as client:
+        for rate in args.rates:
+            seen = (await client.get("/api/loop-stalls")).json()["count"]
+            print(f"--- {rate} sessions/s for {args.duration:.0f}s")
+            stats = await run_step(client, rate, args.duration, args, run_id)
+            stall_report = (await client.get("/api/loop-stalls")).json()
+            new = stall_report["count"] - seen
+            stalls = stall_report["stalls"][-new:] if new else []
+            report = summarize(stats, stalls, args)
+            report["top_stalls"] = top_stalls(stalls)
+            reports.append(report)
+            print(json.dumps({k: v for k, v in report.items() if k != "top_stalls"}, indent=2))
+            for stall in report["top_stalls"]:
+                print(f"Loop blocked {stall['blocked_seconds']:.3f}s at {stall['at']}:\n{stall['stack']}")
+            if not report["sustained"] and not args.keep_going:
+                break
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the analysis API and report capacity, latency and event-loop stalls.")
+    parser.add_argument("--rates", default="0.05,0.1,0.2,0.5", help="comma-separated arrival rates (sessions per second), run in order")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of arrivals per rate")
+    parser.add_argument("--url", help="target a running instance instead of starting one with stand-ins")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--reviews", type=int, default=1000, help="stand-in reviews per SKU")
+    parser.add_argument("--snowflake-latency", type=float, default=0.5, help="stand-in query round trip (blocks its thread)")
+    parser.add_argument("--openai-latency", type=float, default=0.5, help="stand-in OpenAI request latency")
+    parser.add_argument("--worker-concurrency", type=int, default=2, help="jobs the in-process worker runs at once")
+    parser.add_argument("--block-threshold-ms", type=float, default=100, help="event-loop stall threshold for the in-process API")
+    parser.add_argument("--poll-seconds", type=float, default=1.0, help="status poll interval (the frontend polls every second)")
+    parser.add_argument("--session-timeout", type=float, default=600)
+    parser.add_argument("--request-timeout", type=float, default=30)
+    parser.add_argument("--slo-status-p99-ms", type=float, default=500, help="a rate is sustained only if /status p99 stays below this")
+    parser.add_argument("--slo-session-p90-seconds", type=float, default=120,
+                        help="a rate is sustained only if 90%% of analyses finish (results and summary loaded) within this")
+    parser.add_argument("--max-stall-ms", type=float, help="exit 1 if any event-loop stall is longer (for CI)")
+    parser.add_argument("--keep-going", action="store_true", help="run every rate even after one is not sustained")
+    parser.add_argument("--out", help="write the full report as JSON")
+    args = parser.parse_args()
+    args.rates = [float(r) for r in args.rates.split(",") if r.strip()]
+    args.out = os.path.abspath(args.out) if args.out else None  # the in-process server changes directory
+
+    reports = asyncio.run(run(args))
+    sustained = [r["rate_per_second"] for r in reports if r["sustained"]]
+    capacity = max(sustained, default=0.0)
+    print(f"Capacity: {capacity} analyses/s ({capacity * 60:.1f}/min) sustained within a /status p99 of "
+          f"{args.slo_status_p99_ms:.0f} ms and a session p90 of {args.slo_session_p90_seconds:.0f} s")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"capacity_per_second": capacity, "steps": reports}, f, indent=2)
+    worst_stall = max((r["max_stall_seconds"] for r in reports), default=0.0)
+    if args.max_stall_ms is not None and worst_stall * 1000 > args.max_stall_ms:
+        print(f"Event loop stalled for {worst_stall * 1000:.0f} ms (limit {args.max_stall_ms:.0f} ms)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,16 @@
 import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 import os
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from dotenv import load_dotenv
-from api.routes import router
+from api.routes import router, job_queue_wake
+from core.job_worker import run_worker, WORKER_CONCURRENCY
+from core.metrics import monitor_event_loop_lag, start_loop_watchdog
+from core.warmup import WARMUP_ON_STARTUP, warm_up_with_retries
+from core.openai_client import start_openai_client, close_openai_client
 
 load_dotenv()
 
@@ -22,4 +28,70 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.include_router(router, prefix="/api") 
\ No newline at end of file
+# Compress JSON bodies above this size; brotli is used when brotli-asgi is installed (it still
+# falls back to gzip for clients that do not accept br)
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1000"))
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESS_MIN_BYTES)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_BYTES)
+
+app.include_router(router, prefix="/api")
+
+@app.on_event("startup")
+async def start_event_loop_monitor():
+    app.state.loop_lag_task = asyncio.create_task(monitor_event_loop_lag())
+    # Logs the stack of any callback that blocks the loop; stalls are listed at /api/loop-stalls
+    app.state.loop_watchdog_task = start_loop_watchdog()
+
+@app.on_event("shutdown")
+async def stop_event_loop_monitor():
+    tasks = [t for t in (getattr(app.state, "loop_lag_task", None), getattr(app.state, "loop_watchdog_task", None)) if t is not None]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+@app.on_event("startup")
+async def start_warm_up():
+    # Not awaited: the server starts answering immediately and /api/ready reports progress;
+    # failed components keep being retried in the background
+    if WARMUP_ON_STARTUP:
+        app.state.warm_up_task = asyncio.create_task(warm_up_with_retries())
+
+@app.on_event("shutdown")
+async def stop_warm_up():
+    task = getattr(app.state, "warm_up_task", None)
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+@app.on_event("startup")
+async def open_openai_client():
+    # One pooled client for every LLM/embedding caller; connection setup is paid once, not per call
+    try:
+        start_openai_client()
+    except RuntimeError as e:
+        logging.warning(f"OpenAI client not created at startup: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_openai_client():
+    await close_openai_client()
+
+# Run queued jobs inside this API process. Turn off to keep API processes request-only and run
+# `python worker.py` processes instead (any number, sharing the job database)
+RUN_JOBS_IN_API = os.getenv("RUN_JOBS_IN_API", "true").lower() == "true"
+
+@app.on_event("startup")
+async def start_job_worker():
+    # Also picks up jobs left pending/processing by a stopped process; they resume from their last checkpoint
+    if RUN_JOBS_IN_API:
+        app.state.worker_task = asyncio.create_task(run_worker(WORKER_CONCURRENCY, wake=job_queue_wake))
+
+@app.on_event("shutdown")
+async def stop_job_worker():
+    # Running jobs hand their lease back so the next worker resumes them straight away
+    task = getattr(app.state, "worker_task", None)
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,36 @@
+from fastapi.testclient import TestClient
+from api.responses import select_fields, paginate_samples
+from api import routes
+from core import job_store
+from main import app
+
+STATS = {
+    "sentiment_percentages": {"positive": 80.0, "negative": 20.0},
+    "top_keywords": {"positive": ["soft", "cozy", "warm"]},
+    "sample_reviews": {"positive": ["a", "b", "c", "d"]},
+    "keyword_matched_samples": {"positive": {"soft": ["a", "b", "c"]}},
+}
+
+def test_fields_and_sample_pagination():
+    payload = {"sku": "1", "stats": STATS}
+    selected = select_fields(payload, "sku,stats.sample_reviews,stats.missing")
+    assert selected == {"sku": "1", "stats": {"sample_reviews": STATS["sample_reviews"]}}
+    paged = paginate_samples(payload, offset=1, limit=2)
+    assert paged["stats"]["sample_reviews"]["positive"] == ["b", "c"]
+    assert paged["stats"]["keyword_matched_samples"]["positive"]["soft"] == ["b", "c"]
+    assert paged["stats"]["top_keywords"] == STATS["top_keywords"]
+
+def test_results_are_compressed_and_revalidated_with_etag(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_store, "JOB_STORE_DIR", str(tmp_path))
+    routes.jobs["etag-job"] = {"status": "complete", "updated_at": "t1", "aspect_summary": [],
+                               "result": {"sku": "1", "stats": {**STATS, "filler": "x" * 5000}}}
+    client = TestClient(app)
+    first = client.get("/api/results/etag-job", headers={"Accept-Encoding": "gzip"})
+    assert first.status_code == 200
+    assert first.headers["content-encoding"] == "gzip"
+    assert first.json()["stats"]["sample_reviews"]["positive"] == ["a", "b", "c", "d"]
+    again = client.get("/api/results/etag-job", headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+    routes.jobs["etag-job"]["updated_at"] = "t2"
+    assert client.get("/api/results/etag-job", headers={"If-None-Match": first.headers["etag"]}).status_code == 200
+    routes.jobs.pop("etag-job")
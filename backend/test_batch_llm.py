@@ -0,0 +1,78 @@
+import os
+import asyncio
+import core.batch_llm as batch_llm
+import core.openai_client as openai_client
+from core.aspect_extract import batch_llm_extract_aspects
+from core.rate_governor import get_governor
+from core.standins import StandInOpenAI
+
+def _use_standin(tmp_path, monkeypatch):
+    client = StandInOpenAI(latency=0.0, per_item_latency=0.0, batch_dir=str(tmp_path / "provider"), batch_latency=0.05)
+    monkeypatch.setattr(openai_client, "_build_openai_client", lambda: client)
+    monkeypatch.setattr(openai_client, "_client", None)
+    monkeypatch.setattr(batch_llm, "BATCH_DIR", str(tmp_path / "batches"))
+    monkeypatch.setattr(batch_llm, "BATCH_POLL_SECONDS", 0.01)
+    monkeypatch.setattr(batch_llm, "BATCH_COLLECT_SECONDS", 0.05)
+    return client
+
+def test_bulk_mode_answers_every_llm_batch_through_one_offline_batch(tmp_path, monkeypatch):
+    _use_standin(tmp_path, monkeypatch)
+    reviews = [f"Broke after a week, too small #{i}" for i in range(7)] + ["Great quality and the price was right"]
+
+    async def run(mode):
+        batch_llm.current_llm_mode.set(mode)
+        return await batch_llm_extract_aspects(reviews, batch_size=3)
+    interactive = asyncio.run(run("interactive"))
+    bulk = asyncio.run(run("bulk"))
+    assert bulk == interactive and bulk[-1]["aspects"][0]["sentiment"] == "positive"
+    # Three chat requests went out as a single JSONL batch file, mapped back by custom id
+    files = sorted(os.listdir(tmp_path / "batches"))
+    assert len([f for f in files if f.endswith(".input.jsonl")]) == 1 and any(f.endswith(".output.jsonl") for f in files)
+    with open(tmp_path / "batches" / next(f for f in files if f.endswith(".input.jsonl"))) as f:
+        assert len(f.read().splitlines()) == 3
+
+def test_requests_the_batch_cannot_answer_fall_back_to_live_calls(tmp_path, monkeypatch):
+    client = _use_standin(tmp_path, monkeypatch)
+    live_calls = []
+    chat = client.chat.completions.create
+    async def counted_chat(**body):
+        live_calls.append(body)
+        return await chat(**body)
+    client.chat.completions.create = counted_chat
+    messages = [{"role": "system", "content": "summary"}, {"role": "user", "content": "stats"}]
+
+    async def run():
+        batch_llm.current_llm_mode.set("bulk")
+        # The stand-in batch answers a request without messages with a per-request 400
+        rejected = await batch_llm.run_chat_batch([{"model": "m"}, {"model": "m", "messages": messages}])
+        async def broken_batch(**kwargs):
+            raise RuntimeError("batch quota exceeded")
+        client.batches.create = broken_batch
+        return rejected, await batch_llm.chat_completion(get_governor("chat"), 10, model="m", messages=messages)
+    rejected, response = asyncio.run(run())
+    assert rejected[0] is None and "Executive Summary" in rejected[1].choices[0].message.content
+    assert "Executive Summary" in response.choices[0].message.content and len(live_calls) == 1
+
+def test_restarted_job_reattaches_to_its_batch_after_requests_were_merged(tmp_path, monkeypatch):
+    client = _use_standin(tmp_path, monkeypatch)
+    created = []
+    create = client.batches.create
+    async def counted_create(**kwargs):
+        created.append(kwargs)
+        return await create(**kwargs)
+    client.batches.create = counted_create
+    mine = [{"model": "m", "messages": [{"role": "user", "content": f"Broke after a week #{i}"}]} for i in range(2)]
+    theirs = [{"model": "m", "messages": [{"role": "user", "content": "Great quality"}]}]
+
+    async def run():
+        # Two jobs' requests merged into one batch, then the process "restarts" before results arrive
+        merged = asyncio.create_task(batch_llm.run_chat_batch(mine + theirs, job_ids=["job-1", "job-1", "job-2"]))
+        while not os.path.exists(tmp_path / "batches" / "jobs" / "job-1.json"):
+            await asyncio.sleep(0.005)
+        merged.cancel()
+        # The restarted job submits only its own requests, in a different grouping
+        return await batch_llm.run_chat_batch(mine[::-1], job_ids=["job-1", "job-1"])
+    results = asyncio.run(run())
+    assert len(created) == 1 and all(r.choices[0].message.content for r in results)
+    # job-1's requests are answered, so its record is gone; job-2's is kept until it re-attaches
+    assert sorted(os.listdir(tmp_path / "batches" / "jobs")) == ["job-2.json"]
@@ -0,0 +1,40 @@
+import asyncio
+import pytest
+from core.stage_graph import Stage, StageGraph
+from core.checkpoints import StageCheckpoints
+from core import job_store
+
+def test_resume_skips_checkpointed_stages(tmp_path):
+    calls = {"fetch": 0, "flaky": 0}
+    async def fetch(job, sku):
+        calls["fetch"] += 1
+        return {"reviews": [sku]}
+    async def flaky(job, reviews):
+        calls["flaky"] += 1
+        if calls["flaky"] == 1:
+            raise RuntimeError("aspect batch failed")
+        return {"summary": len(reviews)}
+    graph = StageGraph([Stage("fetch", fetch, ("sku",), ("reviews",)),
+                        Stage("flaky", flaky, ("reviews",), ("summary",))], initial_inputs=("sku",))
+    checkpoints = StageCheckpoints("123", {"sampling": "head"}, root=str(tmp_path))
+    job = {}
+    with pytest.raises(RuntimeError):
+        asyncio.run(graph.run({"sku": "123"}, job, checkpoints))
+    assert job["failed_stage"] == "flaky"
+    assert checkpoints.completed_stages() == ["fetch"]
+    job = {}
+    state = asyncio.run(graph.run({"sku": "123"}, job, checkpoints))
+    assert state["summary"] == 1
+    assert calls == {"fetch": 1, "flaky": 2}
+    assert job["resumed_stages"] == ["fetch"]
+
+def test_job_state_machine_persists_and_rejects_bad_transitions(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_store, "JOB_STORE_DIR", str(tmp_path))
+    job = {"status": "pending", "sku": "123", "reviews": [1, 2]}
+    job_store.set_status("j1", job, "processing")
+    job_store.set_status("j1", job, "failed", error="boom", failed_stage="embed_classify")
+    loaded = job_store.load_jobs()["j1"]
+    assert loaded["status"] == "failed" and loaded["failed_stage"] == "embed_classify"
+    assert "reviews" not in loaded
+    with pytest.raises(job_store.InvalidTransition):
+        job_store.set_status("j1", job, "complete")
@@ -0,0 +1,40 @@
+import numpy as np
+from datetime import datetime
+from core.review_table import ReviewTable
+from core.cube import build_cube, save_cube, load_cube
+from core.stats_build import build_stats_summary, calculate_aspect_trend
+
+def _job():
+    text = ReviewTable.from_columns({"product_rating": [5, 1, 1, 4], "clean": ["love it", "broke", "broke fast", "ok"],
+                                     "created_date": [datetime(2024, 1, 3), "2024-02-10", "2024-02-11", None]})
+    text = text.with_sentiments(["positive", "negative", "negative", "positive"])
+    rating_only = ReviewTable.from_columns({"product_rating": [2], "created_date": ["2024-01-20"]}).with_sentiments(["negative"])
+    aspects = [{"aspects": [{"aspect": "Quality", "sentiment": "positive"}]},
+               {"aspects": [{"aspect": "durability", "sentiment": "negative"}, {"aspect": "quality", "sentiment": "negative"}]},
+               {"aspects": [{"aspect": "durability", "sentiment": "negative"}], "weight": 2.0},
+               {"aspects": []}]
+    return text, rating_only, aspects
+
+def test_slices_match_the_fixed_views():
+    text, rating_only, aspects = _job()
+    cube = build_cube(text, rating_only, aspects)
+    stats = build_stats_summary(list(text) + list(rating_only), {}, {}, 1)
+    by_sentiment = cube.slice(["sentiment"])
+    assert {r["sentiment"]: r["count"] for r in by_sentiment["rows"]} == stats["sentiment_counts"]
+    trends = {}
+    for row in cube.slice(["month", "sentiment"], measure="reviews", since="2000-01")["rows"]:
+        trends.setdefault(row["month"], {})[row["sentiment"]] = row["count"]
+    assert trends == stats["time_trends"]
+    expected = calculate_aspect_trend(aspects, text)
+    assert {(r["aspect"], r["month"], r["sentiment"]): r["count"] for r in cube.slice(["month", "sentiment", "aspect"])["rows"]} == \
+        {(a, m, s): c for a, months in expected.items() for m, counts in months.items() for s, c in counts.items()}
+
+def test_filters_and_round_trip(tmp_path):
+    text, rating_only, aspects = _job()
+    save_cube("1", {}, build_cube(text, rating_only, aspects), root=str(tmp_path))
+    cube = load_cube("1", {}, root=str(tmp_path))
+    assert cube.labels["aspect"] == ["durability", "quality"] and cube.labels["month"][-1] is None
+    one_star = cube.slice(["aspect"], filters={"rating": ["1"]}, top_aspects=1)
+    assert one_star["measure"] == "mentions" and one_star["rows"] == [{"aspect": "durability", "count": 3}]
+    assert cube.slice(["rating"], filters={"sentiment": ["negative"]}, since="2024-02")["rows"] == [{"rating": 1, "count": 2}]
+    assert cube.reviews.dtype == np.float32 and cube.slice()["total"] == 5
@@ -0,0 +1,55 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from core.embedding_providers import EmbeddingProvider, LocalEmbeddingProvider, get_embedding_provider
+from core.openai_client import classifier_model_path
+
+class _LengthEmbedder(LocalEmbeddingProvider):
+    """Local provider whose "model" maps a text to [len, 1]: checks batching and ordering without ONNX."""
+    def _load(self):
+        self._executor = self._executor or ThreadPoolExecutor(max_workers=2)
+
+    def _embed_batch(self, texts):
+        self.batches.append([len(t) for t in texts])
+        return np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+
+def test_local_provider_batches_by_length_and_keeps_input_order():
+    provider = _LengthEmbedder(batch_size=2)
+    provider.batches = []
+    texts = ["ccc", "a", "", "dddd", "bb"]
+    embeddings = asyncio.run(provider.embed(texts))
+    assert isinstance(embeddings, np.ndarray) and embeddings.dtype == np.float32
+    assert embeddings[:, 0].tolist() == [3, 1, 4, 2]
+    # Similar lengths share a batch, so little padding is wasted
+    assert sorted(provider.batches) == [[1, 2], [3, 4]]
+
+def test_openai_embeddings_arrive_as_one_float32_matrix_in_input_order(tmp_path, monkeypatch):
+    from core import openai_client
+    from core.standins import StandInOpenAI, _embedding
+    monkeypatch.setattr(openai_client, "_build_openai_client", lambda: StandInOpenAI(latency=0.0, batch_dir=str(tmp_path)))
+    monkeypatch.setattr(openai_client, "_client", None)
+    texts = [f"review {i}" for i in range(5)]
+    embeddings = asyncio.run(openai_client.embed_texts(texts, dimensions=8))
+    assert embeddings.dtype == np.float32 and embeddings.shape == (5, 8)
+    assert np.allclose(embeddings[3], _embedding("review 3", 8))
+
+def test_classifier_artifacts_are_tagged_per_provider():
+    assert classifier_model_path(512).endswith("logreg_sentiment_d512.pkl")
+    assert classifier_model_path(384, "local").endswith("logreg_sentiment_local_d384.pkl")
+    assert get_embedding_provider("local") is get_embedding_provider("LOCAL")
+    with pytest.raises(TypeError):
+        EmbeddingProvider()
+
+def test_analysis_params_key_checkpoints_by_embedding_model_and_dimension(monkeypatch):
+    from core import embedding_providers
+    from core.checkpoints import input_hash
+    from core.langgraph_pipeline import analysis_params
+    hashes = set()
+    for provider in (embedding_providers.OpenAIEmbeddingProvider(512), embedding_providers.OpenAIEmbeddingProvider(256),
+                     LocalEmbeddingProvider(model_dir="models/bge-small"), LocalEmbeddingProvider(model_dir="models/minilm")):
+        monkeypatch.setitem(embedding_providers._providers, provider.name, provider)
+        params = analysis_params("head", 100, None, provider.name)
+        hashes.add(input_hash("123", params))
+    assert len(hashes) == 4
+    assert params["embedding_model"] == "minilm" and "embedding_dimensions" not in params
@@ -0,0 +1,38 @@
+from core.query_loader import build_query
+from core.fetch_reviews import fetch_reviews, fetch_product_info
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows, self.executed = rows, []
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+    def fetchmany(self, n):
+        rows, self.rows = self.rows[:n], self.rows[n:]
+        return rows
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+    def close(self):
+        pass
+
+class FakeConn:
+    def __init__(self, rows):
+        self.cursor_obj = FakeCursor(rows)
+    def cursor(self):
+        return self.cursor_obj
+
+def test_sku_is_bound_not_formatted_and_filters_push_down():
+    sku = "123' or '1'='1"
+    sql, params = build_query("fetch_reviews", {"sku": sku, "min_rating": 4, "limit": 100, "end_date": None})
+    assert sku not in sql and "%(sku)s" in sql
+    assert "RATING >= %(min_rating)s" in sql and "limit %(limit)s" in sql
+    assert "end_date" not in sql and "end_date" not in params
+    assert "product_name" not in sql
+
+def test_fetch_reviews_streams_review_columns_only():
+    conn = FakeConn([("123", "great", 5, "2024-01-02"), ("123", "bad", 1, "2024-02-03")])
+    reviews = list(fetch_reviews("123", batch_size=1, conn=conn, start_date="2024-01-01"))
+    assert reviews[1] == {"sku": "123", "customer_review": "bad", "product_rating": 1, "created_date": "2024-02-03"}
+    query, params = conn.cursor_obj.executed[0]
+    assert params == {"sku": "123", "start_date": "2024-01-01"}
+    info = fetch_product_info("123", conn=FakeConn([("Dog", "Toys", "Balls", "desc", "Ball", 9, "https://x")]))
+    assert info["product_name"] == "Ball" and info["mc1"] == "Dog"
@@ -0,0 +1,26 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+
+pytest.importorskip("fastapi")
+
+# Cold-start budget for importing the API (fresh interpreter, warm disk cache)
+IMPORT_TIME_BUDGET_SECONDS = 1.0
+HEAVY_MODULES = ["keybert", "torch", "sentence_transformers", "langgraph", "bs4", "ftfy", "langdetect",
+                 "spellchecker", "nltk", "tiktoken", "sklearn", "pandas", "snowflake", "openai"]
+
+def test_api_import_is_within_budget_and_skips_heavy_modules():
+    script = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import main\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    out = subprocess.run([sys.executable, "-c", script], cwd=os.path.dirname(os.path.abspath(__file__)),
+                         env={**os.environ, "WARMUP_ON_STARTUP": "false"}, capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    assert result["loaded"] == []
+    assert result["seconds"] < IMPORT_TIME_BUDGET_SECONDS, f"API import took {result['seconds']:.2f}s"
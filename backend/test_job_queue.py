@@ -0,0 +1,76 @@
+from core import job_store
+
+def test_queued_job_is_claimed_once_and_taken_over_after_lease_expiry(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_store, "JOB_STORE_DIR", str(tmp_path))
+    job = {"status": "pending", "sku": "123", "created_at": "2026-01-01T00:00:00"}
+    job_store.save_job("j1", job)
+    job_store.enqueue_job("j1")
+    assert job_store.count_queue() == {"leased": 0, "waiting": 1}
+    assert job_store.claim_job("worker-a", lease_seconds=60) == "j1"
+    assert job_store.claim_job("worker-b", lease_seconds=60) is None
+    assert job_store.count_queue() == {"leased": 1, "waiting": 0}
+    # worker-a dies without renewing: once its lease has run out, worker-b resumes the job
+    assert job_store.renew_lease("j1", "worker-a", lease_seconds=-1)
+    assert job_store.claim_job("worker-b", lease_seconds=60) == "j1"
+    assert not job_store.renew_lease("j1", "worker-a", lease_seconds=60)
+    job_store.set_status("j1", job, "processing")
+    job_store.set_status("j1", job, "complete", result={"sku": "123"})
+    assert not job_store.is_queued("j1")
+    assert job_store.claim_job("worker-c", lease_seconds=60) is None
+    assert job_store.load_job("j1")["result"] == {"sku": "123"}
+    assert job_store.count_jobs_by_status() == {"complete": 1} and job_store.count_queue() == {"leased": 0, "waiting": 0}
+
+def test_worker_that_loses_its_lease_stops_the_job(tmp_path, monkeypatch):
+    import asyncio
+    from core import job_worker
+    monkeypatch.setattr(job_store, "JOB_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(job_worker, "JOB_LEASE_SECONDS", 0.15)
+    job_store.save_job("j2", {"status": "processing", "sku": "123", "created_at": "2026-01-01T00:00:00"})
+    job_store.enqueue_job("j2")
+    assert job_store.claim_job("worker-a", lease_seconds=60) == "j2"
+    cancelled = []
+    async def long_analysis(job_id, job):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(job_id)
+            raise
+    monkeypatch.setattr(job_worker, "run_analysis_async", long_analysis)
+    # worker-b takes the job over while worker-a is still running it
+    job_store.renew_lease("j2", "worker-a", lease_seconds=-1)
+    assert job_store.claim_job("worker-b", lease_seconds=60) == "j2"
+    asyncio.run(asyncio.wait_for(job_worker.run_claimed_job("j2", "worker-a"), 2))
+    assert cancelled == ["j2"] and job_store.renew_lease("j2", "worker-b", lease_seconds=60)
+
+def test_progress_saves_run_off_the_loop_and_coalesce(monkeypatch):
+    import time
+    import asyncio
+    from core import job_worker
+    saved = []
+    def slow_save(job_id, record):
+        time.sleep(0.1)  # a locked database
+        saved.append(record["step"])
+    monkeypatch.setattr(job_worker, "save_job", slow_save)
+    async def run():
+        job = {"status": "processing", "sku": "123", "step": 1}
+        publisher = job_worker.ProgressPublisher("j3", job)
+        publisher()
+        await asyncio.sleep(0.01)
+        start = time.perf_counter()
+        for step in range(2, 6):
+            job["step"] = step
+            publisher()
+        assert time.perf_counter() - start < 0.05  # stages never wait on the save
+        await asyncio.sleep(0.3)
+        await publisher.close()
+        publisher()
+        await asyncio.sleep(0.15)
+    asyncio.run(run())
+    assert saved == [1, 5]
+
+def test_job_gauges_are_replaced_whole():
+    from core.metrics import Gauge
+    gauge = Gauge("test_jobs", "Test gauge.", ("status",))
+    gauge.replace({("failed",): 2, ("complete",): 5})
+    gauge.replace({("complete",): 6})
+    assert gauge.render()[2:] == ['test_jobs{status="complete"} 6']
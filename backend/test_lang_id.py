@@ -0,0 +1,30 @@
+from core.lang_id import detect_languages, detect_language
+
+def test_short_and_plain_english_reviews_are_english():
+    texts = ["Love it", "Perfect", "Great product, my dog loves it!!", "Not worth the money"]
+    assert detect_languages(texts) == ["en"] * len(texts)
+
+def test_english_reviews_outside_the_word_list_stay_english():
+    texts = ["Excellent quality, sturdy construction, highly recommended!", "Horrible odor, vet said avoid",
+             "Ordered medium, fits perfectly", "Veterinarian recommended; digestion improved dramatically",
+             "Café-style bowl, très chic, dog approved", "My puppy’s favorite toy — she won’t put it down"]
+    assert detect_languages(texts) == ["en"] * len(texts)
+
+def test_common_review_languages():
+    texts = [
+        "Muy bueno, a mi perro le encanta",
+        "Mon chien adore ces croquettes",
+        "Sehr gutes Futter, mein Hund frisst es gerne",
+        "Il mio cane lo adora",
+        "Отличный корм",
+        "Mi gato está feliz con esta comida",
+        "Meu cachorro adorou a ração, muito bom",
+        "Mijn kat vindt het heerlijk, echt een aanrader",
+    ]
+    assert detect_languages(texts) == ["es", "fr", "de", "it", "ru", "es", "pt", "nl"]
+
+def test_blank_text_is_unknown_and_results_are_deterministic():
+    assert detect_language("") == "unknown"
+    assert detect_language("!!!") == "unknown"
+    texts = ["Excelente producto", "de beste voer voor mijn hond"]
+    assert detect_languages(texts) == detect_languages(texts)
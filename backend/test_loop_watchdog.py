@@ -0,0 +1,19 @@
+import time
+import asyncio
+from core.metrics import LoopWatchdog
+
+def _blocking_callback():
+    time.sleep(0.3)
+
+def test_watchdog_reports_blocking_callback_with_stack():
+    watchdog = LoopWatchdog(0.05)
+    async def main():
+        task = asyncio.create_task(watchdog.run())
+        await asyncio.sleep(0.1)
+        _blocking_callback()
+        await asyncio.sleep(0.1)
+        task.cancel()
+    asyncio.run(main())
+    assert watchdog.count == 1
+    stall = watchdog.report()["stalls"][0]
+    assert "_blocking_callback" in stall["stack"] and 0.2 < stall["blocked_seconds"] < 2.0  # loose: slow runners overshoot
@@ -0,0 +1,31 @@
+import pickle
+import numpy as np
+from core.model_selection import Candidate, candidate_grid, expected_calibration_error, fit_candidate, serving_cost, pareto_front, pick_winner
+
+def _data(n=240, dim=32, seed=0):
+    rng = np.random.RandomState(seed)
+    y = np.arange(n) % 3
+    X = rng.randn(n, dim) + 2 * np.eye(3, dim)[y]
+    return X.astype(np.float32), y
+
+def test_calibrated_svm_exports_a_servable_probability_model():
+    X, y = _data()
+    result = fit_candidate(Candidate("svm", 16, {"C": 1.0}), X[:180], y[:180], X[180:], y[180:])
+    assert result["accuracy"] > 0.6 and 0 <= result["ece"] <= 1
+    clf = pickle.loads(result["artifact"])
+    # The serving path needs predict_proba, classes_ and the reduced input width
+    assert clf.predict_proba(np.zeros((2, 16), dtype=np.float32)).shape == (2, 3) and list(clf.classes_) == [0, 1, 2]
+    cost = serving_cost(result["artifact"], 16, repeats=1)
+    assert cost["model_bytes"] == len(result["artifact"]) and cost["predict_ms_per_10k"] > 0
+
+def test_ece_and_winner_selection():
+    confident_right = np.array([[0.9, 0.05, 0.05]] * 10)
+    # Always right at 90% confidence: under-confident by 0.1
+    assert abs(expected_calibration_error(confident_right, np.zeros(10, dtype=int)) - 0.1) < 1e-9
+    rows = [{"model": "big", "macro_f1": 0.90, "predict_ms_per_10k": 100.0, "model_bytes": 10},
+            {"model": "tie", "macro_f1": 0.899, "predict_ms_per_10k": 10.0, "model_bytes": 10},
+            {"model": "slow_worse", "macro_f1": 0.80, "predict_ms_per_10k": 200.0, "model_bytes": 10}]
+    assert pareto_front(rows) == ["big", "tie"]
+    assert pick_winner(rows)["model"] == "tie"
+    assert pick_winner(rows[::2], max_predict_ms=150)["model"] == "big"
+    assert len(candidate_grid([256, 512], [0.1, 1.0])) == 8
@@ -0,0 +1,39 @@
+import numpy as np
+from core import near_dedup
+from core.near_dedup import near_duplicate_representatives, collapse_near_duplicates
+
+def test_templated_variations_collapse_to_first_review():
+    texts = [
+        "Great product, my dog loves it!!",
+        "Great product my dog loves it!",
+        "great product, my dog loves it",
+        "The zipper broke after two days and customer service never replied.",
+        "",
+    ]
+    rep_of = near_duplicate_representatives(texts)
+    assert rep_of[:3] == [0, 0, 0]
+    assert rep_of[3] == 3
+    assert rep_of[4] == 4
+
+def test_distinct_reviews_are_kept_apart():
+    texts = [
+        "Arrived quickly and the bed is very soft.",
+        "Too small for my large dog, had to return it.",
+        "My cat ignores this toy completely.",
+    ]
+    rep_of, report = collapse_near_duplicates(texts)
+    assert rep_of == [0, 1, 2]
+    assert report["collapsed"] == 0
+
+def test_near_duplicates_sharing_a_bucket_with_an_unrelated_first_member_are_merged(monkeypatch):
+    # A, B and C agree on 113 of 128 minhashes but share only band 0, whose bucket an unrelated
+    # review (first in order) also falls into: comparing only against it merged nothing
+    base = np.arange(128, dtype=np.uint64)
+    b, c = base.copy(), base.copy()
+    b[8::8] += 1000
+    c[8::8] += 2000
+    odd = np.arange(10000, 10128, dtype=np.uint64)
+    odd[:8] = base[:8]
+    signatures = {"odd": odd, "a": base, "b": b, "c": c}
+    monkeypatch.setattr(near_dedup, "minhash_signature", lambda text: signatures[text])
+    assert near_duplicate_representatives(["odd", "a", "b", "c"]) == [0, 1, 1, 1]
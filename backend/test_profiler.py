@@ -0,0 +1,30 @@
+from core.profiler import JobProfiler, load_profile, to_collapsed, to_speedscope
+from core.metrics import time_stage
+
+def _busy_loop(n=400000):
+    return sum(i * i for i in range(n))
+
+def test_profile_records_stages_and_stacks(tmp_path):
+    profiler = JobProfiler("job-1", "123", interval_ms=1)
+    job = {"profiler": profiler}
+    profiler.start()
+    with time_stage(job, "stats_build"):
+        for _ in range(5):
+            _busy_loop()
+        data = [bytearray(1 << 20) for _ in range(4)]
+    profiler.stop_and_save(root=str(tmp_path))
+    del data
+    profile = load_profile("job-1", root=str(tmp_path))
+    stage = profile["stages"][0]
+    assert stage["stage"] == "stats_build" and stage["wall_seconds"] > 0 and stage["process_cpu_seconds"] > 0
+    assert stage["peak_traced_bytes"] - stage["start_traced_bytes"] >= 4 << 20
+    assert "_busy_loop" in to_collapsed(profile)
+    speedscope = to_speedscope(profile)
+    frames = speedscope["shared"]["frames"]
+    assert any("_busy_loop" in frames[i]["name"] for p in speedscope["profiles"] for s in p["samples"] for i in s)
+
+def test_stage_timing_without_profiler():
+    job = {}
+    with time_stage(job, "clean"):
+        pass
+    assert job["stage_timings"][0]["stage"] == "clean" and "profiler" not in job
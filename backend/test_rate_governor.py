@@ -0,0 +1,62 @@
+import asyncio
+from core.rate_governor import RateGovernor, gather_or_cancel
+
+class RateLimited(Exception):
+    status_code = 429
+
+def test_429s_are_retried_and_halve_concurrency():
+    async def run():
+        governor = RateGovernor("test", rpm=6000, tpm=10**7, initial_concurrency=8)
+        calls = {"n": 0}
+        async def flaky():
+            calls["n"] += 1
+            if calls["n"] <= 2:
+                raise RateLimited()
+            return "ok"
+        result = await governor.call(flaky, est_tokens=10)
+        return result, calls["n"], governor.limit
+    result, attempts, limit = asyncio.run(run())
+    assert result == "ok" and attempts == 3
+    assert limit < 8
+
+def test_waiting_jobs_are_served_fairly_and_by_priority():
+    async def run():
+        governor = RateGovernor("test", rpm=6000, tpm=10**7, initial_concurrency=1, max_concurrency=1)
+        order = []
+        async def work(tag):
+            order.append(tag)
+            await asyncio.sleep(0)
+        await governor.acquire(1, job_id="busy")  # hold the only slot while the queue fills up
+        tasks = [asyncio.create_task(governor.call(lambda t=f"big{i}": work(t), 1, job_id="big")) for i in range(3)]
+        tasks += [asyncio.create_task(governor.call(lambda: work("small"), 1, job_id="small"))]
+        tasks += [asyncio.create_task(governor.call(lambda: work("urgent"), 1, job_id="ui", priority=0))]
+        await asyncio.sleep(0.01)
+        governor.release(0.1, 1, 1)
+        await asyncio.gather(*tasks)
+        return order
+    order = asyncio.run(run())
+    assert order[0] == "urgent"
+    assert order.index("small") <= 2
+
+def test_cancelled_calls_release_their_slot_and_failed_fan_outs_cancel_siblings():
+    async def run():
+        governor = RateGovernor("test", rpm=6000, tpm=10**7, initial_concurrency=4)
+        started = asyncio.Event()
+        async def hang():
+            started.set()
+            await asyncio.sleep(60)
+        task = asyncio.create_task(governor.call(hang, 1))
+        await started.wait()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        leaked = governor.in_flight
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("bad batch")
+        sibling = asyncio.ensure_future(governor.call(hang, 1))
+        try:
+            await gather_or_cancel(governor.call(fail, 1, max_attempts=1), sibling)
+        except ValueError:
+            pass
+        return leaked, sibling.cancelled(), governor.in_flight
+    assert asyncio.run(run()) == (0, True, 0)
@@ -0,0 +1,47 @@
+import glob
+import numpy as np
+import pyarrow.parquet as pq
+from core.result_store import ResultWriter, save_result, load_result, save_summary, compact_results
+from core.query_loader import build_query
+
+def _job():
+    stats = {"sentiment_counts": {"positive": np.int64(7), "negative": 3}, "top_keywords": {"positive": ["toy"]}}
+    return {"result": {"sku": "123", "product_info": {"mc1": "Dog", "product_name": "Ball"}, "stats": stats},
+            "aspect_summary": [{"aspect": "durability", "positive": 40.0}], "gpt_summary": "Dogs love it."}
+
+def test_stored_result_round_trips_per_params_and_expires(tmp_path):
+    params = {"sampling": "head", "sample_size": 15000, "filters": {}, "embedding_provider": "openai"}
+    save_result("123", params, _job(), "batch", root=str(tmp_path))
+    stored = load_result("123", params, root=str(tmp_path))
+    assert stored["result"]["stats"]["sentiment_counts"] == {"positive": 7, "negative": 3}
+    assert stored["aspect_summary"][0]["aspect"] == "durability" and stored["gpt_summary"] == "Dogs love it."
+    assert stored["review_count"] == 10 and stored["mc1"] == "Dog" and stored["source"] == "batch"
+    assert load_result("123", {**params, "sampling": "stratified"}, root=str(tmp_path)) is None
+    assert load_result("123", params, max_age_hours=0, root=str(tmp_path)) is None
+
+def test_summary_update_keeps_computed_at_and_compaction_keeps_newest_rows(tmp_path):
+    root = str(tmp_path)
+    params = {"sampling": "head", "sample_size": 15000, "filters": {"limit": 5}, "embedding_provider": "openai"}
+    writer = ResultWriter(root, flush_rows=3)
+    for sku in ("1", "2", "3", "4"):
+        writer.add(sku, params, {**_job(), "gpt_summary": None}, "batch")
+    writer.flush()
+    first = load_result("1", params, root=root)
+    assert first["gpt_summary"] is None and first["result"]["stats"]["top_keywords"] == {"positive": ["toy"]}
+    assert save_summary("1", params, "Fetch-worthy.", computed_at=first["computed_at"], root=root)
+    assert not save_summary("1", params, "Stale.", computed_at="2020-01-01T00:00:00+00:00", root=root)
+    assert not save_summary("9", params, "Nothing stored.", root=root)
+    updated = load_result("1", params, root=root)
+    assert updated["gpt_summary"] == "Fetch-worthy." and updated["computed_at"] == first["computed_at"]
+    assert compact_results(root) == 4
+    parts = glob.glob(str(tmp_path / "bucket=*" / "part-*.parquet"))
+    assert len(parts) == len({p.rsplit("/", 2)[1] for p in parts})  # one file per bucket
+    assert load_result("1", params, root=root)["gpt_summary"] == "Fetch-worthy."
+    # Real, typed columns: the store can be scanned without parsing JSON
+    columns = pq.read_table(parts[0], columns=["negative_count", "top_keywords"]).schema
+    assert str(columns.field("negative_count").type) == "int64" and "map" in str(columns.field("top_keywords").type)
+
+def test_category_query_groups_after_filters():
+    sql, params = build_query("list_category_skus", {"mc1": "Dog", "mc2": None, "min_reviews": 5, "limit": 10})
+    assert sql.index("%(mc1)s") < sql.index("group by") < sql.index("limit %(limit)s")
+    assert "%(mc2)s" not in sql and params == {"mc1": "Dog", "min_reviews": 5, "limit": 10}
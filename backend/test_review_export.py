@@ -0,0 +1,47 @@
+import io
+import json
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from datetime import date, datetime
+from core.review_table import ReviewTable
+from core.review_export import write_review_export, iter_ndjson, iter_parquet
+
+def _export(path):
+    text = ReviewTable.from_columns({"customer_review": ["Great!", "great", "Bad toy"], "product_rating": [5, 5, None],
+                                     "created_date": [datetime(2024, 1, 1), "2024-02-01", None]})
+    text = text.with_columns(clean=["great", "great", "bad toy"], sentiment_source="text")
+    probabilities = np.array([[0.1, 0.1, 0.8], [0.1, 0.1, 0.8], [0.7, 0.2, 0.1]], dtype=np.float32)
+    text = text.with_classification(np.eye(2, 4, dtype=np.float32), [0, 0, 1], ["positive", "positive", "negative"], probabilities,
+                                    [0, 1, 2], rep_of=[0, 0, 2])
+    rating_only = ReviewTable.from_columns({"product_rating": [2]}).with_columns(sentiment_source="rating_only").with_sentiments(["negative"])
+    aspects = [{"aspects": [{"aspect": "Quality", "sentiment": "positive"}]}] * 2 + [{"aspects": [{"aspect": "durability", "sentiment": "negative"}]}]
+    return write_review_export(path, text, rating_only, aspects, chunk_rows=2)
+
+def test_ndjson_rows_stream_in_chunks(tmp_path):
+    path = str(tmp_path / "export.parquet")
+    assert _export(path) == 4 and pq.ParquetFile(path).num_row_groups == 3
+    chunks = list(iter_ndjson(path, chunk_rows=2))
+    assert len(chunks) > 1 and all(len(chunk.splitlines()) <= 2 for chunk in chunks)
+    rows = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+    assert [r["review_index"] for r in rows] == [0, 1, 2, 3]
+    assert rows[0]["prob_positive"] == 0.8 and rows[0]["duplicate_count"] == 2 and rows[1]["near_duplicate_of"] == 0
+    assert rows[0]["aspects"] == [{"aspect": "quality", "sentiment": "positive"}]
+    assert rows[3]["source"] == "rating_only" and rows[3]["prob_positive"] is None and rows[3]["aspects"] == []
+
+def test_filters_and_columns_apply_to_both_formats(tmp_path):
+    path = str(tmp_path / "export.parquet")
+    _export(path)
+    lines = b"".join(iter_ndjson(path, ["review_index"], {"aspect": ["Quality"], "min_rating": 5, "since": datetime(2024, 1, 15)})).splitlines()
+    assert [json.loads(line) for line in lines] == [{"review_index": 1}]
+    data = b"".join(iter_parquet(path, ["review_index", "sentiment"], {"sentiment": ["negative"]}, chunk_rows=1))
+    assert pq.read_table(io.BytesIO(data)).to_pylist() == [{"review_index": 2, "sentiment": "negative"}, {"review_index": 3, "sentiment": "negative"}]
+
+def test_missing_and_date_typed_created_dates(tmp_path):
+    path = str(tmp_path / "export.parquet")
+    table = ReviewTable.from_columns({"customer_review": ["a", "b", "c"], "product_rating": [5, 4, 3],
+                                      "created_date": [pd.NaT, date(2024, 3, 5), float("nan")]})
+    table = table.with_columns(clean=["a", "b", "c"], sentiment_source="text").with_sentiments(["positive"] * 3)
+    empty = ReviewTable.from_columns({"product_rating": []}).with_sentiments([])
+    assert write_review_export(path, table, empty, None) == 3
+    assert pq.read_table(path, columns=["created_date"]).column(0).to_pylist() == [None, datetime(2024, 3, 5), None]
@@ -0,0 +1,31 @@
+import numpy as np
+from core.review_table import ReviewTable
+from core.vector_index import build_review_index
+from core.stats_build import build_stats_summary
+
+def _classified():
+    table = ReviewTable.from_columns({"customer_review": ["Great!", "great", "Bad toy"], "product_rating": [5.0, 5, float("nan")]})
+    table = table.with_columns(clean=["great", "great", "bad toy"], sentiment_source="text")
+    embeddings = np.eye(2, 4, dtype=np.float32)
+    probabilities = np.array([[0.1, 0.1, 0.8], [0.1, 0.1, 0.8], [0.7, 0.2, 0.1]], dtype=np.float32)
+    return table.with_classification(embeddings, [0, 0, 1], ["positive", "positive", "negative"], probabilities, [0, 1, 2], rep_of=[0, 0, 2])
+
+def test_views_read_like_the_legacy_review_dicts():
+    table = _classified()
+    rep, dup, other = table
+    assert rep["product_rating"] == 5 and other["product_rating"] is None and rep["sentiment"] == "positive"
+    assert rep["duplicate_count"] == 2 and "near_duplicate_of" not in rep and dup["near_duplicate_of"] == 0
+    assert list(rep["sentiment_probabilities"]) == ["0", "1", "2"] and abs(rep["sentiment_probabilities"]["2"] - 0.8) < 1e-6
+    # Near-duplicates share their representative's embedding row instead of copying it
+    assert np.shares_memory(rep["embedding"], dup["embedding"]) and table.embeddings.dtype == np.float32
+    assert table.product_rating.dtype == np.int8 and table.sentiment.dtype == np.int8
+    assert "embedding" not in table.records()[0] and table.records()[2]["clean"] == "bad toy"
+
+def test_consumers_accept_tables():
+    table = _classified()
+    index = build_review_index(table)
+    assert sorted(index.input_ids.tolist()) == [0, 2]
+    rating_only = ReviewTable.from_columns({"product_rating": [2]}).with_columns(clean=None).with_sentiments(["negative"])
+    stats = build_stats_summary(list(table) + list(rating_only), {}, {}, 2)
+    assert stats["sentiment_counts"] == {"positive": 2, "negative": 2}
+    assert stats["star_rating_distribution"] == {"5": 2, "2": 1}
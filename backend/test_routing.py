@@ -0,0 +1,30 @@
+import random
+from core.routing import route_reviews, routed_result, ROUTE_DEFAULT, ROUTE_LLM, ROUTE_SAMPLED, ROUTE_SAMPLE_SKIPPED
+from core.stats_build import aggregate_aspect_sentiment
+
+def _review(text, confidence):
+    return {"clean": text, "sentiment_probabilities": {"positive": confidence, "negative": 1 - confidence}}
+
+def test_routes_follow_confidence_length_and_aspect_cues():
+    reviews = [
+        _review("love it", 0.97),
+        _review("love it", 0.55),
+        _review("the zipper broke and the fabric ripped after a week", 0.97),
+        _review("love it", 0.97),
+    ]
+    routes, report = route_reviews(reviews, rep_of=[0, 1, 2, 0], enabled=True)
+    assert routes == [ROUTE_DEFAULT, ROUTE_LLM, ROUTE_LLM, None]
+    assert report["skipped_reviews"] == 1 and report["representatives"] == 3
+
+def test_sampled_aspects_are_reweighted_to_stay_unbiased():
+    rng = random.Random(0)
+    reviews, results = [], []
+    for i in range(2000):
+        sentiment = "positive" if rng.random() < 0.7 else "negative"
+        reviews.append({"clean": f"review {i}"})
+        route = ROUTE_SAMPLED if rng.random() < 0.25 else ROUTE_SAMPLE_SKIPPED
+        llm = {"aspects": [{"aspect": "taste", "sentiment": sentiment}]}
+        results.append(routed_result(route, llm if route == ROUTE_SAMPLED else None, sample_rate=0.25))
+    summary = aggregate_aspect_sentiment(results, reviews, top_n=1, samples_per_aspect=1)[0]
+    assert abs(summary["mentions"] - 2000) < 200
+    assert abs(summary["positive"] - 70) < 5
@@ -0,0 +1,71 @@
+import weakref
+from collections import Counter
+from core.sampling import stratified_reservoir_sample, allocate_proportional, head_sample, stratum_sizes_from_counts
+from core.standins import StandInSnowflake
+from core.fetch_reviews import fetch_reviews, fetch_review_strata
+from core.stats_build import build_stats_summary
+
+def _reviews(n):
+    # 80% five-star, 20% one-star, spread over three months
+    for i in range(n):
+        rating = 5 if i % 5 else 1
+        yield {"customer_review": f"review {i}", "product_rating": rating,
+               "created_date": f"2024-0{1 + i % 3}-15", "sentiment": "positive" if rating == 5 else "negative"}
+
+def test_allocation_hits_target_and_keeps_every_stratum():
+    alloc = allocate_proportional({"a": 9000, "b": 900, "c": 100}, 1000)
+    assert sum(alloc.values()) == 1000
+    assert alloc["a"] == 900 and alloc["c"] >= 1
+
+def test_stratified_sample_is_proportional_and_weighted():
+    sample, report = stratified_reservoir_sample(_reviews(10000), 1000, seed="SKU1")
+    assert report["population"] == 10000
+    assert len(sample) == 1000
+    ratings = Counter(r["product_rating"] for r in sample)
+    assert ratings[5] == 800 and ratings[1] == 200
+    assert abs(sum(r["sample_weight"] for r in sample) - 10000) < 1e-6
+
+def test_stratified_sample_is_deterministic_per_seed():
+    first, _ = stratified_reservoir_sample(_reviews(2000), 100, seed="SKU1")
+    second, _ = stratified_reservoir_sample(_reviews(2000), 100, seed="SKU1")
+    assert [r["customer_review"] for r in first] == [r["customer_review"] for r in second]
+
+def test_stats_are_scaled_estimates_with_intervals():
+    sample, report = stratified_reservoir_sample(_reviews(10000), 1000, seed="SKU1")
+    stats = build_stats_summary(sample, {}, {}, sampling=report)
+    assert stats["sentiment_counts"] == {"positive": 8000, "negative": 2000}
+    ci = stats["sentiment_percentage_ci"]["positive"]
+    assert ci["low"] < 80.0 < ci["high"]
+    assert stats["sampling"]["mode"] == "stratified"
+
+class _Row(dict):
+    __slots__ = ("__weakref__",)
+
+def test_reservoirs_hold_at_most_the_target_while_streaming():
+    conn = StandInSnowflake(reviews_per_sku=20000, latency=0)
+    sizes = stratum_sizes_from_counts(fetch_review_strata("SKU2", conn=conn))
+    assert len(sizes) > 100 and sum(sizes.values()) == 20000  # 5 ratings x 30 months
+    live, peak = [0], [0]
+    def released():
+        live[0] -= 1
+    def rows():
+        for review in fetch_reviews("SKU2", conn=conn):
+            row = _Row(review)
+            live[0] += 1
+            weakref.finalize(row, released)
+            peak[0] = max(peak[0], live[0])
+            del review
+            yield row
+            del row
+    sample, report = stratified_reservoir_sample(rows(), 500, seed="SKU2", stratum_sizes=sizes)
+    assert len(sample) == 500 and report["population"] == 20000
+    assert peak[0] <= 500 + 2  # the reservoirs plus the row being streamed
+    assert abs(sum(r["sample_weight"] for r in sample) - 20000) < 1e-6
+    # Same sample as counting the strata from the stream itself
+    counted, _ = stratified_reservoir_sample(fetch_reviews("SKU2", conn=conn), 500, seed="SKU2")
+    assert [r["customer_review"] for r in counted] == [r["customer_review"] for r in sample]
+
+def test_head_sample_keeps_first_rows():
+    sample, report = head_sample(_reviews(50), 10)
+    assert [r["customer_review"] for r in sample] == [f"review {i}" for i in range(10)]
+    assert report["mode"] == "head"
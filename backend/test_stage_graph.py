@@ -0,0 +1,38 @@
+import asyncio
+import time
+import pytest
+from core.stage_graph import Stage, StageGraph
+
+def _sleeper(output, seconds):
+    async def fn(job, **inputs):
+        await asyncio.sleep(seconds)
+        return {output: sum(inputs.values()) + 1}
+    return fn
+
+def test_independent_branches_run_concurrently():
+    graph = StageGraph([
+        Stage("left", _sleeper("a", 0.2), ("x",), ("a",)),
+        Stage("right", _sleeper("b", 0.2), ("x",), ("b",)),
+        Stage("join", _sleeper("c", 0.0), ("a", "b"), ("c",)),
+    ], initial_inputs=("x",))
+    job = {}
+    start = time.perf_counter()
+    state = asyncio.run(graph.run({"x": 0}, job))
+    assert state["c"] == 3
+    assert time.perf_counter() - start < 0.35
+    assert {t["stage"] for t in job["stage_timings"]} == {"left", "right", "join"}
+
+def test_missing_input_and_cycle_are_rejected():
+    with pytest.raises(ValueError):
+        StageGraph([Stage("a", _sleeper("a", 0), ("nope",), ("a",))])
+    with pytest.raises(ValueError):
+        StageGraph([Stage("a", _sleeper("a", 0), ("b",), ("a",)), Stage("b", _sleeper("b", 0), ("a",), ("b",))])
+
+def test_step_and_timing_changes_are_published_as_they_happen():
+    published = []
+    job = {}
+    job["publish_progress"] = lambda: published.append((job.get("step"), len(job.get("stage_timings", []))))
+    graph = StageGraph([Stage("fetch", _sleeper("a", 0), ("x",), ("a",)), Stage("clean", _sleeper("b", 0), ("a",), ("b",), step=1)],
+                       initial_inputs=("x",))
+    asyncio.run(graph.run({"x": 0}, job))
+    assert published == [(None, 1), (1, 1), (1, 2)]
@@ -0,0 +1,10 @@
+from core.standins import StandInSnowflake
+from core.fetch_reviews import fetch_reviews, fetch_product_info
+
+def test_standin_snowflake_serves_reviews_and_product_info():
+    conn = StandInSnowflake(reviews_per_sku=50, latency=0)
+    reviews = list(fetch_reviews("LT1", conn=conn))
+    assert len(reviews) == 50 and reviews == list(fetch_reviews("LT1", conn=conn))
+    assert any(r["customer_review"] is None for r in reviews) and {r["product_rating"] for r in reviews} <= {1, 2, 3, 4, 5}
+    assert len(list(fetch_reviews("LT1", conn=conn, limit=10))) == 10
+    assert fetch_product_info("LT1", conn=conn)["product_name"] == "Stand-in product LT1"
@@ -0,0 +1,53 @@
+import numpy as np
+from core.review_table import ReviewTable
+from core.review_export import write_review_export, read_export_rows, export_path
+from core.vector_index import VectorIndex, SearchIndexCache, mmr_select, save_review_vectors, search_index_path
+
+def _clustered(n_per=300, dim=32, seed=0):
+    rng = np.random.RandomState(seed)
+    centers = rng.randn(5, dim)
+    return np.vstack([c + 0.1 * rng.randn(n_per, dim) for c in centers]).astype(np.float32)
+
+def test_flat_and_ivf_agree_on_nearest_neighbours():
+    X = _clustered()
+    flat = VectorIndex(X, mode="flat")
+    ivf = VectorIndex(X, mode="ivf", nprobe=4)
+    Xn = X / np.linalg.norm(X, axis=1, keepdims=True)
+    for q in Xn[::150]:
+        kth_exact = flat.search(q, k=5)[-1][1]
+        approx = [i for i, _ in ivf.search(q, k=5)]
+        # int8 codes may reorder near-ties, but every hit must be as close as the exact top-5
+        assert all(Xn[i] @ q >= kth_exact - 0.02 for i in approx)
+    mask = np.zeros(len(X), dtype=bool)
+    mask[:300] = True
+    assert all(i < 300 for i, _ in ivf.search(X[900], k=5, mask=mask))
+    assert all(i < 300 for i, _ in flat.search(X[900], k=5, mask=mask))
+
+def test_mmr_spreads_picks_across_clusters():
+    X = _clustered(n_per=50)
+    picked = mmr_select(X, k=5, lambda_=0.5)
+    assert len({i // 50 for i in picked}) >= 4
+
+def test_saved_vectors_rebuild_the_index_through_a_bounded_cache(tmp_path):
+    table = ReviewTable.from_columns({"customer_review": ["Great!", "great", "Bad toy"], "product_rating": [5, 5, 1]})
+    table = table.with_columns(clean=["great", "great", "bad toy"], sentiment_source="text")
+    vectors = np.array([[1, 0, 0], [0, 0, 1]], dtype=np.float32)
+    table = table.with_classification(vectors, [0, 0, 1], ["positive", "positive", "negative"],
+                                      np.full((3, 3), 1 / 3, dtype=np.float32), [0, 1, 2], rep_of=[0, 0, 2])
+    params = {"sampling": "head"}
+    export = export_path("1", params, root=str(tmp_path / "exports"))
+    write_review_export(export, table, ReviewTable.from_columns({"product_rating": []}).with_sentiments([]), None)
+    assert save_review_vectors("1", params, table, root=str(tmp_path)) == 2  # the near-duplicate is not indexed
+    cache = SearchIndexCache(size=1)
+    path = search_index_path("1", params, root=str(tmp_path))
+    index, sentiments = cache.get(path)
+    assert cache.get(path)[0] is index and list(sentiments) == ["positive", "negative"]
+    hits = index.search([0, 0.1, 1], k=2, mask=sentiments == "negative")
+    assert [i for i, _ in hits] == [2]
+    assert read_export_rows(export, [2, 0], ["clean", "duplicate_count"]) == {0: {"clean": "great", "duplicate_count": 2},
+                                                                               2: {"clean": "bad toy", "duplicate_count": 1}}
+    # Another job's index evicts this one; a rewritten file is reloaded
+    save_review_vectors("2", params, table, root=str(tmp_path))
+    cache.get(search_index_path("2", params, root=str(tmp_path)))
+    assert len(cache._entries) == 1 and cache.get(path)[0] is not index
+    assert cache.get(str(tmp_path / "missing.npz")) is None
@@ -0,0 +1,25 @@
+import asyncio
+from core import warmup
+
+def test_ready_ignores_optional_failures_which_are_retried(monkeypatch):
+    calls = []
+    def flaky_model():
+        calls.append("model")
+        if len(calls) < 3:
+            raise OSError("download failed")
+    monkeypatch.setattr(warmup, "COMPONENTS", {"libs": lambda: None, "model": flaky_model})
+    monkeypatch.setattr(warmup, "WARMUP_REQUIRED", ["libs"])
+    monkeypatch.setattr(warmup, "_state", {"libs": {"status": "pending", "required": True, "attempts": 0},
+                                           "model": {"status": "pending", "required": False, "attempts": 0}})
+    monkeypatch.setattr(warmup, "WARMUP_RETRY_SECONDS", 0.01)
+    assert not warmup.is_ready()
+    async def run():
+        task = asyncio.create_task(warmup.warm_up_with_retries())
+        while warmup.warm_state()["libs"]["status"] != "ready":
+            await asyncio.sleep(0.001)
+        ready_while_retrying = warmup.is_ready() and warmup.warm_state()["model"]["status"] != "ready"
+        await asyncio.wait_for(task, 1)
+        return ready_while_retrying
+    assert asyncio.run(run())
+    state = warmup.warm_state()
+    assert state["model"] == {**state["model"], "status": "ready", "attempts": 3} and state["libs"]["attempts"] == 1
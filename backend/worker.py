@@ -0,0 +1,47 @@
+import logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+import asyncio
+import argparse
+from dotenv import load_dotenv
+
+from core.job_worker import run_worker, WORKER_CONCURRENCY
+from core.openai_client import start_openai_client, close_openai_client
+from core.metrics import monitor_event_loop_lag, start_loop_watchdog
+from core.warmup import WARMUP_ON_STARTUP, warm_up_with_retries
+
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run queued analysis jobs from the shared job database.")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY, help="jobs run at once by this process")
+    args = parser.parse_args()
+
+    async def run():
+        loop_lag = asyncio.create_task(monitor_event_loop_lag())
+        watchdog = start_loop_watchdog()
+        warm = None
+        if WARMUP_ON_STARTUP:
+            # Models load in the background; the first job waits only for what it needs
+            warm = asyncio.create_task(warm_up_with_retries())
+        try:
+            start_openai_client()
+        except RuntimeError as e:
+            logging.warning(f"OpenAI client not created at startup: {e}")
+        try:
+            await run_worker(args.concurrency)
+        finally:
+            loop_lag.cancel()
+            if watchdog is not None:
+                watchdog.cancel()
+            if warm is not None:
+                warm.cancel()
+            await close_openai_client()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
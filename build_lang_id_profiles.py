@@ -0,0 +1,59 @@
+import os
+import sys
+import json
+
+import regex as re
+
+# Rebuilds backend/models/lang_id_profiles.json from the character trigram counts that ship with
+# langdetect (Apache 2.0), which were counted over Wikipedia abstracts for each language.
+# langdetect is only needed to run this script, not by the backend.
+PROFILES_JSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend", "models", "lang_id_profiles.json")
+# Trigrams kept per language (most frequent first); the tail adds size without accuracy
+MAX_NGRAMS = int(os.getenv("LANG_ID_MAX_NGRAMS", "2000"))
+_GRAM_RE = re.compile(r"[\p{L}' ]{3}")
+
+
+def corpus_trigrams(lang: str) -> dict:
+    """Lowercased trigram counts of one langdetect profile, limited to letters, apostrophes and spaces."""
+    import langdetect
+    path = os.path.join(os.path.dirname(langdetect.__file__), "profiles", lang)
+    with open(path, "r", encoding="utf-8") as f:
+        freq = json.load(f)["freq"]
+    counts = {}
+    for gram, count in freq.items():
+        gram = gram.lower()
+        if len(gram) == 3 and _GRAM_RE.fullmatch(gram) and "  " not in gram:
+            counts[gram] = counts.get(gram, 0) + count
+    return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:MAX_NGRAMS])
+
+
+def _dump(data: dict) -> str:
+    """The profiles file's layout: one line per top-level field and per language field."""
+    inline = lambda value: json.dumps(value, ensure_ascii=False)
+    fields = []
+    for key, value in data.items():
+        if key == "languages":
+            langs = [f'    {inline(lang)}: {{\n' + ",\n".join(f"      {inline(k)}: {inline(v)}" for k, v in spec.items()) + "\n    }"
+                     for lang, spec in value.items()]
+            fields.append(f'  "languages": {{\n' + ",\n".join(langs) + "\n  }")
+        else:
+            fields.append(f"  {inline(key)}: {inline(value)}")
+    return "{\n" + ",\n".join(fields) + "\n}\n"
+
+
+def main():
+    with open(PROFILES_JSON, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    data["version"] = 2
+    data["ngram_source"] = "langdetect Wikipedia profiles (character trigrams)"
+    for lang, spec in data["languages"].items():
+        spec.pop("text", None)
+        spec["ngrams"] = corpus_trigrams(lang)
+        print(f"{lang}: {len(spec['ngrams'])} trigrams, {len(spec['words'])} stop words")
+    with open(PROFILES_JSON, "w", encoding="utf-8") as f:
+        f.write(_dump(data))
+    print(f"Saved {PROFILES_JSON}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
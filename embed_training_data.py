@@ -0,0 +1,168 @@
+import os
+import sys
+import glob
+import hashlib
+import argparse
+import asyncio
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from core.openai_client import get_openai_client, close_openai_client, EMBED_MODEL, FULL_EMBEDDING_DIMENSIONS, reduce_embedding_dimensions
+from core.rate_governor import RateGovernor, OPENAI_EMBED_TPM, estimate_tokens, gather_or_cancel, total_usage_tokens
+from core.embedding_providers import get_embedding_provider
+
+# CONFIGURE
+INPUT_CSV = "chewy_sentiment_train.csv"
+TEXT_COL = "REVIEW_TEXT"
+# Full-size vectors are cached once; train/evaluate derive smaller dimensions locally
+CACHE_DIR = os.path.join("embedding_cache", f"{EMBED_MODEL}_d{FULL_EMBEDDING_DIMENSIONS}")
+SHARD_SIZE = 5000          # rows per checkpoint shard; a crash loses at most one shard
+REQUEST_BATCH_SIZE = 100   # texts per embeddings request
+MAX_CONCURRENT_REQUESTS = 8
+REQUESTS_PER_MINUTE = 3000
+load_dotenv()
+
+
+def cache_dir_for(provider) -> str:
+    """One cache per embedding provider and model; OpenAI keeps the original location."""
+    if provider.name == "openai":
+        return CACHE_DIR
+    return os.path.join("embedding_cache", f"{provider.name}_{provider.model}")
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def load_cache_index(cache_dir: str = CACHE_DIR) -> dict:
+    """Map text hash -> (shard path, row) for every completed shard (hash file is written last)."""
+    index = {}
+    for hashes_path in sorted(glob.glob(os.path.join(cache_dir, "shard_*.hashes.npy"))):
+        shard_path = hashes_path.replace(".hashes.npy", ".npy")
+        if not os.path.exists(shard_path):
+            continue
+        for row, h in enumerate(np.load(hashes_path)):
+            index[h.tobytes()] = (shard_path, row)
+    return index
+
+
+def _save_atomic(path: str, array: np.ndarray):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+async def embed_missing(texts, cache_dir: str = CACHE_DIR, shard_size: int = SHARD_SIZE,
+                        batch_size: int = REQUEST_BATCH_SIZE, max_concurrent: int = MAX_CONCURRENT_REQUESTS,
+                        requests_per_minute: int = REQUESTS_PER_MINUTE, provider=None) -> int:
+    """
+    Embed every text not already in the cache, writing float32 shards keyed by text hash.
+    OpenAI requests within a shard run concurrently under an RPM/TPM rate governor that backs
+    off on 429s; a local `provider` embeds each shard on its CPU thread pool instead. Re-running
+    resumes after the last completed shard and only pays for new rows.
+    Returns the number of texts embedded.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    index = load_cache_index(cache_dir)
+    missing, seen, blank = [], set(), 0
+    for t in texts:
+        if not t.strip():
+            blank += 1  # providers skip blank texts, so they would shift every later row of the shard
+            continue
+        h = text_hash(t)
+        if h not in index and h not in seen:
+            seen.add(h)
+            missing.append(t)
+    print(f"{len(texts) - len(missing) - blank} texts cached, {blank} blank, {len(missing)} to embed.")
+    if not missing:
+        return 0
+    local = provider is not None and provider.name != "openai"
+    client = None if local else get_openai_client()
+    governor = RateGovernor("training_embeddings", requests_per_minute, OPENAI_EMBED_TPM,
+                            initial_concurrency=max_concurrent, max_concurrency=max_concurrent * 4)
+
+    async def embed_batch(batch):
+        response = await governor.call(lambda: client.embeddings.create(model=EMBED_MODEL, input=batch),
+                                       estimate_tokens(batch), usage_tokens=total_usage_tokens)
+        return np.array([d.embedding for d in response.data], dtype=np.float32)
+
+    next_shard = len(glob.glob(os.path.join(cache_dir, "shard_*.hashes.npy")))
+    with tqdm(total=len(missing), desc="Embedding") as progress:
+        for start in range(0, len(missing), shard_size):
+            shard_texts = missing[start:start+shard_size]
+            if local:
+                results = [await provider.embed(shard_texts)]
+            else:
+                batches = [shard_texts[i:i+batch_size] for i in range(0, len(shard_texts), batch_size)]
+                results = await gather_or_cancel(*(embed_batch(b) for b in batches))
+            matrix = np.concatenate(results)
+            if len(matrix) != len(shard_texts):
+                raise RuntimeError(f"Got {len(matrix)} embeddings for {len(shard_texts)} texts; not writing a misaligned shard")
+            shard_base = os.path.join(cache_dir, f"shard_{next_shard:05d}")
+            _save_atomic(shard_base + ".npy", matrix)
+            _save_atomic(shard_base + ".hashes.npy", np.frombuffer(b"".join(text_hash(t) for t in shard_texts), dtype=np.uint8).reshape(-1, 32))
+            next_shard += 1
+            progress.update(len(shard_texts))
+    return len(missing)
+
+
+def load_embedding_matrix(texts, dimensions: int = None, cache_dir: str = CACHE_DIR) -> np.ndarray:
+    """
+    Assemble the cached float32 embedding matrix for `texts` (input order), reduced to
+    `dimensions` when given (only meaningful for text-embedding-3 vectors). Blank texts,
+    which are never embedded, get zero vectors.
+    """
+    index = load_cache_index(cache_dir)
+    shards = {}
+    rows = []
+    for t in texts:
+        if not t.strip():
+            rows.append(None)
+            continue
+        shard_path, row = index[text_hash(t)]
+        if shard_path not in shards:
+            shards[shard_path] = np.load(shard_path, mmap_mode="r")
+        rows.append(shards[shard_path][row])
+    width = next((len(r) for r in rows if r is not None), 0)
+    matrix = np.array([np.zeros(width, dtype=np.float32) if r is None else r for r in rows], dtype=np.float32).reshape(len(rows), width)
+    if dimensions and dimensions < matrix.shape[1]:
+        matrix = reduce_embedding_dimensions(matrix, dimensions)
+    return matrix
+
+
+async def embed_training_texts(texts, dimensions: int = None, cache_dir: str = None, provider: str = "openai") -> np.ndarray:
+    """Embed whatever is not cached yet with `provider`, then return the matrix for `texts`."""
+    embedding_provider = get_embedding_provider(provider)
+    cache_dir = cache_dir or cache_dir_for(embedding_provider)
+    await embed_missing(texts, cache_dir, provider=embedding_provider)
+    return load_embedding_matrix(texts, dimensions, cache_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed labeled training reviews into a resumable on-disk cache.")
+    parser.add_argument("--csv", default=INPUT_CSV)
+    parser.add_argument("--text-col", default=TEXT_COL)
+    parser.add_argument("--provider", default="openai", help="embedding provider: openai or local")
+    parser.add_argument("--cache-dir", default=None, help="defaults to a per-provider directory under embedding_cache/")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_REQUESTS)
+    parser.add_argument("--rpm", type=int, default=REQUESTS_PER_MINUTE)
+    args = parser.parse_args()
+    texts = pd.read_csv(args.csv)[args.text_col].astype(str).tolist()
+    provider = get_embedding_provider(args.provider)
+    cache_dir = args.cache_dir or cache_dir_for(provider)
+    async def run():
+        try:
+            return await embed_missing(texts, cache_dir, max_concurrent=args.concurrency, requests_per_minute=args.rpm,
+                                       provider=provider)
+        finally:
+            await close_openai_client()
+    embedded = asyncio.run(run())
+    print(f"Embedded {embedded} new texts into {cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,30 @@
 import os
+import sys
+import time
+import pickle
 import pandas as pd
 import numpy as np
 import asyncio
 from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import LabelEncoder
-from sklearn.metrics import classification_report, confusion_matrix
+from sklearn.decomposition import PCA
+from sklearn.metrics import classification_report, confusion_matrix, accuracy_score, f1_score
 from sklearn.model_selection import train_test_split
-from tqdm import tqdm
-import openai
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from core.openai_client import EMBEDDING_DIMENSIONS, FULL_EMBEDDING_DIMENSIONS, reduce_embedding_dimensions, close_openai_client
+from embed_training_data import embed_training_texts
+
 # CONFIGURE
 INPUT_CSV = "chewy_sentiment_train.csv"
 TEXT_COL = "REVIEW_TEXT"
 LABEL_COL = "label"
 load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-EMBED_MODEL = "text-embedding-3-large"
-BATCH_SIZE = 100
 TEST_SIZE = 0.2  # 20% for testing
+# Dimensions compared in the accuracy-vs-dimension report
+DIMENSIONS_TO_COMPARE = [256, 512, 1024, 1536, FULL_EMBEDDING_DIMENSIONS]
+REPORT_CSV = "embedding_dimension_report.csv"
 
 # 1. Load data
 df = pd.read_csv(INPUT_CSV)
@@ -32,34 +38,60 @@ y = le.fit_transform(labels)
 # 3. Split data
 X_train, X_test, y_train, y_test = train_test_split(texts, y, test_size=TEST_SIZE, random_state=42, stratify=y)
 
-# 4. Async embedding function
-async def embed_texts(texts, api_key, model=EMBED_MODEL, batch_size=BATCH_SIZE):
-    client = openai.AsyncOpenAI(api_key=api_key)
-    all_embeddings = []
-    for i in tqdm(range(0, len(texts), batch_size), desc="Embedding batches"):
-        batch = texts[i:i+batch_size]
-        response = await client.embeddings.create(
-            model=model,
-            input=batch
-        )
-        batch_embeds = [d.embedding for d in response.data]
-        all_embeddings.extend(batch_embeds)
-    return np.array(all_embeddings)
+def fit_and_score(train_X, test_X):
+    clf = LogisticRegression(max_iter=1000, multi_class='multinomial', solver='lbfgs')
+    start = time.perf_counter()
+    clf.fit(train_X, y_train)
+    fit_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    y_pred = clf.predict(test_X)
+    predict_seconds = time.perf_counter() - start
+    return clf, y_pred, {
+        "accuracy": accuracy_score(y_test, y_pred),
+        "macro_f1": f1_score(y_test, y_pred, average="macro"),
+        "fit_seconds": fit_seconds,
+        "predict_ms_per_1k": 1000 * predict_seconds / len(test_X) * 1000,
+        "model_bytes": len(pickle.dumps(clf)),
+    }
 
-# 5. Run embedding and evaluation
+# 4. Run embedding and evaluation
 async def main():
+    # Embed once at full size; shorter vectors are derived locally exactly as the API's
+    # `dimensions` parameter would return them (truncate + re-normalize).
     print(f"Embedding {len(X_train)} train and {len(X_test)} test reviews...")
-    X_train_emb = await embed_texts(X_train, OPENAI_API_KEY)
-    X_test_emb = await embed_texts(X_test, OPENAI_API_KEY)
-    print("Training logistic regression...")
-    clf = LogisticRegression(max_iter=1000, multi_class='multinomial', solver='lbfgs')
-    clf.fit(X_train_emb, y_train)
-    print("Evaluating on test set...")
-    y_pred = clf.predict(X_test_emb)
-    print("\nClassification Report:")
-    print(classification_report(y_test, y_pred, target_names=le.classes_))
-    print("\nConfusion Matrix:")
-    print(confusion_matrix(y_test, y_pred))
+    # Reuses the cache written by embed_training_data.py / train_logreg_sentiment.py
+    X_train_emb = await embed_training_texts(X_train)
+    X_test_emb = await embed_training_texts(X_test)
+
+    rows = []
+    for dim in DIMENSIONS_TO_COMPARE:
+        train_X = reduce_embedding_dimensions(X_train_emb, dim)
+        test_X = reduce_embedding_dimensions(X_test_emb, dim)
+        clf, y_pred, scores = fit_and_score(train_X, test_X)
+        rows.append({"dimensions": dim, "reduction": "api_truncate", "embedding_bytes_per_review": dim * 4, **scores})
+        if dim == EMBEDDING_DIMENSIONS:
+            print(f"\nClassification Report ({dim} dimensions):")
+            print(classification_report(y_test, y_pred, target_names=le.classes_))
+            print("\nConfusion Matrix:")
+            print(confusion_matrix(y_test, y_pred))
+        if dim < FULL_EMBEDDING_DIMENSIONS:
+            # PCA fitted on the training split, for comparison with API-side truncation
+            pca = PCA(n_components=dim, random_state=42).fit(X_train_emb)
+            _, _, scores = fit_and_score(pca.transform(X_train_emb), pca.transform(X_test_emb))
+            rows.append({"dimensions": dim, "reduction": "pca", "embedding_bytes_per_review": dim * 4, **scores})
+
+    report = pd.DataFrame(rows)
+    report.to_csv(REPORT_CSV, index=False)
+    print("\nAccuracy vs. embedding dimension:")
+    print(report.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    print(f"\nReport saved to {REPORT_CSV}")
+
+async def run():
+    try:
+        await main()
+    finally:
+        # Shared pooled client used by embed_training_texts
+        await close_openai_client()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(run())
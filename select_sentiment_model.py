@@ -0,0 +1,105 @@
+import os
+import sys
+import pickle
+import argparse
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.preprocessing import LabelEncoder
+from sklearn.model_selection import train_test_split
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from core.openai_client import classifier_model_path, FULL_EMBEDDING_DIMENSIONS
+from core.embedding_providers import get_embedding_provider
+from core.model_selection import candidate_grid, fit_candidate, serving_cost, pareto_front, pick_winner, reduce
+from embed_training_data import cache_dir_for, load_cache_index, load_embedding_matrix, text_hash
+
+# CONFIGURE
+INPUT_CSV = "chewy_sentiment_train.csv"
+TEXT_COL = "REVIEW_TEXT"
+LABEL_COL = "label"
+TEST_SIZE = 0.2
+REPORT_CSV = "model_selection_report.csv"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare sentiment classifiers on cached embeddings by quality and serving cost.")
+    parser.add_argument("--csv", default=INPUT_CSV)
+    parser.add_argument("--text-col", default=TEXT_COL)
+    parser.add_argument("--label-col", default=LABEL_COL)
+    parser.add_argument("--provider", default="openai", help="provider whose embedding cache to use: openai or local")
+    parser.add_argument("--cache-dir", default=None, help="defaults to the provider's directory under embedding_cache/")
+    parser.add_argument("--dimensions", default=f"256,512,1024,{FULL_EMBEDDING_DIMENSIONS}",
+                        help="embedding sizes to compare (openai only; local models use their native size)")
+    parser.add_argument("--c-values", default="0.1,1,10", help="logistic regression regularization strengths")
+    parser.add_argument("--models", default="logreg,svm,mlp")
+    parser.add_argument("--jobs", type=int, default=-1, help="candidates fitted in parallel (-1 = one per core)")
+    parser.add_argument("--max-ms-per-10k", type=float, help="serving budget: predict_proba latency per 10k reviews")
+    parser.add_argument("--max-model-mb", type=float, help="serving budget: pickled model size")
+    parser.add_argument("--export", nargs="?", const="winner", help="write the winner (or the named model) where the API loads it")
+    parser.add_argument("--no-refit", action="store_true", help="export the model fitted on the training split instead of refitting on all rows")
+    parser.add_argument("--report", default=REPORT_CSV)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv)
+    texts = df[args.text_col].astype(str).tolist()
+    le = LabelEncoder()
+    y = le.fit_transform(df[args.label_col].astype(str).tolist())
+
+    # Works from the embedding cache only; embed_training_data.py fills it
+    provider = get_embedding_provider(args.provider)
+    cache_dir = args.cache_dir or cache_dir_for(provider)
+    index = load_cache_index(cache_dir)
+    missing = sum(1 for t in set(texts) if text_hash(t) not in index)
+    if missing:
+        sys.exit(f"{missing} texts are not in {cache_dir}; run embed_training_data.py --provider {provider.name} first")
+    X = load_embedding_matrix(texts, None, cache_dir)
+    dimensions = [int(d) for d in args.dimensions.split(",")] if provider.name == "openai" else [X.shape[1]]
+    dimensions = [d for d in dimensions if d <= X.shape[1]]
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE, random_state=42, stratify=y)
+
+    candidates = candidate_grid(dimensions, [float(c) for c in args.c_values.split(",")], args.models.split(","))
+    print(f"Fitting {len(candidates)} candidates on {len(X_train)} train / {len(X_test)} test reviews from {cache_dir}...")
+    # Each candidate fits in its own process; the matrices are memory-mapped rather than copied
+    fitted = Parallel(n_jobs=args.jobs, verbose=5)(delayed(fit_candidate)(c, X_train, y_train, X_test, y_test) for c in candidates)
+
+    # Serving cost is measured here, one model at a time, so parallel fits do not skew it
+    rows = []
+    for result in fitted:
+        artifact = result.pop("artifact")
+        rows.append({**result, **serving_cost(artifact, result["dimensions"]), "artifact": artifact})
+    front = set(pareto_front(rows))
+    for row in rows:
+        row["pareto"] = row["model"] in front
+    report = pd.DataFrame([{k: v for k, v in row.items() if k != "artifact"} for row in rows])
+    report = report.sort_values(["macro_f1", "predict_ms_per_10k"], ascending=[False, True])
+    report.to_csv(args.report, index=False)
+    print(report.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    print(f"\nReport saved to {args.report}")
+
+    max_bytes = int(args.max_model_mb * 1024 * 1024) if args.max_model_mb else None
+    winner = pick_winner(rows, args.max_ms_per_10k, max_bytes)
+    print(f"Winner within budget: {winner['model']} (macro F1 {winner['macro_f1']:.4f}, accuracy {winner['accuracy']:.4f}, "
+          f"ECE {winner['ece']:.4f}, {winner['predict_ms_per_10k']:.1f} ms per 10k, {winner['model_bytes'] / 1024:.0f} KiB)")
+    if not args.export:
+        return
+    chosen = winner if args.export == "winner" else next((r for r in rows if r["model"] == args.export), None)
+    if chosen is None:
+        sys.exit(f"No candidate named {args.export}")
+    candidate = next(c for c in candidates if c.name == chosen["model"])
+    if args.no_refit:
+        clf = pickle.loads(chosen["artifact"])
+    else:
+        print(f"Refitting {candidate.name} on all {len(X)} reviews...")
+        clf = candidate.build().fit(reduce(X, candidate.dimensions), y)
+    model_path = classifier_model_path(candidate.dimensions, provider.name)
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    with open(model_path, "wb") as f:
+        pickle.dump(clf, f)
+    with open(model_path.replace('.pkl', '_label_encoder.pkl'), "wb") as f:
+        pickle.dump(le, f)
+    print(f"Model saved to {model_path}; serve it with EMBEDDING_PROVIDER={provider.name}"
+          + (f" EMBEDDING_DIMENSIONS={candidate.dimensions}" if provider.name == "openai" else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,32 @@
 import os
+import sys
 import pandas as pd
 import numpy as np
 import asyncio
 import pickle
 from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import LabelEncoder
-from tqdm import tqdm
 
-import openai
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from core.openai_client import EMBEDDING_DIMENSIONS, classifier_model_path, close_openai_client
+from core.embedding_providers import EMBEDDING_PROVIDER
+from embed_training_data import embed_training_texts
+
 # CONFIGURE
 INPUT_CSV = "chewy_sentiment_train.csv"
 TEXT_COL = "REVIEW_TEXT"
 LABEL_COL = "label"
-MODEL_PATH = "backend/models/logreg_sentiment.pkl"
 load_dotenv()
+# Provider whose embeddings the model is trained on ("openai" or "local"); the artifact is tagged with it
+PROVIDER = os.getenv("EMBEDDING_PROVIDER", EMBEDDING_PROVIDER).lower()
+# Must match the serving EMBEDDING_DIMENSIONS; the model artifact is tagged with it. Local models
+# always use their native dimension.
+EMBED_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", str(EMBEDDING_DIMENSIONS))) if PROVIDER == "openai" else None
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
+if PROVIDER == "openai" and not OPENAI_API_KEY:
     raise ValueError("OPENAI_API_KEY environment variable is not set. Please set it before running the script.")
-EMBED_MODEL = "text-embedding-3-large"
-BATCH_SIZE = 100
 
 # 1. Load data
 df = pd.read_csv(INPUT_CSV)
@@ -31,34 +37,29 @@ labels = df[LABEL_COL].astype(str).tolist()
 le = LabelEncoder()
 y = le.fit_transform(labels)
 
-# 3. Async embedding function
-async def embed_texts(texts, api_key, model=EMBED_MODEL, batch_size=BATCH_SIZE):
-    client = openai.AsyncOpenAI(api_key=api_key)
-    all_embeddings = []
-    for i in tqdm(range(0, len(texts), batch_size), desc="Embedding batches"):
-        batch = texts[i:i+batch_size]
-        response = await client.embeddings.create(
-            model=model,
-            input=batch
-        )
-        batch_embeds = [d.embedding for d in response.data]
-        all_embeddings.extend(batch_embeds)
-    return np.array(all_embeddings)
-
-# 4. Run embedding
+# 3. Run embedding
 async def main():
-    print(f"Embedding {len(texts)} reviews...")
-    embeddings = await embed_texts(texts, OPENAI_API_KEY)
+    print(f"Embedding {len(texts)} reviews with the {PROVIDER} provider at {EMBED_DIMENSIONS or 'native'} dimensions...")
+    # Shared per-provider cache: only texts not embedded by a previous run are embedded again
+    embeddings = await embed_training_texts(texts, EMBED_DIMENSIONS, provider=PROVIDER)
+    model_path = classifier_model_path(embeddings.shape[1], PROVIDER)
     print("Training logistic regression...")
     clf = LogisticRegression(max_iter=1000, multi_class='multinomial', solver='lbfgs')
     clf.fit(embeddings, y)
     # Save model and label encoder
-    os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
-    with open(MODEL_PATH, "wb") as f:
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    with open(model_path, "wb") as f:
         pickle.dump(clf, f)
-    with open(MODEL_PATH.replace('.pkl', '_label_encoder.pkl'), "wb") as f:
+    with open(model_path.replace('.pkl', '_label_encoder.pkl'), "wb") as f:
         pickle.dump(le, f)
-    print(f"Model saved to {MODEL_PATH}")
+    print(f"Model saved to {model_path}")
+
+async def run():
+    try:
+        await main()
+    finally:
+        # Shared pooled client used by embed_training_texts
+        await close_openai_client()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(run())
\ No newline at end of file